@@ -0,0 +1,103 @@
+# apps/accounts/fields.py
+"""
+Champs et widgets de sélection pour les grandes listes : choix lus dans le
+cache versionné (recalculés après une écriture sur le modèle) et
+autocomplétion JSON pour le produit des lignes de vente, dont le <select>
+ne contient que l'option choisie.
+"""
+
+from django import forms
+from django.core.exceptions import EmptyResultSet
+from django.forms.models import ModelChoiceIterator
+
+from apps.core.caching import cached
+
+
+class CachedChoiceIterator(ModelChoiceIterator):
+    """Itère sur les couples (pk, libellé) en cache au lieu du queryset."""
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        yield from self.field.cached_choices()
+
+    def __len__(self):
+        return len(self.field.cached_choices()) + (self.field.empty_label is not None)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(self.field.cached_choices())
+
+
+class CachedModelChoiceField(forms.ModelChoiceField):
+    """
+    ModelChoiceField dont la liste est gardée en cache jusqu'à la prochaine
+    écriture sur le modèle (ou sur `depends_on`, si le libellé en dépend).
+    La validation d'une valeur soumise reste une requête sur le queryset.
+    """
+
+    iterator = CachedChoiceIterator
+
+    def __init__(self, queryset, *, depends_on=(), **kwargs):
+        self.depends_on = tuple(depends_on)
+        super().__init__(queryset, **kwargs)
+
+    def cached_choices(self):
+        queryset = self.queryset
+        try:
+            sql = queryset.query.sql_with_params()
+        except EmptyResultSet:
+            return []
+        return cached(
+            f"choices:{queryset.model._meta.label_lower}",
+            [queryset.model, *self.depends_on],
+            lambda: [(obj.pk, self.label_from_instance(obj)) for obj in queryset],
+            sql, type(self).label_from_instance.__qualname__,
+        )
+
+
+class AutocompleteSelect(forms.Select):
+    """
+    <select> qui ne rend que l'option sélectionnée, complété par un champ de
+    recherche : static/js/autocomplete.js interroge `url` (JSON
+    {"results": [{"id", "text", "price"}]}) et remplace les options. Le
+    rendu ne dépend pas de la taille du catalogue.
+
+    `labels` ({pk: libellé}) peut être renseigné par le formulaire quand
+    l'objet est déjà chargé ; sinon les libellés manquants sont lus en une
+    requête limitée aux valeurs sélectionnées.
+    """
+
+    template_name = 'accounts/widgets/autocomplete_select.html'
+
+    class Media:
+        js = ('js/autocomplete.js',)
+
+    def __init__(self, url, attrs=None, placeholder="Rechercher…"):
+        super().__init__(attrs)
+        self.url = url
+        self.placeholder = placeholder
+        self.labels = {}
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['attrs']['data-autocomplete-url'] = str(self.url)
+        context['widget']['placeholder'] = self.placeholder
+        return context
+
+    def selected_labels(self, values):
+        labels = {str(pk): label for pk, label in self.labels.items()}
+        missing = [value for value in values if value not in labels]
+        if missing and hasattr(self.choices, 'queryset'):
+            field = self.choices.field
+            for obj in self.choices.queryset.filter(pk__in=missing):
+                labels[str(obj.pk)] = field.label_from_instance(obj)
+        return labels
+
+    def optgroups(self, name, value, attrs=None):
+        values = [v for v in value if v not in ('', None)]
+        labels = self.selected_labels(values)
+        options = [self.create_option(name, '', '---------', not values, 0, attrs=attrs)]
+        for index, pk in enumerate(values, 1):
+            if pk in labels:
+                options.append(self.create_option(name, pk, labels[pk], True, index, attrs=attrs))
+        return [(None, options, 0)]
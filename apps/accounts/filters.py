@@ -0,0 +1,134 @@
+# apps/accounts/filters.py
+"""
+Filtres des exports, à partir des paramètres GET des listes.
+Partagés entre les vues d'export et le worker d'exports en arrière-plan.
+"""
+
+from django.contrib.auth import get_user_model
+from django.utils.dateparse import parse_date
+
+from apps.core.models import Category, Product, Sale, SaleItem, Supplier
+from apps.core.search import search_products
+from apps.core.services import sales_report
+from .forms import (
+    CategorySearchForm, EmployeeSearchForm, ProductSearchForm, SaleSearchForm, SupplierSearchForm,
+)
+
+
+def filter_by_product_name(sales, text):
+    """
+    Ventes contenant un produit dont le nom correspond à `text` : produits
+    trouvés par l'index plein texte, puis leurs ventes par l'index
+    (product, sale) des lignes, sans jointure ni DISTINCT.
+    """
+    products = search_products(Product.objects.all(), text).values('pk')
+    return sales.filter(pk__in=SaleItem.objects.filter(product__in=products).values('sale_id'))
+
+
+def filter_sales(params):
+    """Reproduit la logique de sale_list : validation du form et filtrage."""
+    form = SaleSearchForm(params or None)
+    qs = Sale.objects.all().select_related('cashier')
+    if form.is_valid():
+        inv = form.cleaned_data.get('invoice_number')
+        if inv:
+            qs = qs.filter(invoice_number__icontains=inv)
+        cashier = form.cleaned_data.get('cashier')
+        if cashier:
+            qs = qs.filter(cashier=cashier)
+        prod_name = form.cleaned_data.get('product_name')
+        if prod_name:
+            qs = filter_by_product_name(qs, prod_name)
+        date_from = form.cleaned_data.get('date_from')
+        if date_from:
+            qs = qs.filter(business_date__gte=date_from)
+        date_to = form.cleaned_data.get('date_to')
+        if date_to:
+            qs = qs.filter(business_date__lte=date_to)
+        status = form.cleaned_data.get('status')
+        if status:
+            qs = qs.filter(status=status)
+    return qs.order_by('-date')
+
+
+def filter_employees(params):
+    form = EmployeeSearchForm(params or None)
+    qs = get_user_model().objects.all()
+    if form.is_valid():
+        name = form.cleaned_data.get('name')
+        if name:
+            qs = qs.filter(first_name__icontains=name) | qs.filter(last_name__icontains=name)
+        role = form.cleaned_data.get('role')
+        if role:
+            qs = qs.filter(role=role)
+        date_from = form.cleaned_data.get('date_joined_from')
+        if date_from:
+            qs = qs.filter(date_joined__date__gte=date_from)
+        date_to = form.cleaned_data.get('date_joined_to')
+        if date_to:
+            qs = qs.filter(date_joined__date__lte=date_to)
+    return qs.order_by('last_name')
+
+
+def filter_products(params):
+    form = ProductSearchForm(params or None)
+    qs = Product.objects.all()
+    search = ''
+    if form.is_valid():
+        search = form.cleaned_data.get('search')
+        category = form.cleaned_data.get('category')
+        if category:
+            qs = qs.filter(category=category)
+        status = form.cleaned_data.get('status')
+        if status:
+            qs = qs.filter(status=status)
+        price_min = form.cleaned_data.get('price_min')
+        if price_min is not None:
+            qs = qs.filter(price__gte=price_min)
+        price_max = form.cleaned_data.get('price_max')
+        if price_max is not None:
+            qs = qs.filter(price__lte=price_max)
+    # Recherche classée par pertinence, sinon tri par nom
+    if search:
+        return search_products(qs, search)
+    return qs.order_by('name')
+
+
+def filter_suppliers(params):
+    form = SupplierSearchForm(params or None)
+    qs = Supplier.objects.all()
+    if form.is_valid():
+        search = form.cleaned_data.get('search')
+        if search:
+            qs = qs.filter(name__icontains=search)
+        status = form.cleaned_data.get('status')
+        if status:
+            qs = qs.filter(status=status)
+    return qs.order_by('name')
+
+
+def filter_categories(params):
+    form = CategorySearchForm(params or None)
+    qs = Category.objects.all()
+    if form.is_valid():
+        search = form.cleaned_data.get('search')
+        if search:
+            qs = qs.filter(name__icontains=search)
+    return qs.order_by('name')
+
+
+def filter_sales_report(params):
+    """
+    Lignes (période, total, nb ventes) de start..end (jours locaux inclus),
+    par jour, semaine ou mois selon `granularity`.
+    """
+    try:
+        start = parse_date(params.get("start") or "")
+        end = parse_date(params.get("end") or "")
+    except ValueError:
+        start = end = None
+    return sales_report(start, end, params.get("granularity") or "day")
+
+
+def filter_stock_report(params):
+    return Product.objects.all()
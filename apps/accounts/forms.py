@@ -4,9 +4,11 @@ from django import forms
 from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
 from django.core.exceptions import ValidationError
 from django.contrib.auth import authenticate, get_user_model
+from django.urls import reverse_lazy
 from datetime import date
 import logging
 
+from .fields import AutocompleteSelect, CachedModelChoiceField
 from .models import User
 from apps.core.models import Supplier, Category, Product, Sale, SaleItem
 
@@ -262,9 +264,10 @@ class ProductCreateForm(forms.ModelForm):
 
     class Meta:
         model = Product
-        fields = ['name', 'category', 'price', 'stock_quantity', 'description', 'status', 'image']
+        fields = ['name', 'barcode', 'category', 'price', 'stock_quantity', 'description', 'status', 'image']
         widgets = {
             'name': forms.TextInput(attrs={'class':'form-control'}),
+            'barcode': forms.TextInput(attrs={'class':'form-control','autocomplete':'off'}),
             'category': forms.Select(attrs={'class':'form-select'}),
             'price': forms.NumberInput(attrs={'class':'form-control','step':'0.01'}),
             'stock_quantity': forms.NumberInput(attrs={'class':'form-control'}),
@@ -273,6 +276,7 @@ class ProductCreateForm(forms.ModelForm):
         }
         labels = {
             'name': 'Nom du produit',
+            'barcode': 'Code-barres',
             'category': 'Catégorie',
             'price': 'Prix (€)',
             'stock_quantity': 'Stock',
@@ -296,8 +300,8 @@ class ProductSearchForm(forms.Form):
         widget=forms.TextInput(attrs={'class':'form-control','placeholder':'Rechercher produit…'}),
         label=""
     )
-    category = forms.ModelChoiceField(
-        queryset=Category.objects.all(),
+    category = CachedModelChoiceField(
+        queryset=Category.objects.order_by('name'),
         required=False,
         empty_label="Toutes les catégories",
         widget=forms.Select(attrs={'class':'form-select'})
@@ -307,6 +311,14 @@ class ProductSearchForm(forms.Form):
         choices=[('', 'Tous les statuts')] + list(Product.Status.choices),
         widget=forms.Select(attrs={'class':'form-select'})
     )
+    price_min = forms.DecimalField(
+        required=False, min_value=0, decimal_places=2,
+        widget=forms.NumberInput(attrs={'class':'form-control','placeholder':'Prix min'})
+    )
+    price_max = forms.DecimalField(
+        required=False, min_value=0, decimal_places=2,
+        widget=forms.NumberInput(attrs={'class':'form-control','placeholder':'Prix max'})
+    )
 
 
 # ===== VENTES ===== #
@@ -317,8 +329,8 @@ class SaleSearchForm(forms.Form):
         label="N° facture",
         widget=forms.TextInput(attrs={'class':'form-control','placeholder':'N° facture…'})
     )
-    cashier = forms.ModelChoiceField(
-        queryset=Sale._meta.get_field('cashier').remote_field.model.objects.all(),
+    cashier = CachedModelChoiceField(
+        queryset=User.objects.order_by('username'),
         required=False,
         widget=forms.Select(attrs={'class':'form-select'}),
         label="Caissier"
@@ -347,23 +359,53 @@ class SaleSearchForm(forms.Form):
 
 
 class SaleForm(forms.ModelForm):
+    cashier = CachedModelChoiceField(
+        queryset=User.objects.order_by('username'),
+        widget=forms.Select(attrs={'class':'form-select'}),
+        label="Caissier"
+    )
+
     class Meta:
         model = Sale
         fields = ['invoice_number', 'cashier', 'customer_name', 'status']
         widgets = {
             'invoice_number': forms.TextInput(attrs={'class':'form-control'}),
-            'cashier': forms.Select(attrs={'class':'form-select'}),
             'customer_name': forms.TextInput(attrs={'class':'form-control'}),
             'status': forms.Select(attrs={'class':'form-select'}),
         }
 
 
+class BaseSaleItemFormSet(forms.BaseInlineFormSet):
+    """
+    Lignes chargées avec leur produit : le widget d'autocomplétion affiche
+    le produit choisi sans requête par ligne. Le queryset est passé au
+    constructeur : get_queryset() garde ainsi son résultat en cache.
+    """
+
+    def __init__(self, *args, queryset=None, **kwargs):
+        if queryset is None:
+            queryset = self.model._default_manager.select_related('product')
+        super().__init__(*args, queryset=queryset, **kwargs)
+
+    def _construct_form(self, i, **kwargs):
+        form = super()._construct_form(i, **kwargs)
+        product = form.instance.product if form.instance.product_id else None
+        if product is not None:
+            form.fields['product'].widget.labels = {product.pk: str(product)}
+        return form
+
+
 SaleItemFormSet = forms.inlineformset_factory(
     Sale, SaleItem,
+    formset=BaseSaleItemFormSet,
     fields=['product', 'quantity', 'unit_price'],
     extra=1, can_delete=True,
     widgets={
-        'product': forms.Select(attrs={'class':'form-select'}),
+        'product': AutocompleteSelect(
+            reverse_lazy('accounts:product_autocomplete'),
+            attrs={'class':'form-select'},
+            placeholder="Rechercher un produit…",
+        ),
         'quantity': forms.NumberInput(attrs={'class':'form-control','min':1}),
         'unit_price': forms.NumberInput(attrs={'class':'form-control','step':'0.01'}),
     }
@@ -0,0 +1,147 @@
+# apps/accounts/jobs.py
+"""
+Exports en arrière-plan : file d'attente en base (ExportJob), sans broker
+externe. Les vues créent les jobs, la commande run_export_worker les exécute
+avec le moteur d'export de services.py.
+"""
+
+import logging
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+
+from . import filters
+from .models import ExportJob
+from .services import EXPORT_FORMATS, render_export
+
+logger = logging.getLogger(__name__)
+
+# Export -> (filtre des paramètres GET, nom du fichier sans extension)
+EXPORTS = {
+    'sales': (filters.filter_sales, 'ventes'),
+    'employees': (filters.filter_employees, 'employes'),
+    'products': (filters.filter_products, 'produits'),
+    'suppliers': (filters.filter_suppliers, 'fournisseurs'),
+    'categories': (filters.filter_categories, 'categories'),
+    'sales_report': (filters.filter_sales_report, 'rapport_ventes'),
+    'stock_report': (filters.filter_stock_report, 'rapport_stocks'),
+}
+
+
+def enqueue_export(user, kind, fmt, params):
+    """Crée un job en attente ; ValueError si l'export demandé n'existe pas."""
+    if kind not in EXPORTS or fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Export inconnu : {kind}.{fmt}")
+    return ExportJob.objects.create(user=user, kind=kind, format=fmt, params=dict(params))
+
+
+def claim_next_job():
+    """
+    Passe le plus ancien job en attente à RUNNING. La mise à jour est
+    conditionnelle : deux workers ne peuvent pas prendre le même job.
+    """
+    while True:
+        job = (ExportJob.objects
+               .filter(status=ExportJob.Status.PENDING)
+               .order_by('created_at')
+               .first())
+        if job is None:
+            return None
+        claimed = (ExportJob.objects
+                   .filter(pk=job.pk, status=ExportJob.Status.PENDING)
+                   .update(status=ExportJob.Status.RUNNING, started_at=timezone.now()))
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+
+class _Progress:
+    """Compte les lignes lues et enregistre l'avancement toutes les EXPORT_PROGRESS_EVERY lignes."""
+
+    def __init__(self, job):
+        self.job_id = job.pk
+        self.every = settings.EXPORT_PROGRESS_EVERY
+        self.count = 0
+
+    def __call__(self):
+        self.count += 1
+        if self.count % self.every == 0:
+            ExportJob.objects.filter(pk=self.job_id).update(processed_rows=self.count)
+
+
+class _Tracked:
+    """
+    Enveloppe d'un queryset qui appelle progress() à chaque ligne lue par
+    values_list().iterator(). Les rapports déjà agrégés (listes) sont
+    passés tels quels.
+    """
+
+    def __init__(self, rows, progress):
+        self._rows = rows
+        self._progress = progress
+
+    def __iter__(self):
+        for row in self._rows:
+            self._progress()
+            yield row
+
+    def values_list(self, *fields, **kwargs):
+        return _Tracked(self._rows.values_list(*fields, **kwargs), self._progress)
+
+    def iterator(self, chunk_size=None):
+        return iter(_Tracked(self._rows.iterator(chunk_size=chunk_size), self._progress))
+
+
+def _as_file(output):
+    """Les générateurs CSV produisent des blocs d'octets : on les tamponne sur disque."""
+    if hasattr(output, 'read'):
+        return output
+    spool = tempfile.SpooledTemporaryFile(max_size=settings.EXPORT_SPOOL_MAX_SIZE)
+    for chunk in output:
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+
+def run_export_job(job):
+    """Génère l'export d'un job RUNNING et enregistre le fichier sous MEDIA_ROOT/exports/."""
+    filter_params, basename = EXPORTS[job.kind]
+    progress = _Progress(job)
+    try:
+        queryset = filter_params(job.params)
+        if isinstance(queryset, list):
+            job.total_rows = progress.count = len(queryset)
+            source = queryset
+        else:
+            job.total_rows = queryset.count()
+            source = _Tracked(queryset, progress)
+        ExportJob.objects.filter(pk=job.pk).update(total_rows=job.total_rows)
+        output = _as_file(render_export(job.kind, source, job.format))
+        job.filename = f"{basename}.{job.format}"
+        with output:
+            job.file.save(f"{job.pk}_{job.filename}", File(output), save=False)
+        job.status = ExportJob.Status.DONE
+    except Exception as exc:
+        logger.exception("Échec de l'export %s", job.pk)
+        job.status = ExportJob.Status.FAILED
+        job.error = str(exc)
+    job.processed_rows = progress.count
+    job.finished_at = timezone.now()
+    job.expires_at = job.finished_at + timedelta(hours=settings.EXPORT_JOB_TTL_HOURS)
+    job.save()
+    return job
+
+
+def purge_expired_exports(now=None):
+    """Supprime les jobs expirés et leurs fichiers ; renvoie le nombre de jobs supprimés."""
+    expired = ExportJob.objects.filter(expires_at__lt=now or timezone.now())
+    count = 0
+    for job in list(expired):
+        if job.file:
+            job.file.delete(save=False)
+        job.delete()
+        count += 1
+    return count
@@ -0,0 +1,234 @@
+import multiprocessing
+import os
+import queue
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import BytesIO
+
+from django.core.management.base import BaseCommand, CommandError
+
+try:
+    import resource
+except ImportError:  # Windows : pas de RSS maximal, mémoire Python via tracemalloc
+    resource = None
+
+MEMORY_TITLE = 'RSS max (Mo)' if resource is not None else 'pic Python (Mo)'
+
+# Format -> (implémentation actuelle, implémentation de référence)
+MODES = {
+    'xlsx': ('write_only', 'workbook'),
+    'docx': ('bulk', 'add_row'),
+}
+
+DB_FORMATS = ('csv', 'xlsx', 'docx', 'pdf')
+SEED_BATCH_SIZE = 10_000
+
+
+def _setup(db_path=None):
+    """Initialise Django dans le processus de mesure, sur une base temporaire si donnée."""
+    import django
+    from django.conf import settings
+    if db_path:
+        settings.DATABASES['default']['NAME'] = db_path
+    django.setup()
+    if resource is None:
+        tracemalloc.start()
+
+
+def _peak_rss():
+    """Pic de mémoire du processus en Mo : RSS maximal, ou pic des allocations Python sans `resource`."""
+    if resource is None:
+        return tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    # ru_maxrss est exprimé en Kio sous Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _synthetic_sales(count):
+    """Lignes au format de l'export des ventes, sans passer par la base."""
+    start = datetime(2025, 1, 1)
+    for i in range(count):
+        yield [
+            f"F{i:08d}",
+            (start + timedelta(minutes=i)).strftime('%d/%m/%Y %H:%M'),
+            f"Caissier {i % 12}",
+            Decimal(i % 50000) / 100,
+            "Payé",
+        ]
+
+
+def _run(mode, count, results):
+    _setup()
+    from docx import Document
+    from openpyxl import Workbook
+    from apps.accounts.services import EXPORT_SPECS, write_docx, write_xlsx
+    spec = EXPORT_SPECS['sales']
+
+    started = time.perf_counter()
+    if mode == 'write_only':
+        stream = write_xlsx("Ventes", spec.header, _synthetic_sales(count))
+    elif mode == 'workbook':
+        wb = Workbook()
+        ws = wb.active
+        ws.append(spec.header)
+        for row in _synthetic_sales(count):
+            ws.append(row)
+        stream = BytesIO()
+        wb.save(stream)
+    elif mode == 'bulk':
+        stream = write_docx(spec, _synthetic_sales(count))
+    else:
+        doc = Document()
+        doc.add_heading(spec.heading(), level=1)
+        table = doc.add_table(rows=1, cols=len(spec.columns))
+        for idx, title in enumerate(spec.header):
+            table.rows[0].cells[idx].text = title
+        for row in _synthetic_sales(count):
+            row_cells = table.add_row().cells
+            for idx, (column, value) in enumerate(zip(spec.columns, row)):
+                row_cells[idx].text = column.text(value)
+        stream = BytesIO()
+        doc.save(stream)
+    elapsed = time.perf_counter() - started
+    size = stream.seek(0, 2)
+    results.put((elapsed, _peak_rss(), size / 1024 / 1024))
+
+
+def _seed(db_path, count, results):
+    """Complète la base temporaire jusqu'à `count` ventes (bulk_create par paquets)."""
+    _setup(db_path)
+    from django.core.management import call_command
+    from django.utils import timezone
+    from apps.accounts.models import User
+    from apps.core.models import Sale
+    call_command('migrate', verbosity=0)
+    cashiers = list(User.objects.filter(username__startswith='bench-'))
+    if not cashiers:
+        cashiers = [
+            User.objects.create(
+                username=f'bench-{i}', email=f'bench-{i}@example.com',
+                first_name=f'Prénom{i}', last_name=f'Nom{i}',
+            )
+            for i in range(12)
+        ]
+    start = timezone.make_aware(datetime(2025, 1, 1))
+    existing = Sale.objects.count()
+    statuses = [Sale.Status.PAID] * 9 + [Sale.Status.REFUNDED]
+    for first in range(existing, count, SEED_BATCH_SIZE):
+        sales = []
+        for i in range(first, min(first + SEED_BATCH_SIZE, count)):
+            date = start + timedelta(minutes=i)
+            sales.append(Sale(
+                invoice_number=f"B{i:09d}", date=date, business_date=timezone.localdate(date),
+                cashier=cashiers[i % len(cashiers)], customer_name="Client",
+                total_amount=Decimal(i % 50000) / 100, status=statuses[i % len(statuses)],
+            ))
+        Sale.objects.bulk_create(sales)
+    results.put(count)
+
+
+def _run_db(db_path, fmt, max_memory, results):
+    """Export réel des ventes : values_list().iterator() par paquets, via render_export."""
+    # Plafond de mémoire virtuelle : un format qui ne tient pas échoue (MemoryError)
+    # au lieu de déclencher l'OOM killer de la machine
+    if resource is not None:
+        limit = max_memory * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    _setup(db_path)
+    from apps.accounts.services import render_export
+    from apps.core.models import Sale
+
+    started = time.perf_counter()
+    output = render_export('sales', Sale.objects.order_by('-date'), fmt)
+    if fmt == 'csv':
+        size = sum(len(chunk) for chunk in output)
+    else:
+        size = output.seek(0, 2)
+    elapsed = time.perf_counter() - started
+    results.put((elapsed, _peak_rss(), size / 1024 / 1024))
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure le temps et la mémoire maximale (RSS) des exports des ventes : "
+        "export réel depuis une base SQLite temporaire (--source db, par défaut) "
+        "ou écriture XLSX/DOCX de lignes générées en mémoire (--source memory)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', choices=('db', 'memory'), default='db')
+        parser.add_argument(
+            '--format', nargs='+', choices=DB_FORMATS,
+            help="db : formats mesurés (tous par défaut) ; memory : xlsx (défaut) ou docx",
+        )
+        parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000])
+        parser.add_argument(
+            '--max-memory', type=int, default=3072,
+            help="db seulement : mémoire virtuelle maximale d'une mesure, en Mo (sans effet sous Windows)",
+        )
+        parser.add_argument(
+            '--mode', nargs='+',
+            help="memory seulement. xlsx : write_only (actuel), workbook (classeur en mémoire) ; "
+                 "docx : bulk (actuel), add_row (table.add_row() par ligne)",
+        )
+
+    def handle(self, *args, **options):
+        # Un processus neuf par mesure pour que le pic RSS ne soit pas hérité
+        self.ctx = multiprocessing.get_context('spawn')
+        if options['source'] == 'db':
+            self.handle_db(options)
+        else:
+            self.handle_memory(options)
+
+    def measure(self, target, *args):
+        """Résultat de `target` exécuté dans un processus neuf, None s'il a échoué."""
+        results = self.ctx.Queue()
+        proc = self.ctx.Process(target=target, args=(*args, results))
+        proc.start()
+        while True:
+            try:
+                value = results.get(timeout=1)
+                break
+            except queue.Empty:
+                if not proc.is_alive():
+                    return None
+        proc.join()
+        return value
+
+    def handle_memory(self, options):
+        formats = options['format'] or ['xlsx']
+        if len(formats) != 1 or formats[0] not in MODES:
+            raise CommandError("--source memory : un seul format, xlsx ou docx")
+        modes = options['mode'] or MODES[formats[0]]
+        unknown = set(modes) - set(MODES[formats[0]])
+        if unknown:
+            raise CommandError(f"Mode(s) inconnu(s) pour {formats[0]} : {', '.join(sorted(unknown))}")
+        self.stdout.write(f"{'lignes':>10} {'mode':>11} {'temps (s)':>10} {MEMORY_TITLE:>15} {'fichier (Mo)':>13}")
+        for count in options['rows']:
+            for mode in modes:
+                result = self.measure(_run, mode, count)
+                if result is None:
+                    raise CommandError(f"Échec de la mesure {mode} ({count} lignes), voir la trace ci-dessus")
+                elapsed, rss, size = result
+                self.stdout.write(f"{count:>10} {mode:>11} {elapsed:>10.2f} {rss:>15.1f} {size:>13.1f}")
+
+    def handle_db(self, options):
+        if options['mode']:
+            raise CommandError("--mode ne s'applique qu'à --source memory")
+        formats = options['format'] or DB_FORMATS
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, 'benchmark.sqlite3')
+            self.stdout.write(f"{'lignes':>10} {'format':>7} {'temps (s)':>10} {MEMORY_TITLE:>15} {'fichier (Mo)':>13}")
+            # Nombres croissants : la base est complétée d'une mesure à l'autre
+            for count in sorted(options['rows']):
+                if self.measure(_seed, db_path, count) is None:
+                    raise CommandError(f"Échec du remplissage de la base ({count} ventes)")
+                for fmt in formats:
+                    result = self.measure(_run_db, db_path, fmt, options['max_memory'])
+                    if result is None:
+                        self.stdout.write(f"{count:>10} {fmt:>7}   échec (plafond de {options['max_memory']} Mo ?)")
+                        continue
+                    elapsed, rss, size = result
+                    self.stdout.write(f"{count:>10} {fmt:>7} {elapsed:>10.2f} {rss:>15.1f} {size:>13.1f}")
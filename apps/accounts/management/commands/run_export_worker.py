@@ -0,0 +1,31 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.accounts.jobs import claim_next_job, purge_expired_exports, run_export_job
+
+
+class Command(BaseCommand):
+    help = "Exécute les exports en attente (file ExportJob) et purge les fichiers expirés"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Vide la file puis s'arrête")
+        parser.add_argument('--interval', type=float, default=settings.EXPORT_WORKER_POLL_SECONDS)
+
+    def handle(self, *args, **options):
+        while True:
+            purged = purge_expired_exports()
+            if purged:
+                self.stdout.write(f"{purged} export(s) expiré(s) supprimé(s).")
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['interval'])
+                continue
+            job = run_export_job(job)
+            if job.status == job.Status.DONE:
+                self.stdout.write(self.style.SUCCESS(f"Export {job.pk} terminé : {job.processed_rows} ligne(s)."))
+            else:
+                self.stdout.write(self.style.ERROR(f"Export {job.pk} en échec : {job.error}"))
@@ -112,3 +112,51 @@ class ActivityLog(models.Model):
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # Pagination par curseur sur (timestamp, id), globale ou par utilisateur
+            models.Index(fields=['timestamp', 'id'], name='activitylog_timestamp_id'),
+            models.Index(fields=['user', 'timestamp', 'id'], name='activitylog_user_timestamp_id'),
+        ]
+
+
+class ExportJob(models.Model):
+    """Export généré hors requête par la commande run_export_worker"""
+
+    class Status(models.TextChoices):
+        PENDING = "PENDING", "En attente"
+        RUNNING = "RUNNING", "En cours"
+        DONE = "DONE", "Terminé"
+        FAILED = "FAILED", "Échec"
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='export_jobs')
+    kind = models.CharField(max_length=30, verbose_name="Données exportées")
+    format = models.CharField(max_length=10, verbose_name="Format")
+    params = models.JSONField(default=dict, blank=True, verbose_name="Filtres")
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    total_rows = models.PositiveIntegerField(default=0)
+    processed_rows = models.PositiveIntegerField(default=0)
+    file = models.FileField(upload_to='exports/', blank=True)
+    filename = models.CharField(max_length=100, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='exportjob_status_created'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}.{self.format} ({self.get_status_display()})"
+
+    @property
+    def progress(self):
+        """Avancement en pourcentage"""
+        if self.status == self.Status.DONE:
+            return 100
+        if not self.total_rows:
+            return 0
+        return min(99, self.processed_rows * 100 // self.total_rows)
@@ -1,649 +1,316 @@
-from io import BytesIO, StringIO
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from openpyxl import Workbook
-from docx import Document
-import csv
-
-def generate_sales_pdf(queryset):
-    buffer = BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
-    y = height - 50
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(50, y, "Liste des ventes")
-    y -= 30
-    c.setFont("Helvetica", 10)
-    cols = ["N° Facture", "Date", "Caissier", "Montant", "Statut"]
-    x_positions = [50, 150, 260, 380, 460]
-    for x, col in zip(x_positions, cols):
-        c.drawString(x, y, col)
-    y -= 20
-    for sale in queryset:
-        if y < 50:
-            c.showPage()
-            y = height - 50
-        values = [
-            sale.invoice_number,
-            sale.date.strftime("%d/%m/%Y %H:%M"),
-            sale.cashier.get_full_name(),
-            f"{sale.total_amount:.2f}€",
-            sale.get_status_display(),
-        ]
-        for x, val in zip(x_positions, values):
-            c.drawString(x, y, val)
-        y -= 15
-    c.save()
-    buffer.seek(0)
-    return buffer
-
-def generate_sales_excel(queryset):
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Ventes"
-    ws.append(['N° Facture', 'Date', 'Caissier', 'Montant', 'Statut'])
-    for sale in queryset:
-        ws.append([
-            sale.invoice_number,
-            sale.date.strftime('%d/%m/%Y %H:%M'),
-            sale.cashier.get_full_name(),
-            sale.total_amount,
-            sale.get_status_display(),
-        ])
-    stream = BytesIO()
-    wb.save(stream)
-    stream.seek(0)
-    return stream
-
-def generate_sales_docx(queryset):
-    doc = Document()
-    doc.add_heading('Liste des ventes', level=1)
-    table = doc.add_table(rows=1, cols=5)
-    hdr_cells = table.rows[0].cells
-    for idx, title in enumerate(['N° Facture', 'Date', 'Caissier', 'Montant', 'Statut']):
-        hdr_cells[idx].text = title
-    for sale in queryset:
-        row_cells = table.add_row().cells
-        row_cells[0].text = sale.invoice_number
-        row_cells[1].text = sale.date.strftime('%d/%m/%Y %H:%M')
-        row_cells[2].text = sale.cashier.get_full_name()
-        row_cells[3].text = f"{sale.total_amount:.2f}"
-        row_cells[4].text = sale.get_status_display()
-    stream = BytesIO()
-    doc.save(stream)
-    stream.seek(0)
-    return stream
-
-
-
-def generate_sales_csv(queryset):
-    # 1) Écrire dans un buffer texte
-    text_stream = StringIO()
-    writer = csv.writer(text_stream, delimiter='\t', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-    writer.writerow(['N° Facture', 'Date', 'Caissier', 'Montant', 'Statut'])
-    for sale in queryset:
-        writer.writerow([
-            sale.invoice_number,
-            sale.date.strftime('%d/%m/%Y %H:%M'),
-            sale.cashier.get_full_name(),
-            f"{sale.total_amount:.2f}",
-            sale.get_status_display(),
-        ])
-    # 2) Récupérer le texte et encoder en bytes
-    byte_stream = BytesIO(text_stream.getvalue().encode("utf-8"))
-    return byte_stream
+# apps/accounts/services.py
+"""
+Moteur d'export : chaque entité est décrite une fois par ses colonnes
+(ExportSpec). Les lignes sont lues en une seule requête values_list(),
+jointures comprises, mises en forme une fois, puis écrites en PDF, DOCX,
+XLSX ou CSV. Le nombre de requêtes ne dépend pas du nombre de lignes.
+"""
 
-
-
-
-from io import BytesIO,StringIO 
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from openpyxl import Workbook
-from docx import Document
 import csv
+import re
+import tempfile
+from io import BytesIO
+from xml.sax.saxutils import escape
 
-def generate_employees_pdf(queryset):
-    buffer = BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
-    y = height - 50
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(50, y, "Liste des employés")
-    y -= 30
-    c.setFont("Helvetica", 10)
-    cols = ["Nom", "Email", "Rôle", "Date d'inscription"]
-    x_positions = [50, 200, 350, 450]
-    for x, col in zip(x_positions, cols):
-        c.drawString(x, y, col)
-    y -= 20
-    for emp in queryset:
-        if y < 50:
-            c.showPage()
-            y = height - 50
-        values = [
-            emp.get_full_name(),
-            emp.email,
-            emp.get_role_display(),
-            emp.date_joined.strftime("%d/%m/%Y"),
-        ]
-        for x, val in zip(x_positions, values):
-            c.drawString(x, y, val)
-        y -= 15
-    c.save()
-    buffer.seek(0)
-    return buffer
-
-def generate_employees_excel(queryset):
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Employés"
-    ws.append(["Nom", "Email", "Rôle", "Date d'inscription"])
-    for emp in queryset:
-        ws.append([
-            emp.get_full_name(),
-            emp.email,
-            emp.get_role_display(),
-            emp.date_joined.strftime("%d/%m/%Y"),
-        ])
-    stream = BytesIO()
-    wb.save(stream)
-    stream.seek(0)
-    return stream
-
-def generate_employees_docx(queryset):
-    doc = Document()
-    doc.add_heading('Liste des employés', level=1)
-    table = doc.add_table(rows=1, cols=4)
-    hdr_cells = table.rows[0].cells
-    for idx, title in enumerate(['Nom', 'Email', 'Rôle', "Date d'inscription"]):
-        hdr_cells[idx].text = title
-    for emp in queryset:
-        row_cells = table.add_row().cells
-        row_cells[0].text = emp.get_full_name()
-        row_cells[1].text = emp.email
-        row_cells[2].text = emp.get_role_display()
-        row_cells[3].text = emp.date_joined.strftime("%d/%m/%Y")
-    stream = BytesIO()
-    doc.save(stream)
-    stream.seek(0)
-    return stream
-
-def generate_employees_csv(queryset):
-    # 1) Écrire dans un buffer texte
-    text_stream = StringIO()
-    writer = csv.writer(text_stream, delimiter='\t', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-    writer.writerow(["Nom", "Email", "Rôle", "Date d'inscription"])
-    for emp in queryset:
-        writer.writerow([
-            emp.get_full_name(),
-            emp.email,
-            emp.get_role_display(),
-            emp.date_joined.strftime("%d/%m/%Y"),
-        ])
-    # 2) Récupérer le texte et encoder en bytes
-    byte_stream = BytesIO(text_stream.getvalue().encode("utf-8"))
-    return byte_stream
-
-
-
-from io import BytesIO, StringIO
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from openpyxl import Workbook
+from django.conf import settings
+from django.utils import timezone
 from docx import Document
-import csv
-
-def generate_products_pdf(queryset):
-    buffer = BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
-    y = height - 50
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(50, y, "Liste des Produits")
-    y -= 30
-    c.setFont("Helvetica", 10)
-    cols = ["ID", "Nom", "Catégorie", "Prix", "Stock"]
-    x_positions = [50, 100, 300, 450, 550]
-    for x, col in zip(x_positions, cols):
-        c.drawString(x, y, col)
-    y -= 20
-    for prod in queryset:
-        if y < 50:
-            c.showPage()
-            y = height - 50
-        values = [
-            str(prod.id),
-            prod.name,
-            prod.category.name if prod.category else "-",
-            f"{prod.price:.2f}€",
-            str(prod.stock_quantity),
-        ]
-        for x, val in zip(x_positions, values):
-            c.drawString(x, y, val)
-        y -= 15
-    c.save()
-    buffer.seek(0)
-    return buffer
-
-def generate_products_excel(queryset):
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Produits"
-    ws.append(['ID', 'Nom', 'Catégorie', 'Prix', 'Stock'])
-    for prod in queryset:
-        ws.append([
-            prod.id,
-            prod.name,
-            prod.category.name if prod.category else "",
-            prod.price,
-            prod.stock_quantity,
-        ])
-    stream = BytesIO()
-    wb.save(stream)
-    stream.seek(0)
-    return stream
-
-def generate_products_docx(queryset):
-    doc = Document()
-    doc.add_heading('Liste des Produits', level=1)
-    table = doc.add_table(rows=1, cols=5)
-    hdr = table.rows[0].cells
-    for idx, title in enumerate(['ID', 'Nom', 'Catégorie', 'Prix', 'Stock']):
-        hdr[idx].text = title
-    for prod in queryset:
-        row_cells = table.add_row().cells
-        row_cells[0].text = str(prod.id)
-        row_cells[1].text = prod.name
-        row_cells[2].text = prod.category.name if prod.category else ""
-        row_cells[3].text = f"{prod.price:.2f}€"
-        row_cells[4].text = str(prod.stock_quantity)
-    buf = BytesIO()
-    doc.save(buf)
-    buf.seek(0)
-    return buf
-
-def generate_products_csv(queryset):
-    text_stream = StringIO()
-    writer = csv.writer(text_stream, delimiter=';', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-    writer.writerow(['ID', 'Nom', 'Catégorie', 'Prix', 'Stock'])
-    for prod in queryset:
-        writer.writerow([
-            prod.id,
-            prod.name,
-            prod.category.name if prod.category else "",
-            f"{prod.price:.2f}",
-            prod.stock_quantity,
-        ])
-    return BytesIO(text_stream.getvalue().encode('utf-8'))
-
-
-
-from io import BytesIO, StringIO
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+from docx.shared import Inches
+from lxml import etree
+from openpyxl import Workbook
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
-from openpyxl import Workbook
-from docx import Document
-import csv
-from docx.shared import Inches
 
-def generate_suppliers_pdf(queryset):
-    buffer = BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
-    y = height - 50
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(50, y, "Liste des Fournisseurs")
-    y -= 30
-    c.setFont("Helvetica", 10)
-    cols = ["ID", "Nom Complet", "Email", "Téléphone", "Adresse"]
-    # Colonnes élargies pour éviter le retour à la ligne
-    x_positions = [50, 150, 300, 450, 600]
-    for x, col in zip(x_positions, cols):
-        c.drawString(x, y, col)
-    y -= 20
-    for sup in queryset:
-        if y < 50:
-            c.showPage()
-            y = height - 50
-        # Utiliser nom et prénom si disponibles
-        full_name = f"{sup.last_name} {sup.first_name}" if hasattr(sup, 'first_name') else sup.name
-        values = [
-            str(sup.id),
-            full_name,
-            sup.email or "-",
-            sup.phone or "-",
-            sup.address or "-",  # remplacez par le champ réel
+from apps.core.models import Sale
+from .models import User
+
+EXPORT_FORMATS = {
+    'pdf': 'application/pdf',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'csv': 'text/csv',
+}
+
+
+# ===== DESCRIPTION DES EXPORTS =====
+
+class Column:
+    """
+    Colonne d'export : champ(s) lus par values_list(), fonction de mise en
+    forme et placement dans le PDF (abscisse) et le DOCX (largeur).
+    """
+
+    def __init__(self, title, *fields, value=None, money=False, pdf_x=50, docx_width=None):
+        self.title = title
+        self.fields = fields
+        self.value = value
+        self.money = money
+        self.pdf_x = pdf_x
+        self.docx_width = docx_width
+
+    def text(self, value):
+        """Rendu texte pour le PDF et le DOCX."""
+        if value is None:
+            return ""
+        if self.money:
+            return f"{value:.2f}€"
+        return str(value)
+
+
+class ExportSpec:
+    """Description d'un export : titre, feuille XLSX, séparateur CSV et colonnes."""
+
+    def __init__(self, title, sheet, columns, delimiter=';'):
+        self.title = title
+        self.sheet = sheet
+        self.columns = columns
+        self.delimiter = delimiter
+        self.fields = [field for column in columns for field in column.fields]
+
+    @property
+    def header(self):
+        return [column.title for column in self.columns]
+
+    def heading(self):
+        return self.title.format(today=timezone.localdate())
+
+
+def _full_name(first_name, last_name, username):
+    """Même règle que User.get_full_name, sans charger l'objet."""
+    if first_name and last_name:
+        return f"{first_name} {last_name}"
+    return username
+
+
+def _label(choices):
+    labels = dict(choices)
+    return lambda value: labels.get(value, value)
+
+
+def _datetime(fmt):
+    return lambda value: timezone.localtime(value).strftime(fmt)
+
+
+EXPORT_SPECS = {
+    'sales': ExportSpec("Liste des ventes", "Ventes", [
+        Column('N° Facture', 'invoice_number', pdf_x=50),
+        Column('Date', 'date', value=_datetime('%d/%m/%Y %H:%M'), pdf_x=150),
+        Column('Caissier', 'cashier__first_name', 'cashier__last_name', 'cashier__username',
+               value=_full_name, pdf_x=260),
+        Column('Montant', 'total_amount', money=True, pdf_x=380),
+        Column('Statut', 'status', value=_label(Sale.Status.choices), pdf_x=460),
+    ], delimiter='\t'),
+    'employees': ExportSpec("Liste des employés", "Employés", [
+        Column('Nom', 'first_name', 'last_name', 'username', value=_full_name, pdf_x=50),
+        Column('Email', 'email', pdf_x=200),
+        Column('Rôle', 'role', value=_label(User.Role.choices), pdf_x=350),
+        Column("Date d'inscription", 'date_joined', value=_datetime('%d/%m/%Y'), pdf_x=450),
+    ], delimiter='\t'),
+    'products': ExportSpec("Liste des Produits", "Produits", [
+        Column('ID', 'id', pdf_x=50),
+        Column('Nom', 'name', pdf_x=100),
+        Column('Catégorie', 'category__name', pdf_x=300),
+        Column('Prix', 'price', money=True, pdf_x=450),
+        Column('Stock', 'stock_quantity', pdf_x=550),
+    ]),
+    'suppliers': ExportSpec("Liste des Fournisseurs", "Fournisseurs", [
+        Column('ID', 'id', pdf_x=50, docx_width=Inches(0.5)),
+        Column('Nom', 'name', pdf_x=150, docx_width=Inches(2.0)),
+        Column('Email', 'email', pdf_x=300, docx_width=Inches(2.5)),
+        Column('Téléphone', 'phone', pdf_x=450, docx_width=Inches(1.5)),
+        Column('Adresse', 'address', pdf_x=600, docx_width=Inches(3.0)),
+    ]),
+    'categories': ExportSpec("Liste des Catégories", "Catégories", [
+        Column('ID', 'id', pdf_x=50, docx_width=Inches(0.5)),
+        Column('Nom', 'name', pdf_x=150, docx_width=Inches(2.0)),
+        Column('Description', 'description', pdf_x=350, docx_width=Inches(3.5)),
+    ]),
+    # Lignes déjà agrégées par apps.core.services.sales_report
+    'sales_report': ExportSpec("Rapport des Ventes – {today}", "Ventes", [
+        Column('Période', 'period', pdf_x=50, docx_width=Inches(1.5)),
+        Column('Total TTC', 'total', money=True, pdf_x=200, docx_width=Inches(2.0)),
+        Column('Nb transactions', 'count', pdf_x=400, docx_width=Inches(1.5)),
+    ]),
+    'stock_report': ExportSpec("Rapport des Stocks", "Stocks", [
+        Column('Produit', 'name', pdf_x=50, docx_width=Inches(2.5)),
+        Column('Catégorie', 'category__name', pdf_x=250, docx_width=Inches(2.0)),
+        Column('En stock', 'stock_quantity', pdf_x=450, docx_width=Inches(1.0)),
+    ]),
+}
+
+
+def export_rows(spec, queryset):
+    """
+    Lignes mises en forme, lues par paquets de EXPORT_CHUNK_SIZE dans une
+    seule requête (les jointures sont faites par values_list). Accepte aussi
+    une liste de tuples déjà calculée, dans l'ordre de spec.fields.
+    """
+    slices = []
+    start = 0
+    for column in spec.columns:
+        slices.append((column.value, start, start + len(column.fields)))
+        start += len(column.fields)
+    if isinstance(queryset, list):
+        rows = queryset
+    else:
+        rows = queryset.values_list(*spec.fields).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+    for raw in rows:
+        yield [
+            value(*raw[begin:end]) if value else raw[begin]
+            for value, begin, end in slices
         ]
-        for x, val in zip(x_positions, values):
-            c.drawString(x, y, val)
-        y -= 15
-    c.save()
-    buffer.seek(0)
-    return buffer
 
-def generate_suppliers_excel(queryset):
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Fournisseurs"
-    ws.append(['ID', 'Nom', 'Email', 'Téléphone', 'Adresse'])
-    for sup in queryset:
-        ws.append([
-            sup.id,
-            sup.name,
-            sup.email or "",
-            sup.phone or "",
-            sup.address or "",  # remplacez par le champ réel
-        ])
-    stream = BytesIO()
+
+# ===== ÉCRITURE DES FORMATS =====
+
+class _Echo:
+    """Pseudo-fichier : csv.writer renvoie la ligne au lieu de la stocker."""
+
+    def write(self, value):
+        return value
+
+
+def _stream_csv(header, rows, delimiter=';'):
+    """Encode les lignes en UTF-8 et les regroupe en blocs de EXPORT_CHUNK_SIZE."""
+    writer = csv.writer(_Echo(), delimiter=delimiter, quotechar='"', quoting=csv.QUOTE_MINIMAL)
+    chunk_size = settings.EXPORT_CHUNK_SIZE
+    pending = [writer.writerow(header)]
+    for row in rows:
+        pending.append(writer.writerow(row))
+        if len(pending) >= chunk_size:
+            yield ''.join(pending).encode('utf-8')
+            pending = []
+    if pending:
+        yield ''.join(pending).encode('utf-8')
+
+
+def write_xlsx(title, header, rows):
+    """
+    Classeur openpyxl en écriture seule : chaque ligne est sérialisée dès
+    l'append, et le fichier final est tamponné sur disque au-delà de
+    EXPORT_SPOOL_MAX_SIZE octets.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title)
+    ws.append(header)
+    for row in rows:
+        ws.append(row)
+    stream = tempfile.SpooledTemporaryFile(max_size=settings.EXPORT_SPOOL_MAX_SIZE)
     wb.save(stream)
     stream.seek(0)
     return stream
 
-def generate_suppliers_docx(queryset):
-    doc = Document()
-    doc.add_heading('Liste des Fournisseurs', level=1)
-
-    # Crée la table et désactive l'ajustement automatique
-    table = doc.add_table(rows=1, cols=5)
-    table.autofit = False
 
-    # Définit une largeur fixe pour chaque colonne
-    widths = [Inches(0.5), Inches(2.0), Inches(2.5), Inches(1.5), Inches(3.0)]
-    for idx, width in enumerate(widths):
-        table.columns[idx].width = width
-
-    # En-têtes
-    hdr_cells = table.rows[0].cells
-    for idx, title in enumerate(['ID', 'Nom Complet', 'Email', 'Téléphone', 'Adresse']):
-        hdr_cells[idx].text = title
-
-    # Lignes de données
-    for sup in queryset:
-        row_cells = table.add_row().cells
-        full_name = f"{sup.last_name} {sup.first_name}" if hasattr(sup, 'first_name') else sup.name
-        row_cells[0].text = str(sup.id)
-        row_cells[1].text = full_name
-        row_cells[2].text = sup.email or ""
-        row_cells[3].text = sup.phone or ""
-        row_cells[4].text = sup.address or ""  # remplacez par le champ réel
-
-    buf = BytesIO()
-    doc.save(buf)
-    buf.seek(0)
-    return buf
-
-
-
-def generate_suppliers_csv(queryset):
-    text_stream = StringIO()
-    writer = csv.writer(text_stream, delimiter=';', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-    writer.writerow(['ID', 'Nom', 'Email', 'Téléphone', 'Adresse'])
-    for sup in queryset:
-        writer.writerow([
-            sup.id,
-            sup.name,
-            sup.email or "",
-            sup.phone or "",
-            sup.address or "",  # remplacez par le champ réel
-        ])
-    return BytesIO(text_stream.getvalue().encode('utf-8'))
-
-
-
-from io import BytesIO, StringIO
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from openpyxl import Workbook
-from docx import Document
-import csv
-
-# PDF
-def generate_categories_pdf(queryset):
+def write_pdf(spec, rows):
     buffer = BytesIO()
     c = canvas.Canvas(buffer, pagesize=A4)
     width, height = A4
     y = height - 50
     c.setFont("Helvetica-Bold", 14)
-    c.drawString(50, y, "Liste des Catégories")
+    c.drawString(50, y, spec.heading())
     y -= 30
     c.setFont("Helvetica", 10)
-    cols = ["ID", "Nom", "Description"]
-    x_positions = [50, 150, 350]
-    for x, col in zip(x_positions, cols):
-        c.drawString(x, y, col)
+    for column in spec.columns:
+        c.drawString(column.pdf_x, y, column.title)
     y -= 20
-    for cat in queryset:
+    for row in rows:
         if y < 50:
             c.showPage()
             y = height - 50
-        values = [
-            str(cat.id),
-            cat.name,
-            cat.description or "-",
-        ]
-        for x, val in zip(x_positions, values):
-            c.drawString(x, y, val)
+        for column, value in zip(spec.columns, row):
+            c.drawString(column.pdf_x, y, column.text(value) or "-")
         y -= 15
     c.save()
     buffer.seek(0)
     return buffer
 
-# Excel
-def generate_categories_excel(queryset):
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Catégories"
-    ws.append(['ID', 'Nom', 'Description'])
-    for cat in queryset:
-        ws.append([
-            cat.id,
-            cat.name,
-            cat.description or "",
-        ])
-    stream = BytesIO()
-    wb.save(stream)
-    stream.seek(0)
-    return stream
 
-# Word
-from io import BytesIO
-from docx import Document
-from docx.shared import Inches
+# Lignes analysées par lxml en une fois : au-delà, le pic mémoire de
+# l'analyse dépasse le gain de temps
+DOCX_ROWS_PER_PARSE = 200
 
-def generate_categories_docx(queryset):
-    doc = Document()
-    doc.add_heading('Liste des Catégories', level=1)
-
-    # Crée la table et désactive l'ajustement automatique
-    table = doc.add_table(rows=1, cols=3)
-    table.autofit = False
-
-    # Définir largueurs de colonnes
-    widths = [Inches(0.5), Inches(2.0), Inches(3.5)]
-    for idx, width in enumerate(widths):
-        table.columns[idx].width = width
+# Caractères interdits en XML 1.0 (python-docx les refuse aussi)
+_XML_ILLEGAL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
 
-    # En-têtes
-    hdr_cells = table.rows[0].cells
-    for idx, title in enumerate(['ID', 'Nom', 'Description']):
-        hdr_cells[idx].text = title
-
-    # Lignes de données
-    for cat in queryset:
-        row_cells = table.add_row().cells
-        row_cells[0].text = str(cat.id)
-        row_cells[1].text = cat.name or ""
-        row_cells[2].text = cat.description or ""
 
-    buf = BytesIO()
-    doc.save(buf)
-    buf.seek(0)
-    return buf
+def _docx_cell_text(text):
+    """Contenu d'un <w:t> ; les retours à la ligne deviennent des <w:br/>."""
+    text = escape(_XML_ILLEGAL.sub('', text))
+    return text.replace('\n', '</w:t><w:br/><w:t xml:space="preserve">')
 
 
-# CSV/TSV
-def generate_categories_csv(queryset):
-    text_stream = StringIO()
-    writer = csv.writer(text_stream, delimiter=';', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-    writer.writerow(['ID', 'Nom', 'Description'])
-    for cat in queryset:
-        writer.writerow([
-            cat.id,
-            cat.name,
-            cat.description or "",
-        ])
-    return BytesIO(text_stream.getvalue().encode('utf-8'))
+def _without_nsdecl(element):
+    """XML de l'élément sans la déclaration d'espace de noms (portée par <w:tbl>)."""
+    return etree.tostring(element, encoding='unicode').replace(' ' + nsdecls('w'), '', 1)
 
 
+def append_docx_rows(table, rows):
+    """
+    Ajoute les lignes (tuples de textes) au tableau en construisant leur XML
+    d'un seul tenant, par paquets de DOCX_ROWS_PER_PARSE. Les propriétés de
+    cellule (largeurs) sont reprises de la ligne d'en-tête. Évite
+    table.add_row(), qui reparcourt le tableau à chaque ligne.
+    """
+    tbl = table._tbl
+    cells = [
+        '<w:tc>%s<w:p><w:r><w:t xml:space="preserve">%%s</w:t></w:r></w:p></w:tc>' % (
+            _without_nsdecl(tc.tcPr) if tc.tcPr is not None else ''
+        )
+        for tc in table.rows[0]._tr.tc_lst
+    ]
+    row_template = '<w:tr>%s</w:tr>' % ''.join(cells)
+    pending = []
 
-from io import BytesIO, StringIO
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from openpyxl import Workbook
-from docx import Document
-from docx.shared import Inches
-import csv
-from django.utils import timezone
+    def flush():
+        fragment = parse_xml('<w:tbl %s>%s</w:tbl>' % (nsdecls('w'), ''.join(pending)))
+        tbl.extend(list(fragment))
+        pending.clear()
 
-# 1. Ventes (chiffre d'affaires)
-def generate_sales_report_pdf(data):
-    buffer = BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
-    title = f"Rapport des Ventes – {timezone.now().date()}"
-    y = height - 50
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(50, y, title)
-    y -= 30
-    c.setFont("Helvetica", 10)
-    cols = ["Date", "Total TTC", "Nombre de transactions"]
-    x_positions = [50, 200, 400]
-    for x, col in zip(x_positions, cols):
-        c.drawString(x, y, col)
-    y -= 20
-    for row in data:
-        if y < 50:
-            c.showPage()
-            y = height - 50
-        values = [
-            row["date"].strftime("%Y-%m-%d"),
-            f"{row['total']:.2f}€",
-            str(row["count"])
-        ]
-        for x, val in zip(x_positions, values):
-            c.drawString(x, y, val)
-        y -= 15
-    c.save()
-    buffer.seek(0)
-    return buffer
+    for row in rows:
+        pending.append(row_template % tuple(_docx_cell_text(text) for text in row))
+        if len(pending) >= DOCX_ROWS_PER_PARSE:
+            flush()
+    if pending:
+        flush()
 
-def generate_sales_report_excel(data):
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Ventes"
-    ws.append(["Date", "Total TTC", "Nb transactions"])
-    for row in data:
-        date_str = row["date"].strftime("%Y-%m-%d")
-        ws.append([date_str, row["total"], row["count"]])
-    stream = BytesIO()
-    wb.save(stream)
-    stream.seek(0)
-    return stream
 
-def generate_sales_report_docx(data):
+def write_docx(spec, rows):
     doc = Document()
-    doc.add_heading("Rapport des Ventes", level=1)
-    table = doc.add_table(rows=1, cols=3)
-    table.autofit = False
-    widths = [Inches(1.5), Inches(2.0), Inches(1.5)]
-    for idx, w in enumerate(widths):
-        table.columns[idx].width = w
-    hdr = table.rows[0].cells
-    for idx, title in enumerate(["Date", "Total TTC", "Nb transactions"]):
-        hdr[idx].text = title
-    for row in data:
-        cells = table.add_row().cells
-        cells[0].text = row["date"].strftime("%Y-%m-%d")
-        cells[1].text = f"{row['total']:.2f}€"
-        cells[2].text = str(row["count"])
+    doc.add_heading(spec.heading(), level=1)
+    table = doc.add_table(rows=1, cols=len(spec.columns))
+    if any(column.docx_width for column in spec.columns):
+        # Largeurs fixes : désactive l'ajustement automatique
+        table.autofit = False
+        for idx, column in enumerate(spec.columns):
+            table.columns[idx].width = column.docx_width
+    hdr_cells = table.rows[0].cells
+    for idx, column in enumerate(spec.columns):
+        hdr_cells[idx].text = column.title
+    append_docx_rows(table, (
+        [column.text(value) for column, value in zip(spec.columns, row)]
+        for row in rows
+    ))
     buf = BytesIO()
     doc.save(buf)
     buf.seek(0)
     return buf
 
-def generate_sales_report_csv(data):
-    text_stream = StringIO()
-    writer = csv.writer(text_stream, delimiter=';', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-    writer.writerow(["Date", "Total TTC", "Nb transactions"])
-    for row in data:
-        date_str = row["date"].strftime("%Y-%m-%d")
-        writer.writerow([date_str, f"{row['total']:.2f}", row["count"]])
-    return BytesIO(text_stream.getvalue().encode("utf-8"))
-
-# 2. Stocks (quantités restantes)
-def generate_stock_report_pdf(data):
-    buffer = BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(50, height - 50, "Rapport des Stocks")
-    y = height - 80
-    c.setFont("Helvetica", 10)
-    cols = ["Produit", "Catégorie", "En stock"]
-    x_positions = [50, 250, 450]
-    for x, col in zip(x_positions, cols):
-        c.drawString(x, y, col)
-    y -= 20
-    for row in data:
-        if y < 50:
-            c.showPage()
-            y = height - 50
-        values = [row["name"], row["category"], str(row["stock"])]
-        for x, val in zip(x_positions, values):
-            c.drawString(x, y, val)
-        y -= 15
-    c.save()
-    buffer.seek(0)
-    return buffer
-
-def generate_stock_report_excel(data):
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Stocks"
-    ws.append(["Produit", "Catégorie", "En stock"])
-    for row in data:
-        ws.append([row["name"], row["category"], row["stock"]])
-    stream = BytesIO()
-    wb.save(stream)
-    stream.seek(0)
-    return stream
-
-def generate_stock_report_docx(data):
-    doc = Document()
-    doc.add_heading("Rapport des Stocks", level=1)
-    table = doc.add_table(rows=1, cols=3)
-    table.autofit = False
-    widths = [Inches(2.5), Inches(2.0), Inches(1.0)]
-    for idx, w in enumerate(widths):
-        table.columns[idx].width = w
-    hdr = table.rows[0].cells
-    for idx, title in enumerate(["Produit", "Catégorie", "En stock"]):
-        hdr[idx].text = title
-    for row in data:
-        cells = table.add_row().cells
-        cells[0].text = row["name"]
-        cells[1].text = row["category"]
-        cells[2].text = str(row["stock"])
-    buf = BytesIO()
-    doc.save(buf)
-    buf.seek(0)
-    return buf
 
-def generate_stock_report_csv(data):
-    text_stream = StringIO()
-    writer = csv.writer(text_stream, delimiter=';', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-    writer.writerow(["Produit", "Catégorie", "En stock"])
-    for row in data:
-        writer.writerow([row["name"], row["category"], row["stock"]])
-    return BytesIO(text_stream.getvalue().encode("utf-8"))
+def render_export(kind, queryset, fmt):
+    """
+    Export `kind` du queryset au format `fmt`. Renvoie un fichier prêt à lire
+    (PDF, DOCX, XLSX) ou un générateur de blocs d'octets (CSV).
+    """
+    spec = EXPORT_SPECS[kind]
+    rows = export_rows(spec, queryset)
+    if fmt == 'csv':
+        return _stream_csv(spec.header, rows, delimiter=spec.delimiter)
+    if fmt == 'xlsx':
+        return write_xlsx(spec.sheet, spec.header, rows)
+    if fmt == 'pdf':
+        return write_pdf(spec, rows)
+    if fmt == 'docx':
+        return write_docx(spec, rows)
+    raise ValueError(f"Format d'export inconnu : {fmt}")
@@ -1,15 +1,41 @@
-from django.test import TestCase, Client
-from django.urls import reverse
+import datetime
+import io
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO
+
 from django.contrib.auth import get_user_model
 from django.core import mail
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from docx import Document
+from openpyxl import load_workbook
+
+from apps.core.models import Category, Product, Sale, SaleItem, Supplier
+from apps.core.services import checkout
+from apps.core.testing import AdminTestCase, StoreTestCase, create_user
+from .filters import (
+    filter_categories, filter_employees, filter_products, filter_sales, filter_sales_report,
+    filter_stock_report, filter_suppliers,
+)
+from .forms import SaleSearchForm
+from .jobs import claim_next_job, enqueue_export, purge_expired_exports, run_export_job
+from .services import EXPORT_FORMATS, EXPORT_SPECS, export_rows, render_export, write_docx
 
 User = get_user_model()
 
 
-class AuthViewsTest(TestCase):
+class AuthViewsTest(StoreTestCase):
     """Tests pour les vues d'authentification"""
 
     def setUp(self):
+        super().setUp()
         self.client = Client()
         self.admin_user = User.objects.create_user(
             username='admin_test',
@@ -71,3 +97,305 @@ class AuthViewsTest(TestCase):
         # Vérifier qu'un email a été envoyé
         self.assertEqual(len(mail.outbox), 1)
         self.assertIn('Store Manager', mail.outbox[0].subject)
+
+
+class StreamingCsvExportTest(StoreTestCase):
+    """Tests pour les exports CSV en flux"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.cashier = create_user('caissier', first_name='Awa', last_name='Diop')
+        category = Category.objects.create(name='Boissons')
+        Product.objects.create(name='Eau', category=category, price='1.50', stock_quantity=12)
+        Sale.objects.create(
+            invoice_number='F-0001', cashier=cls.cashier,
+            customer_name='Client', total_amount='3.00'
+        )
+
+    def read(self, url_name):
+        response = self.client.get(reverse(f'accounts:{url_name}'))
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_sales_csv(self):
+        """Test export des ventes : une requête, nom du caissier sans N+1"""
+        with self.assertNumQueries(1):
+            content = self.read('export_csv')
+        lines = content.splitlines()
+        self.assertEqual(lines[0], 'N° Facture\tDate\tCaissier\tMontant\tStatut')
+        self.assertIn('F-0001\t', lines[1])
+        self.assertTrue(lines[1].endswith('\tAwa Diop\t3.00\tPayé'))
+
+    def test_products_and_stock_report_csv(self):
+        """Test export des produits et du rapport de stock"""
+        self.assertEqual(self.read('export_products_csv').splitlines()[1].split(';')[1:], ['Eau', 'Boissons', '1.50', '12'])
+        self.assertEqual(self.read('export_stock_report_csv').splitlines()[1], 'Eau;Boissons;12')
+
+    def test_chunked_output(self):
+        """Test découpage en plusieurs blocs"""
+        create_user('gerant', User.Role.ADMIN)
+        with override_settings(EXPORT_CHUNK_SIZE=2):
+            response = self.client.get(reverse('accounts:export_employees_csv'))
+            chunks = list(response.streaming_content)
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(len(chunks[1].decode('utf-8').splitlines()), 1)
+
+    def test_sales_excel(self):
+        """Test export XLSX en écriture seule"""
+        response = self.client.get(reverse('accounts:export_excel'))
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="ventes.xlsx"')
+        ws = load_workbook(BytesIO(b''.join(response.streaming_content))).active
+        rows = list(ws.values)
+        self.assertEqual(list(rows[0]), ['N° Facture', 'Date', 'Caissier', 'Montant', 'Statut'])
+        self.assertEqual((rows[1][0], rows[1][2], rows[1][3]), ('F-0001', 'Awa Diop', 3))
+
+
+class ExportJobTest(AdminTestCase):
+    """Tests pour les exports en arrière-plan"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        category = Category.objects.create(name='Boissons')
+        for i in range(5):
+            Product.objects.create(name=f'Produit {i}', category=category, price='2.00', stock_quantity=i)
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name, EXPORT_PROGRESS_EVERY=2)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client.force_login(self.admin)
+
+    def test_job_lifecycle(self):
+        """Test mise en file, exécution par le worker, suivi et téléchargement"""
+        response = self.client.post(
+            reverse('accounts:export_job_start', args=['products', 'csv']) + '?name=Produit'
+        )
+        self.assertEqual(response.status_code, 202)
+        status_url = response.json()['status_url']
+        self.assertEqual(self.client.get(status_url).json()['status'], 'PENDING')
+
+        call_command('run_export_worker', '--once', stdout=io.StringIO())
+
+        data = self.client.get(status_url).json()
+        self.assertEqual((data['status'], data['progress'], data['processed_rows'], data['total_rows']), ('DONE', 100, 5, 5))
+        download = self.client.get(data['download_url'])
+        self.assertEqual(download['Content-Disposition'], 'attachment; filename="produits.csv"')
+        content = b''.join(download.streaming_content).decode('utf-8')
+        download.close()
+        self.assertEqual(len(content.splitlines()), 6)
+
+    def test_unknown_export_and_other_user(self):
+        """Test export inconnu et job d'un autre utilisateur"""
+        response = self.client.post(reverse('accounts:export_job_start', args=['products', 'odt']))
+        self.assertEqual(response.status_code, 400)
+        cashier = create_user('caissier')
+        job = enqueue_export(self.admin, 'sales', 'pdf', {})
+        self.client.force_login(cashier)
+        self.assertEqual(self.client.get(reverse('accounts:export_job_status', args=[job.pk])).status_code, 404)
+
+    def test_expired_jobs_purged(self):
+        """Test suppression des fichiers expirés"""
+        enqueue_export(self.admin, 'stock_report', 'xlsx', {})
+        job = run_export_job(claim_next_job())
+        path = job.file.path
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(purge_expired_exports(timezone.now() + timedelta(days=2)), 1)
+        self.assertFalse(os.path.exists(path))
+
+
+class ExportEngineTest(StoreTestCase):
+    """Tests pour le moteur d'export déclaratif"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        category = Category.objects.create(name='Boissons', description='Froides')
+        Supplier.objects.create(
+            name='Grossiste', contact_person='Moussa', email='contact@grossiste.sn',
+            phone='+221770000000', address='Dakar', city='Dakar', postal_code='10000'
+        )
+        for i in range(3):
+            cashier = create_user(f'caissier{i}', first_name='Awa', last_name=f'Diop{i}')
+            Product.objects.create(name=f'Produit {i}', category=category, price='2.50', stock_quantity=i)
+            Sale.objects.create(
+                invoice_number=f'F-{i}', cashier=cashier, customer_name='Client', total_amount='4.00'
+            )
+
+    def test_one_query_per_export(self):
+        """Test une seule requête par export, pour chaque entité et chaque format"""
+        querysets = {
+            'sales': filter_sales({}),
+            'employees': filter_employees({}),
+            'products': filter_products({}),
+            'suppliers': filter_suppliers({}),
+            'categories': filter_categories({}),
+            'stock_report': filter_stock_report({}),
+        }
+        for kind, queryset in querysets.items():
+            for fmt in EXPORT_FORMATS:
+                with self.subTest(kind=kind, fmt=fmt), self.assertNumQueries(1):
+                    output = render_export(kind, queryset, fmt)
+                    if fmt == 'csv':
+                        output = list(output)
+
+    def test_filters_match_list_forms(self):
+        """Test des filtres d'export : bornes de prix, statut, recherche fournisseurs et catégories"""
+        Product.objects.create(name='Produit cher', category=Category.objects.get(), price='9.00',
+                               stock_quantity=1, status=Product.Status.INACTIVE)
+        names = lambda qs: [obj.name for obj in qs]
+        self.assertEqual(names(filter_products({'price_min': '5'})), ['Produit cher'])
+        self.assertEqual(len(filter_products({'price_max': '3.00'})), 3)
+        self.assertEqual(names(filter_products({'status': 'INACTIVE'})), ['Produit cher'])
+        Supplier.objects.create(
+            name='Importateur', contact_person='Fatou', email='fatou@import.sn', phone='+221770000001',
+            address='Thiès', city='Thiès', postal_code='21000', status=Supplier.Status.INACTIVE
+        )
+        self.assertEqual(names(filter_suppliers({'search': 'gross'})), ['Grossiste'])
+        self.assertEqual(names(filter_suppliers({'status': 'INACTIVE'})), ['Importateur'])
+        self.assertEqual(names(filter_categories({'search': 'bois'})), ['Boissons'])
+        self.assertEqual(names(filter_categories({'search': 'fruits'})), [])
+
+    def test_docx_bulk_rows(self):
+        """Test tableau Word construit en bloc (échappement, retours à la ligne)"""
+        rows = [[i, f'Fournisseur <{i}> & fils', 'a@b.sn', '', 'Rue 1\nDakar'] for i in range(450)]
+        table = Document(write_docx(EXPORT_SPECS['suppliers'], rows)).tables[0]
+        self.assertEqual(len(table.rows), 451)
+        self.assertEqual(
+            [cell.text for cell in table.rows[450].cells],
+            ['449', 'Fournisseur <449> & fils', 'a@b.sn', '', 'Rue 1\nDakar']
+        )
+
+    def test_rows_formatted_once(self):
+        """Test mise en forme des lignes (nom complet, libellé de statut)"""
+        row = next(export_rows(EXPORT_SPECS['sales'], filter_sales({'invoice_number': 'F-1'})))
+        self.assertEqual((row[0], row[2], str(row[3]), row[4]), ('F-1', 'Awa Diop1', '4.00', 'Payé'))
+
+
+class SalesReportTest(StoreTestCase):
+    """Tests pour le rapport des ventes agrégé"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.cashier = create_user('caissier')
+        now = timezone.now()
+        for i, (days, amount) in enumerate([(0, '10.00'), (0, '5.50'), (1, '4.00'), (40, '7.00')]):
+            Sale.objects.create(
+                invoice_number=f'F-{i}', cashier=cls.cashier, customer_name='Client',
+                total_amount=amount, date=now - datetime.timedelta(days=days)
+            )
+        Sale.objects.create(
+            invoice_number='F-R', cashier=cls.cashier, customer_name='Client',
+            total_amount='99.00', status=Sale.Status.REFUNDED
+        )
+        cls.today = timezone.localdate()
+
+    def test_grouped_by_day_and_month(self):
+        """Test agrégation par jour et par mois (ventes payées uniquement)"""
+        with self.assertNumQueries(1):
+            rows = filter_sales_report({})
+        self.assertEqual(rows[-1], (self.today.isoformat(), Decimal('15.50'), 2))
+        self.assertEqual(sum(count for _, _, count in rows), 4)
+        months = filter_sales_report({'granularity': 'month'})
+        self.assertEqual(sum(total for _, total, _ in months), Decimal('26.50'))
+        self.assertEqual(months[-1][0], self.today.strftime('%Y-%m'))
+
+    def test_cached_until_sales_change(self):
+        """Test résultat partagé entre les formats puis invalidé par une vente"""
+        url = reverse('accounts:export_sales_report_csv')
+        params = {'start': self.today.isoformat(), 'end': self.today.isoformat()}
+        first = b''.join(self.client.get(url, params).streaming_content)
+        with self.assertNumQueries(0):
+            self.client.get(reverse('accounts:export_sales_report_excel'), params)
+        with self.captureOnCommitCallbacks(execute=True):
+            Sale.objects.create(
+                invoice_number='F-9', cashier=self.cashier, customer_name='Client', total_amount='1.00'
+            )
+        second = b''.join(self.client.get(url, params).streaming_content)
+        self.assertIn(b'15.50;2', first)
+        self.assertIn(b'16.50;3', second)
+
+
+class SaleProductFilterTest(AdminTestCase):
+    """Tests pour le filtre des ventes par nom de produit"""
+
+    def test_filter_uses_search_index(self):
+        """Test : liste et exports trouvent « cafe » pour « Café moulu » (index plein texte)"""
+        if connection.vendor != 'sqlite':
+            self.skipTest("Index FTS5 : SQLite uniquement")
+        cat = Category.objects.create(name='Épicerie')
+        coffee = Product.objects.create(name='Café moulu', category=cat, price='4.00', stock_quantity=5)
+        tea = Product.objects.create(name='Thé vert', category=cat, price='3.00', stock_quantity=5)
+        sale = checkout(self.admin, [
+            {'sku': coffee.pk, 'qty': 2, 'price': '4.00'},
+            {'sku': tea.pk, 'qty': 1, 'price': '3.00'},
+        ])
+        checkout(self.admin, [{'sku': tea.pk, 'qty': 1, 'price': '3.00'}])
+
+        self.assertEqual(list(filter_sales({'product_name': 'cafe'})), [sale])
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('accounts:sale_list'), {'product_name': 'cafe'})
+        self.assertEqual(list(response.context['page_obj']), [sale])
+
+
+class CachedChoicesTest(AdminTestCase):
+    """Tests pour les listes de choix en cache et l'autocomplétion des produits"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.cat = Category.objects.create(name='Boissons')
+        cls.products = [
+            Product.objects.create(name=f'Jus {i}', category=cls.cat, price='2.50', stock_quantity=10)
+            for i in range(3)
+        ]
+        cls.sale = Sale.objects.create(
+            invoice_number='F-1', cashier=cls.admin, customer_name='Client', total_amount='5.00'
+        )
+        for product in cls.products:
+            SaleItem.objects.create(sale=cls.sale, product=product, quantity=1, unit_price='2.50')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.admin)
+
+    def test_choices_are_cached_until_a_write(self):
+        """Test : liste des caissiers lue une fois, relue après création d'un employé"""
+        with self.assertNumQueries(1):
+            str(SaleSearchForm()['cashier'])
+        with self.assertNumQueries(0):
+            html = str(SaleSearchForm()['cashier'])
+        self.assertIn('gerant', html)
+        create_user('nouveau')
+        self.assertIn('nouveau', str(SaleSearchForm()['cashier']))
+        self.assertTrue(SaleSearchForm({'cashier': self.admin.pk}).is_valid())
+
+    def test_sale_form_does_not_render_the_catalog(self):
+        """Test : le formulaire de vente ne dépend pas de la taille du catalogue"""
+        url = reverse('accounts:sale_update', args=[self.sale.pk])
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as before:
+            response = self.client.get(url)
+        Product.objects.bulk_create([
+            Product(name=f'Soda {i}', category=self.cat, price='1.00', stock_quantity=5) for i in range(50)
+        ])
+        with CaptureQueriesContext(connection) as after:
+            self.client.get(url)
+        self.assertEqual(len(before), len(after))
+        self.assertContains(response, 'data-autocomplete-url')
+        self.assertContains(response, 'js/autocomplete.js')
+        self.assertContains(response, '<option value="%d" selected>Jus 2</option>' % self.products[2].pk, html=True)
+        self.assertNotContains(self.client.get(reverse('accounts:sale_create')), 'Jus 1')
+
+    def test_product_autocomplete(self):
+        """Test de l'autocomplétion JSON des produits"""
+        response = self.client.get(reverse('accounts:product_autocomplete'), {'q': 'jus'})
+        results = response.json()['results']
+        self.assertEqual({r['text'] for r in results}, {'Jus 0', 'Jus 1', 'Jus 2'})
+        self.assertEqual(results[0]['price'], '2.50')
+        self.assertEqual(self.client.get(reverse('accounts:product_autocomplete')).json(), {'results': []})
@@ -53,6 +53,10 @@ urlpatterns = [
     path('sales/<int:pk>/edit/',views.sale_update,                   name='sale_update'),
     path('sales/<int:pk>/delete/',views.SaleDeleteView.as_view(),    name='sale_delete'),
     path('sales/<int:pk>/json/',views.sale_detail_json,               name='sale_detail_json'),
+    path('sales/products/autocomplete/', views.product_autocomplete, name='product_autocomplete'),
+
+    # Historique des activités
+    path('activity/',         views.ActivityLogListView.as_view(),   name='activity_list'),
 
     #export ventes
     path('sales/export/pdf/', views.export_sales_pdf, name='export_pdf'),
@@ -95,4 +99,9 @@ urlpatterns = [
     path("reports/stock/csv/",   views.export_stock_report_csv,   name="export_stock_report_csv"),
     path("reports/stock/docx/", views.export_stock_report_docx, name="export_stock_report_docx"),
 
+    # Exports en arrière-plan
+    path('exports/<str:kind>/<str:fmt>/start/', views.export_job_start,    name='export_job_start'),
+    path('exports/jobs/<int:pk>/',              views.export_job_status,   name='export_job_status'),
+    path('exports/jobs/<int:pk>/download/',     views.export_job_download, name='export_job_download'),
+
 ]
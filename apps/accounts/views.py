@@ -13,9 +13,24 @@ from django.contrib.auth.views import (
 )
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.auth import logout
-
-from apps.core.models import Supplier, Category, Product, Sale
+from django.contrib.auth.decorators import login_required
+
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from apps.core.caching import cache_until_write, cached
+from apps.core.counters import batched_counters, read_counters, status_badges
+from apps.core.models import Supplier, Category, Product, Sale, SaleItem
+from apps.core.pagination import CursorPaginationMixin
+from apps.core.search import search_products
+from apps.core.services import apply_sales_contribution, sales_contribution
 from .models import User, ActivityLog
+from .filters import (
+    filter_sales, filter_employees, filter_products, filter_suppliers,
+    filter_categories, filter_sales_report, filter_stock_report,
+    filter_by_product_name,
+)
 from .forms import (
     LoginForm, RegisterForm,
     EmployeeCreateForm, EmployeeUpdateForm, EmployeeSearchForm,
@@ -108,6 +123,11 @@ class AdminRequiredMixin(UserPassesTestMixin):
         return redirect('accounts:login')
 
 
+def _is_filtered(form):
+    """Vrai si la recherche restreint la liste (badges calculés sur le filtre)"""
+    return form.is_valid() and any(form.cleaned_data.values())
+
+
 # ====================== CRUD EMPLOYÉS ======================
 
 
@@ -119,7 +139,7 @@ class EmployeeListView(LoginRequiredMixin, AdminRequiredMixin, ListView):
 
     def get_queryset(self):
         qs = User.objects.exclude(pk=self.request.user.pk).order_by('-date_joined')
-        form = EmployeeSearchForm(self.request.GET)
+        self.form = form = EmployeeSearchForm(self.request.GET)
         if form.is_valid():
             search = form.cleaned_data.get('search')
             role = form.cleaned_data.get('role')
@@ -138,12 +158,19 @@ class EmployeeListView(LoginRequiredMixin, AdminRequiredMixin, ListView):
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
-        form = EmployeeSearchForm(self.request.GET)
-        qs = self.get_queryset()
+        form = self.form
         ctx['search_form'] = form
-        ctx['total'] = qs.count()
-        ctx['active'] = qs.filter(is_active=True).count()
-        ctx['inactive'] = qs.filter(is_active=False).count()
+        if _is_filtered(form):
+            badges = status_badges(User, 'is_active', [True, False],
+                                   queryset=ctx['page_obj'].paginator.object_list)
+        else:
+            # Compteurs globaux, moins l'utilisateur connecté (exclu de la liste)
+            badges = status_badges(User, 'is_active', [True, False])
+            badges['total'] -= 1
+            badges[str(self.request.user.is_active)] -= 1
+        ctx['total'] = badges['total']
+        ctx['active'] = badges['True']
+        ctx['inactive'] = badges['False']
         return ctx
 
 
@@ -241,17 +268,19 @@ class SupplierListView(LoginRequiredMixin, AdminRequiredMixin, ListView):
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         form = getattr(self, 'form', SupplierSearchForm())
-        qs = ctx['page_obj'].paginator.object_list
         ctx['search_form'] = form
-        ctx['total'] = qs.count()
         if form.is_valid():
             ctx['status_filter'] = form.cleaned_data.get('status', '')
         else:
             ctx['status_filter'] = ''
         ctx['status_choices'] = Supplier.Status.choices
-        ctx['active'] = qs.filter(status=Supplier.Status.ACTIVE).count()
-        ctx['inactive'] = qs.filter(status=Supplier.Status.INACTIVE).count()
-        ctx['suspended'] = qs.filter(status=Supplier.Status.SUSPENDED).count()
+        badges = status_badges(Supplier, queryset=(
+            ctx['page_obj'].paginator.object_list if _is_filtered(form) else None
+        ))
+        ctx['total'] = badges['total']
+        ctx['active'] = badges[Supplier.Status.ACTIVE]
+        ctx['inactive'] = badges[Supplier.Status.INACTIVE]
+        ctx['suspended'] = badges[Supplier.Status.SUSPENDED]
         return ctx
 
 
@@ -416,20 +445,18 @@ class ProductListView(LoginRequiredMixin, AdminRequiredMixin, ListView):
             search = self.form.cleaned_data.get('search', '')
             category = self.form.cleaned_data.get('category')
             status = self.form.cleaned_data.get('status')
-            if search:
-                qs = qs.filter(name__icontains=search)
             if category:
                 qs = qs.filter(category=category)
             if status:
                 qs = qs.filter(status=status)
+            if search:
+                qs = search_products(qs, search)
         return qs
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         form = getattr(self, 'form', ProductSearchForm())
-        qs = ctx['page_obj'].paginator.object_list
         ctx['search_form'] = form
-        ctx['total'] = qs.count()
         if form.is_valid():
             ctx['search_filter'] = form.cleaned_data.get('search', '')
             ctx['category_filter'] = form.cleaned_data.get('category')
@@ -439,9 +466,13 @@ class ProductListView(LoginRequiredMixin, AdminRequiredMixin, ListView):
             ctx['category_filter'] = None
             ctx['status_filter'] = None
         ctx['status_choices'] = Product.Status.choices
-        ctx['active'] = qs.filter(status=Product.Status.ACTIVE).count()
-        ctx['out_of_stock'] = qs.filter(status=Product.Status.OUT_OF_STOCK).count()
-        ctx['inactive'] = qs.filter(status=Product.Status.INACTIVE).count()
+        badges = status_badges(Product, queryset=(
+            ctx['page_obj'].paginator.object_list if _is_filtered(form) else None
+        ))
+        ctx['total'] = badges['total']
+        ctx['active'] = badges[Product.Status.ACTIVE]
+        ctx['out_of_stock'] = badges[Product.Status.OUT_OF_STOCK]
+        ctx['inactive'] = badges[Product.Status.INACTIVE]
         return ctx
 
 
@@ -509,25 +540,32 @@ class ProductDeleteView(LoginRequiredMixin, AdminRequiredMixin, DeleteView):
 
 # ====================== CRUD VENTES ======================
 
-class SaleListView(LoginRequiredMixin, ListView):
+class SaleListView(LoginRequiredMixin, CursorPaginationMixin, ListView):
     model = Sale
     template_name = 'accounts/sales/sale_list.html'
     paginate_by = 7
+    # Pagination par curseur sur (date, id) ; le total reste affiché en en-tête
+    cursor_ordering = ('-date', '-id')
+    cursor_count = True
+    # Nombre de lignes par sous-requête corrélée (index des lignes par
+    # vente) : ni chargement des lignes ni COUNT par vente dans le gabarit
     queryset = (
         Sale.objects
             .select_related('cashier')
-            .prefetch_related('items__product')
-            .order_by('-date')
+            .annotate(item_count=Coalesce(Subquery(
+                SaleItem.objects.filter(sale=OuterRef('pk')).order_by()
+                    .values('sale').annotate(n=Count('pk')).values('n')
+            ), 0))
     )
 
     def get_queryset(self):
         qs = super().get_queryset()
-        form = SaleSearchForm(self.request.GET)
+        self.form = form = SaleSearchForm(self.request.GET)
         if form.is_valid():
             # Filtre par nom de produit
             pn = form.cleaned_data.get('product_name')
             if pn:
-                qs = qs.filter(items__product__name__icontains=pn).distinct()
+                qs = filter_by_product_name(qs, pn)
             # Filtres existants
             if form.cleaned_data['invoice_number']:
                 qs = qs.filter(invoice_number__icontains=form.cleaned_data['invoice_number'])
@@ -536,25 +574,43 @@ class SaleListView(LoginRequiredMixin, ListView):
             if form.cleaned_data['status']:
                 qs = qs.filter(status=form.cleaned_data['status'])
             if form.cleaned_data['date_from']:
-                qs = qs.filter(date__date__gte=form.cleaned_data['date_from'])
+                qs = qs.filter(business_date__gte=form.cleaned_data['date_from'])
             if form.cleaned_data['date_to']:
-                qs = qs.filter(date__date__lte=form.cleaned_data['date_to'])
+                qs = qs.filter(business_date__lte=form.cleaned_data['date_to'])
         return qs
 
+    def get_cursor_count(self):
+        # Sans filtre, le total vient du compteur des ventes (pas de COUNT(*))
+        if _is_filtered(self.form):
+            return True
+        return lambda: read_counters('sale')['sale']
+
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
-        ctx['search_form'] = SaleSearchForm(self.request.GET)
+        ctx['search_form'] = self.form
         ctx['total_revenue'] = sum(s.total_amount for s in ctx['page_obj'])
         return ctx
 
 
+class ActivityLogListView(LoginRequiredMixin, AdminRequiredMixin, CursorPaginationMixin, ListView):
+    """Historique complet des activités, paginé par curseur sur (timestamp, id)"""
+    model = ActivityLog
+    template_name = 'accounts/activity/activity_list.html'
+    context_object_name = 'activities'
+    paginate_by = 20
+    cursor_ordering = ('-timestamp', '-id')
+    queryset = ActivityLog.objects.select_related('user')
+
+
 class SaleBulkDeleteView(LoginRequiredMixin, View):
     def post(self, request, *args, **kwargs):
         ids = request.POST.getlist('sale_ids')
         if ids:
             sales = Sale.objects.filter(pk__in=ids)
             count = sales.count()
-            sales.delete()
+            with transaction.atomic(), batched_counters():
+                apply_sales_contribution(sales_contribution(sales), sign=-1)
+                sales.delete()
             messages.success(request, f"{count} vente(s) supprimée(s).")
             ActivityLog.objects.create(
                 user=self.request.user,
@@ -567,16 +623,38 @@ class SaleBulkDeleteView(LoginRequiredMixin, View):
         return redirect('accounts:sale_list')
 
 
+# Suggestions du champ produit des lignes de vente (AutocompleteSelect)
+PRODUCT_AUTOCOMPLETE_LIMIT = 20
+
+
+@login_required
+def product_autocomplete(request):
+    q = request.GET.get('q', '').strip()
+    if not q:
+        return JsonResponse({'results': []})
+
+    def build():
+        matches = search_products(Product.objects.all(), q)[:PRODUCT_AUTOCOMPLETE_LIMIT]
+        return [
+            {'id': pk, 'text': name, 'price': f'{price:.2f}'}
+            for pk, name, price in matches.values_list('pk', 'name', 'price')
+        ]
+
+    return JsonResponse({'results': cached('product-autocomplete', [Product, Category], build, q.lower())})
+
+
 def sale_create(request):
     if request.method == 'POST':
         form = SaleForm(request.POST)
         formset = SaleItemFormSet(request.POST)
         if form.is_valid() and formset.is_valid():
-            sale = form.save()
-            formset.instance = sale
-            formset.save()
-            sale.total_amount = sum(item.line_total for item in sale.items.all())
-            sale.save()
+            with transaction.atomic():
+                sale = form.save()
+                formset.instance = sale
+                formset.save()
+                sale.total_amount = sum(item.line_total for item in sale.items.all())
+                sale.save()
+                apply_sales_contribution(sales_contribution(Sale.objects.filter(pk=sale.pk)))
             messages.success(request, f"Vente {sale.invoice_number} enregistrée.")
             ActivityLog.objects.create(
                 user=request.user,
@@ -597,10 +675,16 @@ def sale_update(request, pk):
         form = SaleForm(request.POST, instance=sale)
         formset = SaleItemFormSet(request.POST, instance=sale)
         if form.is_valid() and formset.is_valid():
-            form.save()
-            formset.save()
-            sale.total_amount = sum(item.line_total for item in sale.items.all())
-            sale.save()
+            # Modification ou remboursement : on retire l'ancienne contribution
+            # à la synthèse journalière avant d'ajouter la nouvelle
+            with transaction.atomic():
+                before = sales_contribution(Sale.objects.filter(pk=sale.pk))
+                form.save()
+                formset.save()
+                sale.total_amount = sum(item.line_total for item in sale.items.all())
+                sale.save()
+                apply_sales_contribution(before, sign=-1)
+                apply_sales_contribution(sales_contribution(Sale.objects.filter(pk=sale.pk)))
             messages.success(request, f"Vente {sale.invoice_number} mise à jour.")
             ActivityLog.objects.create(
                 user=request.user,
@@ -626,6 +710,13 @@ class SaleDeleteView(LoginRequiredMixin, DeleteView):
     template_name = 'accounts/sales/sale_confirm_delete.html'
     success_url = reverse_lazy('accounts:sale_list')
 
+    def form_valid(self, form):
+        with transaction.atomic():
+            apply_sales_contribution(
+                sales_contribution(Sale.objects.filter(pk=self.object.pk)), sign=-1
+            )
+            return super().form_valid(form)
+
     def delete(self, request, *args, **kwargs):
         sale = self.get_object()
         response = super().delete(request, *args, **kwargs)
@@ -639,6 +730,7 @@ class SaleDeleteView(LoginRequiredMixin, DeleteView):
         return response
 
 
+@cache_until_write(Sale, Product, User)
 def sale_detail_json(request, pk):
     sale = get_object_or_404(
         Sale.objects
@@ -668,434 +760,186 @@ def sale_detail_json(request, pk):
 
 #pour export(pdf,word,excel)
 
-from django.http import HttpResponse
-from apps.core.models import Sale
-from .forms import SaleSearchForm
-from .services import (
-    generate_sales_pdf,
-    generate_sales_excel,
-    generate_sales_docx,
-    generate_sales_csv,
-)
+from django.http import FileResponse, StreamingHttpResponse
+from .services import EXPORT_FORMATS, EXPORT_SPECS, render_export
+
+
+def export_response(kind, fmt, queryset, filename):
+    """Réponse d'export : le CSV part en flux, les autres formats depuis leur fichier."""
+    output = render_export(kind, queryset, fmt)
+    if fmt == 'csv':
+        tsv = EXPORT_SPECS[kind].delimiter == '\t'
+        resp = StreamingHttpResponse(output, content_type='text/tab-separated-values' if tsv else 'text/csv')
+        resp['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return resp
+    return FileResponse(output, as_attachment=True, filename=filename, content_type=EXPORT_FORMATS[fmt])
+
 
 def get_filtered_sales(request):
-    """
-    Reproduit la logique de sale_list : lecture des GET, validation du form et filtrage.
-    """
-    form = SaleSearchForm(request.GET or None)
-    qs = Sale.objects.all().select_related('cashier')
-    if form.is_valid():
-        inv = form.cleaned_data.get('invoice_number')
-        if inv:
-            qs = qs.filter(invoice_number__icontains=inv)
-        cashier = form.cleaned_data.get('cashier')
-        if cashier:
-            qs = qs.filter(cashier=cashier)
-        prod_name = form.cleaned_data.get('product_name')
-        if prod_name:
-            qs = qs.filter(items__product__name__icontains=prod_name)
-        date_from = form.cleaned_data.get('date_from')
-        if date_from:
-            qs = qs.filter(date__date__gte=date_from)
-        date_to = form.cleaned_data.get('date_to')
-        if date_to:
-            qs = qs.filter(date__date__lte=date_to)
-        status = form.cleaned_data.get('status')
-        if status:
-            qs = qs.filter(status=status)
-    return qs.order_by('-date')
+    return filter_sales(request.GET)
+
+def get_filtered_employees(request):
+    return filter_employees(request.GET)
+
+def get_filtered_products(request):
+    return filter_products(request.GET)
+
+def get_filtered_suppliers(request):
+    return filter_suppliers(request.GET)
+
+def get_filtered_categories(request):
+    return filter_categories(request.GET)
+
 
 def export_sales_pdf(request):
-    queryset = get_filtered_sales(request)
-    pdf_file = generate_sales_pdf(queryset)
-    response = HttpResponse(pdf_file, content_type='application/pdf')
-    response['Content-Disposition'] = 'attachment; filename="ventes.pdf"'
-    return response
+    return export_response('sales', 'pdf', get_filtered_sales(request), 'ventes.pdf')
 
 def export_sales_excel(request):
-    queryset = get_filtered_sales(request)
-    excel_file = generate_sales_excel(queryset)
-    response = HttpResponse(
-        excel_file,
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = 'attachment; filename="ventes.xlsx"'
-    return response
+    return export_response('sales', 'xlsx', get_filtered_sales(request), 'ventes.xlsx')
 
 def export_sales_word(request):
-    queryset = get_filtered_sales(request)
-    docx_file = generate_sales_docx(queryset)
-    response = HttpResponse(
-        docx_file,
-        content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-    )
-    response['Content-Disposition'] = 'attachment; filename="ventes.docx"'
-    return response
+    return export_response('sales', 'docx', get_filtered_sales(request), 'ventes.docx')
 
 def export_sales_csv(request):
-    queryset = get_filtered_sales(request)
-    csv_file = generate_sales_csv(queryset)
-    response = HttpResponse(csv_file, content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="ventes.csv"'
-    return response
-
-
-
-from django.contrib.auth import get_user_model
-Employee = get_user_model()
-from django.http import HttpResponse
-from .services import (
-    generate_employees_pdf,
-    generate_employees_excel,
-    generate_employees_docx,
-    generate_employees_csv,
-)
-from .forms import EmployeeSearchForm
-
+    return export_response('sales', 'csv', get_filtered_sales(request), 'ventes.csv')
 
-def get_filtered_employees(request):
-    form = EmployeeSearchForm(request.GET or None)
-    qs = Employee.objects.all()
-    if form.is_valid():
-        name = form.cleaned_data.get('name')
-        if name:
-            qs = qs.filter(first_name__icontains=name) | qs.filter(last_name__icontains=name)
-        role = form.cleaned_data.get('role')
-        if role:
-            qs = qs.filter(role=role)
-        date_from = form.cleaned_data.get('date_joined_from')
-        if date_from:
-            qs = qs.filter(date_joined__date__gte=date_from)
-        date_to = form.cleaned_data.get('date_joined_to')
-        if date_to:
-            qs = qs.filter(date_joined__date__lte=date_to)
-    return qs.order_by('last_name')
 
 def export_employees_pdf(request):
-    qs = get_filtered_employees(request)
-    pdf = generate_employees_pdf(qs)
-    resp = HttpResponse(pdf, content_type='application/pdf')
-    resp['Content-Disposition'] = 'attachment; filename="employes.pdf"'
-    return resp
+    return export_response('employees', 'pdf', get_filtered_employees(request), 'employes.pdf')
 
 def export_employees_excel(request):
-    qs = get_filtered_employees(request)
-    xlsx = generate_employees_excel(qs)
-    resp = HttpResponse(
-        xlsx,
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    resp['Content-Disposition'] = 'attachment; filename="employes.xlsx"'
-    return resp
+    return export_response('employees', 'xlsx', get_filtered_employees(request), 'employes.xlsx')
 
 def export_employees_word(request):
-    qs = get_filtered_employees(request)
-    docx = generate_employees_docx(qs)
-    resp = HttpResponse(
-        docx,
-        content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-    )
-    resp['Content-Disposition'] = 'attachment; filename="employes.docx"'
-    return resp
+    return export_response('employees', 'docx', get_filtered_employees(request), 'employes.docx')
 
 def export_employees_csv(request):
-    qs = get_filtered_employees(request)
-    csvf = generate_employees_csv(qs)
-    resp = HttpResponse(csvf, content_type='text/tab-separated-values')
-    resp['Content-Disposition'] = 'attachment; filename="employes.tsv"'
-    return resp
-
-
-
-from django.contrib.auth import get_user_model
-from django.http import HttpResponse
-from django.shortcuts import render
-from .forms import ProductSearchForm
-from .services import (
-    generate_products_pdf,
-    generate_products_excel,
-    generate_products_docx,
-    generate_products_csv,
-)
-from apps.core.models import Product  # ajustez selon votre app et chemin
+    return export_response('employees', 'csv', get_filtered_employees(request), 'employes.tsv')
 
-def get_filtered_products(request):
-    form = ProductSearchForm(request.GET or None)
-    qs = Product.objects.all()
-    if form.is_valid():
-        name = form.cleaned_data.get('name')
-        if name:
-            qs = qs.filter(name__icontains=name)
-        category = form.cleaned_data.get('category')
-        if category:
-            qs = qs.filter(category=category)
-        price_min = form.cleaned_data.get('price_min')
-        if price_min is not None:
-            qs = qs.filter(unit_price__gte=price_min)
-        price_max = form.cleaned_data.get('price_max')
-        if price_max is not None:
-            qs = qs.filter(unit_price__lte=price_max)
-    # Tri par nom
-    return qs.order_by('name')
 
 def export_products_pdf(request):
-    qs = get_filtered_products(request)
-    pdf = generate_products_pdf(qs)
-    resp = HttpResponse(pdf, content_type='application/pdf')
-    resp['Content-Disposition'] = 'attachment; filename="produits.pdf"'
-    return resp
+    return export_response('products', 'pdf', get_filtered_products(request), 'produits.pdf')
 
 def export_products_excel(request):
-    qs = get_filtered_products(request)
-    xlsx = generate_products_excel(qs)
-    resp = HttpResponse(
-        xlsx,
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    resp['Content-Disposition'] = 'attachment; filename="produits.xlsx"'
-    return resp
+    return export_response('products', 'xlsx', get_filtered_products(request), 'produits.xlsx')
 
 def export_products_word(request):
-    qs = get_filtered_products(request)
-    docx = generate_products_docx(qs)
-    resp = HttpResponse(
-        docx,
-        content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-    )
-    resp['Content-Disposition'] = 'attachment; filename="produits.docx"'
-    return resp
+    return export_response('products', 'docx', get_filtered_products(request), 'produits.docx')
 
 def export_products_csv(request):
-    qs = get_filtered_products(request)
-    csvb = generate_products_csv(qs)
-    resp = HttpResponse(csvb, content_type='text/tab-separated-values')
-    resp['Content-Disposition'] = 'attachment; filename="produits.csv"'
-    return resp
-
-
-from django.http import HttpResponse
-from .services import (
-    generate_suppliers_pdf,
-    generate_suppliers_excel,
-    generate_suppliers_docx,
-    generate_suppliers_csv,
-)
-from apps.core.models import Supplier  # ajustez selon votre app et chemin
+    return export_response('products', 'csv', get_filtered_products(request), 'produits.csv')
 
-def get_filtered_suppliers(request):
-    qs = Supplier.objects.all()
-    # Ajoutez ici des filtres via formulaire si nécessaire
-    return qs.order_by('name')
 
 def export_suppliers_pdf(request):
-    qs = get_filtered_suppliers(request)
-    pdf = generate_suppliers_pdf(qs)
-    resp = HttpResponse(pdf, content_type='application/pdf')
-    resp['Content-Disposition'] = 'attachment; filename="fournisseurs.pdf"'
-    return resp
+    return export_response('suppliers', 'pdf', get_filtered_suppliers(request), 'fournisseurs.pdf')
 
 def export_suppliers_excel(request):
-    qs = get_filtered_suppliers(request)
-    xlsx = generate_suppliers_excel(qs)
-    resp = HttpResponse(
-        xlsx,
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    resp['Content-Disposition'] = 'attachment; filename="fournisseurs.xlsx"'
-    return resp
+    return export_response('suppliers', 'xlsx', get_filtered_suppliers(request), 'fournisseurs.xlsx')
 
 def export_suppliers_word(request):
-    qs = get_filtered_suppliers(request)
-    docx = generate_suppliers_docx(qs)
-    resp = HttpResponse(
-        docx,
-        content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-    )
-    resp['Content-Disposition'] = 'attachment; filename="fournisseurs.docx"'
-    return resp
+    return export_response('suppliers', 'docx', get_filtered_suppliers(request), 'fournisseurs.docx')
 
 def export_suppliers_csv(request):
-    qs = get_filtered_suppliers(request)
-    csvb = generate_suppliers_csv(qs)
-    resp = HttpResponse(csvb, content_type='text/tab-separated-values')
-    resp['Content-Disposition'] = 'attachment; filename="fournisseurs.tsv"'
-    return resp
-
-
+    return export_response('suppliers', 'csv', get_filtered_suppliers(request), 'fournisseurs.tsv')
 
-from django.http import HttpResponse
-from apps.core.models import Category  # chemin réel
-from .services import (
-    generate_categories_pdf,
-    generate_categories_excel,
-    generate_categories_docx,
-    generate_categories_csv,
-)
-
-def get_filtered_categories(request):
-    qs = Category.objects.all()
-    # Ajoutez filtre via formulaire si besoin
-    return qs.order_by('name')
 
 def export_categories_pdf(request):
-    qs = get_filtered_categories(request)
-    pdf = generate_categories_pdf(qs)
-    resp = HttpResponse(pdf, content_type='application/pdf')
-    resp['Content-Disposition'] = 'attachment; filename="categories.pdf"'
-    return resp
+    return export_response('categories', 'pdf', get_filtered_categories(request), 'categories.pdf')
 
 def export_categories_excel(request):
-    qs = get_filtered_categories(request)
-    xlsx = generate_categories_excel(qs)
-    resp = HttpResponse(
-        xlsx,
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    resp['Content-Disposition'] = 'attachment; filename="categories.xlsx"'
-    return resp
+    return export_response('categories', 'xlsx', get_filtered_categories(request), 'categories.xlsx')
 
 def export_categories_word(request):
-    qs = get_filtered_categories(request)
-    docx = generate_categories_docx(qs)
-    resp = HttpResponse(
-        docx,
-        content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-    )
-    resp['Content-Disposition'] = 'attachment; filename="categories.docx"'
-    return resp
+    return export_response('categories', 'docx', get_filtered_categories(request), 'categories.docx')
 
 def export_categories_csv(request):
-    qs = get_filtered_categories(request)
-    csvb = generate_categories_csv(qs)
-    resp = HttpResponse(csvb, content_type='text/csv')
-    resp['Content-Disposition'] = 'attachment; filename="categories.csv"'
-    return resp
+    return export_response('categories', 'csv', get_filtered_categories(request), 'categories.csv')
 
 
-
-
-from django.http import HttpResponse
-from .services import (
-    generate_sales_report_pdf,
-    generate_sales_report_excel,
-    generate_sales_report_docx,
-    generate_sales_report_csv,
-    generate_stock_report_pdf,
-    generate_stock_report_excel,
-    generate_stock_report_csv,
-    generate_stock_report_docx,  
-)
-from apps.core.models import Sale, Product  # Vérifiez bien le nom exact de votre modèle Sale
-
 def export_sales_report_pdf(request):
-    start = request.GET.get("start")
-    end = request.GET.get("end")
-    qs = Sale.objects.all()
-    if start and end:
-        qs = qs.filter(date__range=(start, end))
-    data = [
-        {"date": sale.date, "total": sale.total_amount, "count": 1}
-        for sale in qs
-    ]
-    pdf = generate_sales_report_pdf(data)
-    resp = HttpResponse(pdf, content_type="application/pdf")
-    resp["Content-Disposition"] = 'attachment; filename="rapport_ventes.pdf"'
-    return resp
+    return export_response('sales_report', 'pdf', filter_sales_report(request.GET), 'rapport_ventes.pdf')
 
 def export_sales_report_excel(request):
-    start = request.GET.get("start")
-    end = request.GET.get("end")
-    qs = Sale.objects.all()
-    if start and end:
-        qs = qs.filter(date__range=(start, end))
-    data = [
-        {"date": sale.date, "total": sale.total_amount, "count": 1}
-        for sale in qs
-    ]
-    # Appel de la fonction du service, pas de redéfinition ici
-    xlsx = generate_sales_report_excel(data)
-    resp = HttpResponse(
-        xlsx,
-        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-    )
-    resp["Content-Disposition"] = 'attachment; filename="rapport_ventes.xlsx"'
-    return resp
+    return export_response('sales_report', 'xlsx', filter_sales_report(request.GET), 'rapport_ventes.xlsx')
 
 def export_sales_report_docx(request):
-    start = request.GET.get("start")
-    end = request.GET.get("end")
-    qs = Sale.objects.all()
-    if start and end:
-        qs = qs.filter(date__range=(start, end))
-    data = [
-        {"date": sale.date, "total": sale.total_amount, "count": 1}
-        for sale in qs
-    ]
-    docx = generate_sales_report_docx(data)
-    resp = HttpResponse(
-        docx,
-        content_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-    )
-    resp["Content-Disposition"] = 'attachment; filename="rapport_ventes.docx"'
-    return resp
+    return export_response('sales_report', 'docx', filter_sales_report(request.GET), 'rapport_ventes.docx')
 
 def export_sales_report_csv(request):
-    start = request.GET.get("start")
-    end = request.GET.get("end")
-    qs = Sale.objects.all()
-    if start and end:
-        qs = qs.filter(date__range=(start, end))
-    data = [
-        {"date": sale.date, "total": sale.total_amount, "count": 1}
-        for sale in qs
-    ]
-    csvb = generate_sales_report_csv(data)
-    resp = HttpResponse(csvb, content_type="text/csv")
-    resp["Content-Disposition"] = 'attachment; filename="rapport_ventes.csv"'
-    return resp
+    return export_response('sales_report', 'csv', filter_sales_report(request.GET), 'rapport_ventes.csv')
+
 
 def export_stock_report_pdf(request):
-    stock_data = [
-        {"name": p.name, "category": p.category.name, "stock": p.stock_quantity}
-        for p in Product.objects.all()
-    ]
-    pdf = generate_stock_report_pdf(stock_data)
-    resp = HttpResponse(pdf, content_type="application/pdf")
-    resp["Content-Disposition"] = 'attachment; filename="rapport_stocks.pdf"'
-    return resp
+    return export_response('stock_report', 'pdf', filter_stock_report(request.GET), 'rapport_stocks.pdf')
 
 def export_stock_report_excel(request):
-    stock_data = [
-        {"name": p.name, "category": p.category.name, "stock": p.stock_quantity}
-        for p in Product.objects.all()
-    ]
-    xlsx = generate_stock_report_excel(stock_data)
-    resp = HttpResponse(
-        xlsx,
-        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-    )
-    resp["Content-Disposition"] = 'attachment; filename="rapport_stocks.xlsx"'
-    return resp
+    return export_response('stock_report', 'xlsx', filter_stock_report(request.GET), 'rapport_stocks.xlsx')
 
 def export_stock_report_docx(request):
-    stock_data = [
-        {"name": p.name, "category": p.category.name, "stock": p.stock_quantity}
-        for p in Product.objects.all()
-    ]
-    docx = generate_stock_report_docx(stock_data)
-    resp = HttpResponse(
-        docx,
-        content_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-    )
-    resp["Content-Disposition"] = 'attachment; filename="rapport_stocks.docx"'
-    return resp
+    return export_response('stock_report', 'docx', filter_stock_report(request.GET), 'rapport_stocks.docx')
 
 def export_stock_report_csv(request):
-    stock_data = [
-        {"name": p.name, "category": p.category.name, "stock": p.stock_quantity}
-        for p in Product.objects.all()
-    ]
-    csvb = generate_stock_report_csv(stock_data)
-    resp = HttpResponse(csvb, content_type="text/csv")
-    resp["Content-Disposition"] = 'attachment; filename="rapport_stocks.csv"'
-    return resp
+    return export_response('stock_report', 'csv', filter_stock_report(request.GET), 'rapport_stocks.csv')
+
+
+
+# ===== EXPORTS EN ARRIÈRE-PLAN =====
+
+from django.http import Http404
+from django.urls import reverse
+from django.views.decorators.http import require_POST
+from .jobs import enqueue_export
+from .models import ExportJob
+
+
+def _get_export_job(request, pk):
+    job = get_object_or_404(ExportJob, pk=pk)
+    if job.user_id != request.user.pk and not request.user.is_admin():
+        raise Http404
+    return job
+
+
+@login_required
+@require_POST
+def export_job_start(request, kind, fmt):
+    """Met l'export en file ; les filtres sont ceux de la liste (paramètres GET)."""
+    try:
+        job = enqueue_export(request.user, kind, fmt, request.GET.dict())
+    except ValueError as exc:
+        return JsonResponse({'success': False, 'error': str(exc)}, status=400)
+    return JsonResponse({
+        'success': True,
+        'job': job.pk,
+        'status_url': reverse('accounts:export_job_status', args=[job.pk]),
+    }, status=202)
+
+
+@login_required
+def export_job_status(request, pk):
+    job = _get_export_job(request, pk)
+    data = {
+        'job': job.pk,
+        'status': job.status,
+        'progress': job.progress,
+        'processed_rows': job.processed_rows,
+        'total_rows': job.total_rows,
+        'error': job.error,
+        'download_url': None,
+    }
+    if job.status == ExportJob.Status.DONE and job.file:
+        data['download_url'] = reverse('accounts:export_job_download', args=[job.pk])
+        data['expires_at'] = localtime(job.expires_at).isoformat()
+    return JsonResponse(data)
+
+
+@login_required
+def export_job_download(request, pk):
+    job = _get_export_job(request, pk)
+    if job.status != ExportJob.Status.DONE or not job.file:
+        raise Http404
+    return FileResponse(
+        job.file.open('rb'),
+        as_attachment=True,
+        filename=job.filename,
+        content_type=EXPORT_FORMATS[job.format],
+    )
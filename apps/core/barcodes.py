@@ -0,0 +1,97 @@
+# apps/core/barcodes.py
+"""
+Attribution des codes-barres produits en masse : EAN-13 internes (préfixe
+GS1 « en magasin » BARCODE_INTERNAL_PREFIX) pour les produits sans code,
+ou import d'une liste (id produit, code) depuis un fichier fournisseur.
+"""
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .caching import bump_generation_on_commit
+from .catalog import bump_catalog_version, record_catalog_changes
+from .models import CatalogChange, Product
+
+BARCODE_BATCH_SIZE = 500
+
+
+def ean13_check_digit(digits):
+    """Chiffre de contrôle EAN-13 des 12 premiers chiffres."""
+    total = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(digits))
+    return str((10 - total % 10) % 10)
+
+
+def internal_ean13(product_id):
+    """EAN-13 interne déterministe : préfixe + id sur 10 chiffres + contrôle."""
+    prefix = settings.BARCODE_INTERNAL_PREFIX
+    body = f"{prefix}{product_id:0{12 - len(prefix)}d}"
+    return body + ean13_check_digit(body)
+
+
+def _save_barcodes(products):
+    """bulk_update par paquets ; bulk_update n'émet pas post_save, le catalogue est invalidé ici."""
+    with transaction.atomic():
+        Product.objects.bulk_update(products, ['barcode'], batch_size=BARCODE_BATCH_SIZE)
+        record_catalog_changes(CatalogChange.Kind.PRODUCT, [product.pk for product in products])
+        transaction.on_commit(bump_catalog_version)
+        bump_generation_on_commit(Product)
+    return len(products)
+
+
+def assign_internal_barcodes(queryset=None):
+    """
+    Donne un EAN-13 interne aux produits du queryset qui n'ont pas de code ;
+    renvoie leur nombre. Un code interne déjà porté par un autre produit
+    (importé d'un fichier fournisseur) n'est pas attribué.
+    """
+    queryset = Product.objects.all() if queryset is None else queryset
+    codes = {
+        pk: internal_ean13(pk)
+        for pk in queryset.filter(barcode__isnull=True).values_list('pk', flat=True)
+    }
+    taken = set(Product.objects.filter(barcode__in=list(codes.values())).values_list('barcode', flat=True))
+    products = [Product(pk=pk, barcode=code) for pk, code in codes.items() if code not in taken]
+    return _save_barcodes(products)
+
+
+def import_barcodes(rows, overwrite=False):
+    """
+    Enregistre les couples (id produit, code). Lève ValidationError, sans
+    rien écrire, si un code est invalide, en double ou déjà pris par un
+    autre produit. Sans `overwrite`, les produits déjà codés sont ignorés.
+    """
+    wanted = {}
+    seen = set()
+    errors = []
+    for product_id, code in rows:
+        code = code.strip()
+        try:
+            product_id = int(product_id)
+        except (TypeError, ValueError):
+            errors.append(f"{product_id} : identifiant de produit invalide")
+            continue
+        try:
+            Product.barcode_regex(code)
+        except ValidationError:
+            errors.append(f"{product_id} : code invalide « {code} »")
+            continue
+        if code in seen:
+            errors.append(f"{product_id} : code « {code} » en double dans le fichier")
+            continue
+        seen.add(code)
+        wanted[product_id] = code
+
+    current = dict(Product.objects.filter(pk__in=list(wanted)).values_list('pk', 'barcode'))
+    errors += [f"{pk} : produit introuvable" for pk in wanted if pk not in current]
+    if not overwrite:
+        wanted = {pk: code for pk, code in wanted.items() if current.get(pk) is None}
+    taken = dict(
+        Product.objects.filter(barcode__in=list(wanted.values()))
+        .exclude(pk__in=list(wanted)).values_list('barcode', 'pk')
+    )
+    errors += [f"{pk} : code « {code} » déjà attribué au produit {taken[code]}"
+               for pk, code in wanted.items() if code in taken]
+    if errors:
+        raise ValidationError(errors)
+    return _save_barcodes([Product(pk=pk, barcode=code) for pk, code in wanted.items() if pk in current])
@@ -0,0 +1,126 @@
+# apps/core/caching.py
+"""
+Cache versionné par génération de modèle, sur le cache Django configuré
+(fichiers par défaut, partagés par les workers). Chaque modèle suivi
+(Product, Category, Sale, Supplier, User) a un compteur de génération
+incrémenté après chaque écriture validée ; les clés du cache incluent les
+générations des modèles dont la valeur dépend. Une écriture rend donc les
+anciennes entrées inaccessibles sans les supprimer : elles expirent
+d'elles-mêmes après VERSIONED_CACHE_TIMEOUT secondes ou sont évincées par
+le cache.
+
+Aides : cached() pour une valeur calculée, cached_queryset() pour une liste
+d'objets, cache_until_write() pour une vue, et la balise de gabarit
+{% versioned_cache %} (apps.core.templatetags.versioned_cache).
+"""
+
+import hashlib
+import time as clock
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+_MISSING = object()
+
+
+def model_label(model):
+    """« core.product » pour un modèle, une instance ou un libellé"""
+    if isinstance(model, str):
+        return model.lower()
+    return model._meta.label_lower
+
+
+def _generation_key(label):
+    return f"generation:{label}"
+
+
+def generations(*models):
+    """
+    Générations courantes des modèles, en une lecture du cache. Une
+    génération absente (cache vidé ou évincé) repart d'une valeur horodatée
+    pour ne pas réutiliser d'anciennes entrées.
+    """
+    keys = [_generation_key(model_label(model)) for model in models]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            found[key] = cache.get_or_set(key, clock.time_ns, timeout=None)
+    return tuple(found[key] for key in keys)
+
+
+def bump_generation(*models):
+    for model in models:
+        key = _generation_key(model_label(model))
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, clock.time_ns(), timeout=None)
+
+
+def bump_generation_on_commit(*models):
+    """
+    Incrémente tout de suite, pour les lectures faites dans la transaction,
+    puis de nouveau à la validation : une entrée calculée par un autre
+    processus avant le commit (données encore anciennes) est écartée.
+    """
+    bump_generation(*models)
+    transaction.on_commit(lambda: bump_generation(*models))
+
+
+def versioned_key(name, models, *parts):
+    """Clé « vc:<nom>:<générations>:<empreinte des paramètres> »"""
+    stamp = '.'.join(str(value) for value in generations(*models))
+    digest = hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest()
+    return f"vc:{name}:{stamp}:{digest}"
+
+
+def cached(name, models, build, *parts, timeout=_MISSING):
+    """
+    Valeur de build() mise en cache jusqu'à la prochaine écriture sur l'un
+    des `models`. `parts` distingue les variantes (filtres, utilisateur...).
+    """
+    key = versioned_key(name, models, *parts)
+    value = cache.get(key, _MISSING)
+    if value is _MISSING:
+        value = build()
+        cache.set(key, value, settings.VERSIONED_CACHE_TIMEOUT if timeout is _MISSING else timeout)
+    return value
+
+
+def cached_queryset(name, queryset, *parts, models=()):
+    """
+    Résultat du queryset sous forme de liste, en cache jusqu'à une écriture
+    sur son modèle ou sur les `models` supplémentaires (jointures).
+    """
+    return cached(name, (queryset.model, *models), lambda: list(queryset), *parts)
+
+
+def cache_until_write(*models, per_user=True):
+    """
+    Décorateur de vue : la réponse d'un GET est mise en cache (par chemin
+    complet et, par défaut, par utilisateur) jusqu'à la prochaine écriture
+    sur l'un des modèles. Seules les réponses 200 non diffusées sont gardées.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            user = getattr(request, 'user', None)
+            parts = [request.get_full_path()]
+            if per_user:
+                parts.append(user.pk if user is not None else None)
+            key = versioned_key(f"view:{view.__module__}.{view.__qualname__}", models, *parts)
+            response = cache.get(key)
+            if response is not None:
+                return response
+            response = view(request, *args, **kwargs)
+            if hasattr(response, 'render') and callable(response.render):
+                response.render()
+            if response.status_code == 200 and not response.streaming and not response.cookies:
+                cache.set(key, response, settings.VERSIONED_CACHE_TIMEOUT)
+            return response
+        return wrapper
+    return decorator
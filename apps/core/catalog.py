@@ -0,0 +1,302 @@
+# apps/core/catalog.py
+"""
+Catalogue actif de la caisse en mémoire du processus, pour l'autocomplétion
+et les scans : tableaux parallèles (id, nom, prix, stock, catégorie), index
+trié des mots pour la recherche par préfixe et table de hachage des
+codes-barres. Rechargé en une requête quand la version du
+catalogue change (écritures produits : nom, prix, statut, code-barres) ou
+après CAISSE_CATALOG_MAX_AGE secondes ; entre-temps, aucune requête SQL.
+Une vente ne change pas la version : le stock vendu est reporté en place
+dans l'instantané du processus (update_snapshot_stock), les autres
+processus le relisent au plus tard après CAISSE_CATALOG_MAX_AGE.
+
+Les terminaux qui gardent le catalogue en local se synchronisent par
+différence à partir du journal CatalogChange (voir la fin du module).
+"""
+
+import heapq
+import json
+import re
+import threading
+import time as clock
+import unicodedata
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from .models import CatalogChange, Category, Product
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+_WORD = re.compile(r'\w+')
+
+
+def catalog_version():
+    """Version du catalogue, incrémentée à chaque écriture validée sur les produits."""
+    return cache.get_or_set(CATALOG_VERSION_KEY, clock.time_ns, timeout=None)
+
+
+def bump_catalog_version():
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.set(CATALOG_VERSION_KEY, clock.time_ns(), timeout=None)
+
+
+def fold(text):
+    """Mots en minuscules sans accents, pour comparer les préfixes."""
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return _WORD.findall(''.join(c for c in decomposed if not unicodedata.combining(c)))
+
+
+class CatalogSnapshot:
+    """Instantané du catalogue actif, trié par nom ; seul `stocks` est modifié en place."""
+
+    __slots__ = (
+        'version', 'loaded_at', 'ids', 'names', 'prices', 'stocks', 'categories',
+        'barcodes', 'words', 'positions', 'tokens', 'by_id',
+    )
+
+    def __init__(self, version, rows):
+        self.version = version
+        self.loaded_at = clock.monotonic()
+        self.ids = array('q')
+        self.names = []
+        self.prices = []
+        self.stocks = array('q')
+        self.categories = array('q')
+        self.barcodes = {}
+        self.tokens = []
+        entries = []
+        for position, (pk, name, price, stock, category_id, barcode) in enumerate(rows):
+            if barcode:
+                self.barcodes[barcode] = position
+            self.ids.append(pk)
+            self.names.append(name)
+            self.prices.append(f"{price:.2f}")
+            self.stocks.append(stock)
+            self.categories.append(category_id)
+            tokens = fold(name)
+            self.tokens.append(tokens)
+            entries.extend((token, position) for token in set(tokens))
+        entries.sort()
+        # Index des mots : words[i] apparaît dans le produit positions[i]
+        self.words = [word for word, _ in entries]
+        self.positions = array('q', (position for _, position in entries))
+        self.by_id = {pk: position for position, pk in enumerate(self.ids)}
+
+    def record(self, position):
+        return {
+            'id': self.ids[position],
+            'name': self.names[position],
+            'price': self.prices[position],
+            'stock': self.stocks[position],
+            'category': self.categories[position],
+            'status': Product.Status.ACTIVE,
+        }
+
+    def scan(self, code):
+        """Produit actif portant ce code-barres, ou None."""
+        position = self.barcodes.get(code)
+        return None if position is None else self.record(position)
+
+    def _prefixed(self, prefix):
+        """Positions des produits dont un mot commence par `prefix`."""
+        start = bisect_left(self.words, prefix)
+        end = bisect_left(self.words, prefix + '\uffff', start)
+        return set(self.positions[start:end])
+
+    def search(self, text, limit=10, category=None):
+        """
+        Produits dont chaque mot de `text` préfixe un mot du nom, par ordre
+        alphabétique (intersection des positions trouvées pour chaque mot).
+        Un code-barres ou un nombre seul (identifiant) passe en premier.
+        """
+        terms = fold(text)
+        if not terms:
+            return []
+        exact = []
+        position = self.barcodes.get(text.strip())
+        if position is None and len(terms) == 1 and terms[0].isdigit():
+            position = self.by_id.get(int(terms[0]))
+        if position is not None:
+            exact.append(position)
+        candidates = None
+        for term in sorted(terms, key=len, reverse=True):
+            found = self._prefixed(term)
+            candidates = found if candidates is None else candidates & found
+            if not candidates:
+                break
+        if category is not None:
+            candidates = {p for p in candidates if self.categories[p] == category}
+            exact = [p for p in exact if self.categories[p] == category]
+        # Positions triées par nom : les plus petites sont les premières dans l'ordre alphabétique
+        matches = heapq.nsmallest(limit, candidates - set(exact))
+        return [self.record(position) for position in (exact + matches)[:limit]]
+
+
+_snapshot = None
+_lock = threading.Lock()
+
+
+def load_snapshot(version):
+    rows = (
+        Product.objects.filter(status=Product.Status.ACTIVE)
+        .order_by('name', 'pk')
+        .values_list('pk', 'name', 'price', 'stock_quantity', 'category_id', 'barcode')
+    )
+    return CatalogSnapshot(version, rows.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE))
+
+
+def _is_fresh(snapshot, version):
+    return (
+        snapshot is not None
+        and snapshot.version == version
+        and clock.monotonic() - snapshot.loaded_at < settings.CAISSE_CATALOG_MAX_AGE
+    )
+
+
+def catalog_snapshot():
+    """Instantané courant, rechargé si la version a changé ou s'il est trop ancien."""
+    global _snapshot
+    version = catalog_version()
+    if _is_fresh(_snapshot, version):
+        return _snapshot
+    with _lock:
+        if not _is_fresh(_snapshot, version):
+            _snapshot = load_snapshot(version)
+        return _snapshot
+
+
+def update_snapshot_stock(stocks):
+    """Reporte le stock après une vente ({id: stock}) dans l'instantané courant, sans le recharger."""
+    snapshot = _snapshot
+    if snapshot is None:
+        return
+    for pk, stock in stocks.items():
+        position = snapshot.by_id.get(pk)
+        if position is not None:
+            snapshot.stocks[position] = stock
+
+
+def scan_barcode(code):
+    """
+    Produit (actif ou non) portant ce code-barres : table de hachage de
+    l'instantané, puis index unique de la base pour les produits absents
+    du catalogue actif. None si le code est inconnu.
+    """
+    product = catalog_snapshot().scan(code)
+    if product is not None:
+        return product
+    row = (
+        Product.objects.filter(barcode=code)
+        .values_list('pk', 'name', 'price', 'stock_quantity', 'category_id', 'status')
+        .first()
+    )
+    if row is None:
+        return None
+    pk, name, price, stock, category_id, status = row
+    return {'id': pk, 'name': name, 'price': f"{price:.2f}", 'stock': stock,
+            'category': category_id, 'status': status}
+
+
+# ===== SYNCHRONISATION DES TERMINAUX =====
+
+# Colonnes des lignes produits envoyées aux terminaux (tableaux JSON compacts)
+SYNC_PRODUCT_FIELDS = ['id', 'name', 'barcode', 'price', 'stock', 'category']
+
+
+def record_catalog_changes(kind, ids, deleted=False):
+    """Journalise les objets modifiés, dans la transaction de l'écriture."""
+    CatalogChange.objects.bulk_create([
+        CatalogChange(kind=kind, object_id=pk, deleted=deleted) for pk in ids
+    ])
+
+
+def sync_version():
+    """Dernière version du catalogue (id de la dernière modification journalisée)."""
+    return CatalogChange.objects.aggregate(version=Max('id'))['version'] or 0
+
+
+def _product_rows(queryset):
+    rows = (
+        queryset.filter(status=Product.Status.ACTIVE).order_by('pk')
+        .values_list('pk', 'name', 'barcode', 'price', 'stock_quantity', 'category_id')
+    )
+    return [[pk, name, barcode, f"{price:.2f}", stock, category]
+            for pk, name, barcode, price, stock, category in rows]
+
+
+def _category_rows(queryset):
+    return [list(row) for row in queryset.order_by('pk').values_list('pk', 'name')]
+
+
+def _dumps(payload):
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+
+
+def catalog_sync_snapshot(version):
+    """
+    Catalogue complet (produits actifs et catégories) à la version donnée,
+    en JSON compact, mis en cache par version. La version est lue avant les
+    lignes : le contenu est au moins aussi récent qu'elle.
+    """
+    def build():
+        return _dumps({
+            'version': version,
+            'fields': SYNC_PRODUCT_FIELDS,
+            'products': _product_rows(Product.objects.all()),
+            'categories': _category_rows(Category.objects.all()),
+        })
+    return cache.get_or_set(f"catalog-sync:{version}", build, settings.CATALOG_SYNC_CACHE_SECONDS)
+
+
+def catalog_sync_delta(since):
+    """
+    (version courante, lignes modifiées depuis la version `since`) ; les
+    lignes valent None si le terminal doit recharger le catalogue complet
+    (version inconnue, journal purgé ou trop de modifications). Un produit
+    désactivé est renvoyé comme supprimé.
+    """
+    bounds = CatalogChange.objects.aggregate(first=Min('id'), last=Max('id'))
+    version = bounds['last'] or 0
+    if since < 0 or since > version:
+        return version, None
+    if since < version and since < bounds['first'] - 1:
+        return version, None
+    product_ids, category_ids = set(), set()
+    changes = CatalogChange.objects.filter(id__gt=since, id__lte=version).values_list('kind', 'object_id')
+    for kind, object_id in changes.iterator():
+        (product_ids if kind == CatalogChange.Kind.PRODUCT else category_ids).add(object_id)
+    if len(product_ids) + len(category_ids) > settings.CATALOG_SYNC_MAX_DELTA:
+        return version, None
+    products = _product_rows(Product.objects.filter(pk__in=product_ids))
+    categories = _category_rows(Category.objects.filter(pk__in=category_ids))
+    return version, _dumps({
+        'version': version,
+        'fields': SYNC_PRODUCT_FIELDS,
+        'products': products,
+        'removed_products': sorted(product_ids - {row[0] for row in products}),
+        'categories': categories,
+        'removed_categories': sorted(category_ids - {row[0] for row in categories}),
+    })
+
+
+def purge_catalog_changes(ttl=None):
+    """
+    Supprime les modifications plus anciennes que `ttl` (timedelta), sauf la
+    dernière, qui porte la version courante. Les terminaux plus en retard
+    rechargent le catalogue complet.
+    """
+    if ttl is None:
+        ttl = timezone.timedelta(days=settings.CATALOG_CHANGES_TTL_DAYS)
+    last = sync_version()
+    deleted, _ = (CatalogChange.objects
+                  .filter(created_at__lt=timezone.now() - ttl)
+                  .exclude(id=last)
+                  .delete())
+    return deleted
@@ -0,0 +1,227 @@
+# apps/core/counters.py
+"""
+Compteurs des badges (StatCounter) : nombre de produits, ventes,
+fournisseurs et employés, au total et par statut, plus les produits en
+alerte de stock. Tenus à jour dans la transaction de l'écriture, par les
+signaux (pre_save/post_save/post_delete) et explicitement par les écritures
+en masse (bulk_create, update). Une page lit tous ses badges en une requête
+sur l'index unique de la clé ; reconcile_counters() répare les dérives.
+"""
+
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from .caching import bump_generation_on_commit, cached
+from .models import StatCounter
+
+
+def counter_key(prefix, field=None, value=None):
+    """« product » ou « product:status=ACTIVE »"""
+    if field is None:
+        return prefix
+    return f"{prefix}:{field}={value}"
+
+
+LOW_STOCK_KEY = 'product:low_stock'
+
+
+class CounterSpec:
+    """
+    Compteurs d'un modèle : le total (clé `prefix`) et un compteur par
+    valeur de chacun des `fields`. `read_fields` : champs lus en plus pour
+    les clés calculées par une sous-classe.
+    """
+
+    def __init__(self, prefix, fields, read_fields=()):
+        self.prefix = prefix
+        self.fields = fields
+        self.read_fields = tuple(fields) + tuple(read_fields)
+
+    def keys(self, row):
+        keys = [self.prefix]
+        keys.extend(counter_key(self.prefix, field, row[field]) for field in self.fields)
+        return keys
+
+
+class ProductCounterSpec(CounterSpec):
+
+    def __init__(self):
+        super().__init__('product', ('status',), read_fields=('stock_quantity',))
+
+    def keys(self, row):
+        keys = super().keys(row)
+        if row['stock_quantity'] <= settings.LOW_STOCK_THRESHOLD:
+            keys.append(LOW_STOCK_KEY)
+        return keys
+
+
+COUNTERS = {
+    'core.Product': ProductCounterSpec(),
+    'core.Sale': CounterSpec('sale', ('status',)),
+    'core.Supplier': CounterSpec('supplier', ('status',)),
+    settings.AUTH_USER_MODEL: CounterSpec('user', ('is_active',)),
+}
+
+
+def counter_spec(model):
+    return COUNTERS.get(model._meta.label)
+
+
+def instance_keys(spec, instance):
+    return spec.keys({field: getattr(instance, field) for field in spec.read_fields})
+
+
+def stored_keys(spec, model, pk):
+    """Clés de la ligne telle qu'enregistrée (avant une modification)"""
+    row = model._base_manager.filter(pk=pk).values(*spec.read_fields).first()
+    return spec.keys(row) if row else []
+
+
+# ===== ÉCRITURE =====
+
+_batch = threading.local()
+
+
+def adjust_counters(deltas):
+    """Applique {clé: variation} par des UPDATE relatifs (F), dans la transaction courante."""
+    pending = getattr(_batch, 'deltas', None)
+    if pending is not None:
+        pending.update(deltas)
+        return
+    for key, delta in deltas.items():
+        if not delta:
+            continue
+        rows = StatCounter.objects.filter(key=key)
+        if rows.update(value=F('value') + delta):
+            continue
+        _, created = StatCounter.objects.get_or_create(key=key, defaults={'value': delta})
+        if not created:
+            rows.update(value=F('value') + delta)
+
+
+@contextmanager
+def batched_counters():
+    """
+    Écritures en masse qui envoient les signaux ligne par ligne
+    (queryset.delete()) : les variations sont cumulées puis appliquées en
+    une fois à la sortie du bloc, soit un UPDATE par clé et non par ligne.
+    """
+    if getattr(_batch, 'deltas', None) is not None:
+        yield
+        return
+    _batch.deltas = deltas = Counter()
+    try:
+        yield
+    finally:
+        _batch.deltas = None
+    adjust_counters(deltas)
+
+
+def count_changes(before, after):
+    """Variations entre deux listes de clés (ancienne et nouvelle ligne)"""
+    deltas = Counter(after)
+    deltas.subtract(before)
+    return deltas
+
+
+def record_created(model, objects):
+    """Écritures en masse (bulk_create) : ajoute les nouvelles lignes aux compteurs."""
+    spec = counter_spec(model)
+    deltas = Counter()
+    for obj in objects:
+        deltas.update(instance_keys(spec, obj))
+    adjust_counters(deltas)
+
+
+# ===== LECTURE =====
+
+def read_counters(*keys):
+    """{clé: valeur} pour les clés demandées, en une requête (0 si absente)"""
+    values = dict(StatCounter.objects.filter(key__in=keys).values_list('key', 'value'))
+    return {key: values.get(key, 0) for key in keys}
+
+
+def status_badges(model, field='status', values=None, queryset=None):
+    """
+    Badges d'une liste : {'total': n, <valeur>: n, ...}. Sans queryset,
+    lus dans les compteurs ; avec un queryset filtré, calculés par un seul
+    aggregate() à comptages conditionnels.
+    """
+    if values is None:
+        values = model._meta.get_field(field).get_choices(include_blank=False)
+        values = [value for value, _ in values]
+    if queryset is not None:
+        return queryset.aggregate(
+            total=Count('pk'),
+            **{str(value): Count('pk', filter=Q(**{field: value})) for value in values},
+        )
+    prefix = counter_spec(model).prefix
+    keys = {counter_key(prefix, field, value): str(value) for value in values}
+
+    def read():
+        counts = read_counters(prefix, *keys)
+        badges = {'total': counts[prefix]}
+        badges.update((name, counts[key]) for key, name in keys.items())
+        return badges
+
+    # En cache jusqu'à la prochaine écriture sur le modèle
+    return cached(f"badges:{prefix}", [model], read, *keys)
+
+
+# ===== RÉCONCILIATION =====
+
+def compute_counters():
+    """Valeurs exactes de tous les compteurs, recalculées par GROUP BY."""
+    counts = Counter()
+    for label, spec in COUNTERS.items():
+        model = apps.get_model(label)
+        # Les clés existent même à zéro (total et valeurs possibles des choix)
+        counts[spec.prefix] += 0
+        for field in spec.fields:
+            for value, _ in model._meta.get_field(field).choices or ():
+                counts[counter_key(spec.prefix, field, value)] += 0
+        rows = model._base_manager.values(*spec.read_fields).annotate(n=Count('pk')).order_by()
+        for row in rows:
+            for key in spec.keys(row):
+                counts[key] += row['n']
+    counts[LOW_STOCK_KEY] += 0
+    return counts
+
+
+def reconcile_counters():
+    """
+    Recalcule les compteurs et corrige ceux qui ont dérivé. Retourne
+    {clé: (valeur stockée, valeur exacte)} pour chaque correction.
+    """
+    with transaction.atomic():
+        expected = compute_counters()
+        stored = {counter.key: counter for counter in StatCounter.objects.select_for_update()}
+        drift = {}
+        updated, created = [], []
+        for key, value in expected.items():
+            counter = stored.pop(key, None)
+            if counter is None:
+                created.append(StatCounter(key=key, value=value))
+                drift[key] = (None, value)
+            elif counter.value != value:
+                drift[key] = (counter.value, value)
+                counter.value = value
+                updated.append(counter)
+        # Clés obsolètes (statut disparu) : remises à zéro
+        for counter in stored.values():
+            if counter.value:
+                drift[counter.key] = (counter.value, 0)
+                counter.value = 0
+                updated.append(counter)
+        StatCounter.objects.bulk_create(created)
+        StatCounter.objects.bulk_update(updated, ['value'])
+        if drift:
+            # Badges en cache calculés sur des compteurs faux
+            bump_generation_on_commit(*COUNTERS)
+    return drift
@@ -0,0 +1,55 @@
+# apps/core/invoice_pdf.py
+"""
+Rendu PDF d'une facture à partir de données déjà lues (dict). Aucun import
+Django ici : le module est chargé tel quel par les processus du rendu par lot.
+"""
+
+import io
+
+from reportlab.pdfgen import canvas
+
+
+def draw_invoice(p, invoice):
+    """Dessine la facture sur le canvas, à partir d'une nouvelle page."""
+    p.setFont("Helvetica-Bold", 16)
+    p.drawString(100, 800, f"Facture {invoice['invoice_number']}")
+
+    p.setFont("Helvetica", 12)
+    y = 760
+    p.drawString(100, y, f"Date : {invoice['date']}")
+    y -= 20
+    p.drawString(100, y, f"Caissier : {invoice['cashier']}")
+    y -= 20
+    p.drawString(100, y, f"Client : {invoice['customer']}")
+    y -= 40
+
+    p.drawString(100, y, "Produit")
+    p.drawString(300, y, "Qté")
+    p.drawString(350, y, "PU (€)")
+    p.drawString(430, y, "Total (€)")
+    y -= 20
+
+    for name, quantity, unit_price, line_total in invoice['items']:
+        if y < 100:
+            p.showPage()
+            p.setFont("Helvetica", 12)
+            y = 800
+        p.drawString(100, y, name)
+        p.drawString(300, y, str(quantity))
+        p.drawString(350, y, unit_price)
+        p.drawString(430, y, line_total)
+        y -= 20
+
+    y -= 20
+    p.setFont("Helvetica-Bold", 12)
+    p.drawString(100, y, f"Montant total : {invoice['total']} €")
+    p.showPage()
+
+
+def render_invoice_pdf(invoice):
+    """PDF d'une facture, en octets."""
+    buffer = io.BytesIO()
+    p = canvas.Canvas(buffer)
+    draw_invoice(p, invoice)
+    p.save()
+    return buffer.getvalue()
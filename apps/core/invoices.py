@@ -0,0 +1,173 @@
+# apps/core/invoices.py
+"""
+Factures PDF : cache disque sous MEDIA_ROOT/invoices/, clé (id de vente,
+date de modification), et impression par lot d'une période. Les deux
+formats du lot (PDF fusionné ou ZIP) sont assemblés à partir du cache ; les
+factures absentes sont rendues dans un pool de processus partagé par le
+processus web, borné à INVOICE_BATCH_WORKERS.
+"""
+
+import glob
+import os
+import tempfile
+import threading
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.utils import timezone
+from pypdf import PdfWriter
+
+from .invoice_pdf import render_invoice_pdf
+from .models import Sale, SaleItem
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _cache_dir():
+    return os.path.join(settings.MEDIA_ROOT, 'invoices')
+
+
+def invoice_cache_path(sale_id, stamp):
+    return os.path.join(_cache_dir(), f"{sale_id}-{int(stamp.timestamp() * 1_000_000)}.pdf")
+
+
+def invoice_filename(invoice_number):
+    return f"Facture_{invoice_number}.pdf"
+
+
+def invalidate_invoice(sale_id):
+    """Supprime les factures en cache de la vente, quelle que soit leur date."""
+    for path in glob.glob(os.path.join(_cache_dir(), f"{sale_id}-*.pdf")):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _store(sale_id, stamp, pdf):
+    """Écriture atomique (fichier temporaire puis renommage)."""
+    os.makedirs(_cache_dir(), exist_ok=True)
+    path = invoice_cache_path(sale_id, stamp)
+    fd, tmp = tempfile.mkstemp(dir=_cache_dir(), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as fh:
+        fh.write(pdf)
+    os.replace(tmp, path)
+    return path
+
+
+def invoice_data(sales):
+    """
+    Données de facture des ventes du queryset, en deux requêtes (ventes avec
+    caissier, puis lignes avec nom du produit) : {sale_id: dict}.
+    """
+    invoices = OrderedDict()
+    rows = sales.values_list(
+        'pk', 'invoice_number', 'date', 'cashier__first_name', 'cashier__last_name',
+        'cashier__username', 'customer_name', 'total_amount', 'updated_at',
+    )
+    for pk, number, date, first, last, username, customer, total, updated_at in rows:
+        invoices[pk] = {
+            'invoice_number': number,
+            'date': timezone.localtime(date).strftime('%d/%m/%Y %H:%M'),
+            'cashier': f"{first} {last}" if first and last else username,
+            'customer': customer,
+            'total': f"{total:.2f}",
+            'updated_at': updated_at,
+            'items': [],
+        }
+    items = (
+        SaleItem.objects.filter(sale__in=sales.values('pk'))
+        .order_by('sale_id', 'pk')
+        .values_list('sale_id', 'product__name', 'quantity', 'unit_price')
+    )
+    for sale_id, name, quantity, unit_price in items:
+        if sale_id in invoices:
+            invoices[sale_id]['items'].append(
+                (name, quantity, f"{unit_price:.2f}", f"{quantity * unit_price:.2f}")
+            )
+    return invoices
+
+
+def cached_invoice(sale_id):
+    """
+    Chemin du PDF de la vente et son numéro de facture. Rendu seulement si
+    aucun fichier n'existe pour la date de modification courante.
+    Lève Sale.DoesNotExist.
+    """
+    number, stamp = Sale.objects.values_list('invoice_number', 'updated_at').get(pk=sale_id)
+    path = invoice_cache_path(sale_id, stamp)
+    if not os.path.exists(path):
+        invalidate_invoice(sale_id)
+        invoice = invoice_data(Sale.objects.filter(pk=sale_id))[int(sale_id)]
+        path = _store(sale_id, invoice['updated_at'], render_invoice_pdf(invoice))
+    return path, number
+
+
+def _render_pool():
+    """
+    Pool de rendu du processus, créé au premier lot et réutilisé : les
+    requêtes simultanées se partagent INVOICE_BATCH_WORKERS processus au lieu
+    d'en démarrer chacune un jeu.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=settings.INVOICE_BATCH_WORKERS)
+        return _pool
+
+
+def _discard_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _render_missing(invoices):
+    """Rend les factures absentes du cache, dans le pool de processus au-delà d'un seuil."""
+    pks = list(invoices)
+    payloads = [invoices[pk] for pk in pks]
+    pdfs = None
+    if len(pks) >= settings.INVOICE_BATCH_POOL_THRESHOLD:
+        pool = _render_pool()
+        try:
+            pdfs = list(pool.map(render_invoice_pdf, payloads, chunksize=16))
+        except BrokenProcessPool:
+            # Processus de rendu tué (mémoire...) : pool recréé au prochain lot
+            _discard_pool(pool)
+    if pdfs is None:
+        pdfs = [render_invoice_pdf(invoice) for invoice in payloads]
+    for pk, pdf in zip(pks, pdfs):
+        _store(pk, invoices[pk]['updated_at'], pdf)
+
+
+def invoice_batch(start, end, fmt='pdf'):
+    """
+    Factures des ventes de start..end (jours locaux) : un seul PDF multipage
+    ou une archive ZIP d'un PDF par vente. Renvoie un fichier temporaire.
+    Les PDF viennent du cache ; les manquants sont rendus en parallèle.
+    """
+    sales = Sale.objects.filter(business_date__range=(start, end)).order_by('date', 'pk')
+    output = tempfile.SpooledTemporaryFile(max_size=settings.EXPORT_SPOOL_MAX_SIZE)
+
+    entries = list(sales.values_list('pk', 'invoice_number', 'updated_at'))
+    missing = [pk for pk, _, stamp in entries if not os.path.exists(invoice_cache_path(pk, stamp))]
+    if missing:
+        _render_missing(invoice_data(sales.filter(pk__in=missing)))
+
+    if fmt == 'pdf':
+        merged = PdfWriter()
+        for pk, _, stamp in entries:
+            merged.append(invoice_cache_path(pk, stamp))
+        merged.write(output)
+    else:
+        with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for pk, number, stamp in entries:
+                archive.write(invoice_cache_path(pk, stamp), invoice_filename(number))
+    output.seek(0)
+    return output
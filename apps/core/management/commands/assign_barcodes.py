@@ -0,0 +1,31 @@
+import csv
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.barcodes import assign_internal_barcodes, import_barcodes
+
+
+class Command(BaseCommand):
+    help = (
+        "Attribue des EAN-13 internes aux produits sans code-barres, ou importe "
+        "un fichier CSV « id_produit;code_barres »"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--csv', help="Fichier CSV (séparateur ;) id_produit;code_barres")
+        parser.add_argument('--overwrite', action='store_true',
+                            help="Remplace aussi les codes déjà attribués (avec --csv)")
+
+    def handle(self, *args, **options):
+        if not options['csv']:
+            count = assign_internal_barcodes()
+            self.stdout.write(self.style.SUCCESS(f"{count} code(s)-barres interne(s) attribué(s)."))
+            return
+        with open(options['csv'], newline='', encoding='utf-8') as fh:
+            rows = [row[:2] for row in csv.reader(fh, delimiter=';') if len(row) >= 2 and row[0].strip().isdigit()]
+        try:
+            count = import_barcodes(rows, overwrite=options['overwrite'])
+        except ValidationError as exc:
+            raise CommandError("\n".join(exc.messages))
+        self.stdout.write(self.style.SUCCESS(f"{count} code(s)-barres importé(s)."))
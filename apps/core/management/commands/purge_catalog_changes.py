@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.core.catalog import purge_catalog_changes
+
+
+class Command(BaseCommand):
+    help = "Supprime les anciennes entrées du journal des modifications du catalogue"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=None,
+            help="Durée de conservation (par défaut CATALOG_CHANGES_TTL_DAYS)"
+        )
+
+    def handle(self, *args, **options):
+        ttl = None
+        if options['days'] is not None:
+            ttl = timezone.timedelta(days=options['days'])
+        deleted = purge_catalog_changes(ttl)
+        self.stdout.write(self.style.SUCCESS(f"{deleted} modification(s) supprimée(s)."))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.core.services import purge_checkout_requests
+
+
+class Command(BaseCommand):
+    help = "Supprime les clés d'idempotence d'encaissement expirées"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours', type=int, default=None,
+            help="Durée de conservation (par défaut CHECKOUT_IDEMPOTENCY_TTL_HOURS)"
+        )
+
+    def handle(self, *args, **options):
+        ttl = None
+        if options['hours'] is not None:
+            ttl = timezone.timedelta(hours=options['hours'])
+        deleted = purge_checkout_requests(ttl)
+        self.stdout.write(self.style.SUCCESS(f"{deleted} clé(s) supprimée(s)."))
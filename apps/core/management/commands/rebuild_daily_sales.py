@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.core.services import rebuild_daily_sales_summary
+
+
+class Command(BaseCommand):
+    help = "Reconstruit la synthèse journalière des ventes depuis l'historique"
+
+    def handle(self, *args, **options):
+        days = rebuild_daily_sales_summary()
+        self.stdout.write(self.style.SUCCESS(f"Synthèse reconstruite : {days} jour(s)."))
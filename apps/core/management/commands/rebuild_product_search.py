@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.core.search import rebuild_search_index, search_enabled
+
+
+class Command(BaseCommand):
+    help = "Reconstruit les index de recherche plein texte des produits (FTS5)"
+
+    def handle(self, *args, **options):
+        if not search_enabled():
+            self.stdout.write(self.style.WARNING("Recherche plein texte disponible uniquement sous SQLite."))
+            return
+        count = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(f"{count} produit(s) indexé(s)."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.core.services import rebuild_sales_facts
+
+
+class Command(BaseCommand):
+    help = "Reconstruit le cube des ventes (heure × caissier × produit) depuis l'historique"
+
+    def handle(self, *args, **options):
+        facts = rebuild_sales_facts()
+        self.stdout.write(self.style.SUCCESS(f"Cube reconstruit : {facts} fait(s)."))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from apps.core.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = "Recalcule les compteurs des badges (StatCounter) et corrige les dérives"
+
+    def handle(self, *args, **options):
+        drift = reconcile_counters()
+        for key, (stored, expected) in sorted(drift.items()):
+            self.stdout.write(f"{key} : {'absent' if stored is None else stored} -> {expected}")
+        self.stdout.write(self.style.SUCCESS(f"{len(drift)} compteur(s) corrigé(s)."))
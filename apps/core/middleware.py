@@ -0,0 +1,106 @@
+# apps/core/middleware.py
+"""
+Détection des requêtes N+1 en développement : pendant chaque requête HTTP,
+les SELECT sont regroupés par forme (SQL sans les valeurs des paramètres).
+Une forme exécutée au moins REPEATED_QUERY_THRESHOLD fois est signalée dans
+le journal avec ses points d'appel : ligne du projet (vue, service) ou
+ligne du gabarit ({{ sale.items.count }} dans une boucle). Avec
+REPEATED_QUERY_RAISE, la requête échoue : les tests de budget
+(QueryBudgetTest) font ainsi échouer la CI.
+
+Activé seulement si DEBUG (voir MIDDLEWARE dans les settings) : le relevé de
+la pile à chaque requête SQL a un coût.
+"""
+
+import logging
+import os
+import re
+import sys
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_PROJECT_ROOT = str(settings.BASE_DIR) + os.sep
+# « IN (%s, %s, %s) » : une seule forme quelle que soit la taille de la liste
+_PLACEHOLDER_LIST = re.compile(r'\((?:%s, )+%s\)')
+
+
+class RepeatedQueryError(Exception):
+    """Une même forme de requête répétée dans une seule requête HTTP"""
+
+
+def query_shape(sql):
+    return _PLACEHOLDER_LIST.sub('(%s, ...)', sql)
+
+
+def _is_project_file(filename):
+    return (
+        filename.startswith(_PROJECT_ROOT)
+        and 'site-packages' not in filename
+        and filename != __file__
+    )
+
+
+def call_site():
+    """
+    Point d'appel de la requête en cours : le nœud de gabarit le plus
+    interne s'il précède le code du projet dans la pile, sinon la première
+    ligne du projet (hors bibliothèques et ce module). Les execute_wrapper
+    empilés (celui-ci, ceux des tests) sont ignorés.
+    """
+    frame = sys._getframe(1)
+    while frame is not None and frame.f_code.co_name != '_execute_with_wrappers':
+        frame = frame.f_back
+    while frame is not None:
+        code = frame.f_code
+        if _is_project_file(code.co_filename):
+            path = os.path.relpath(code.co_filename, _PROJECT_ROOT)
+            return f"{path}:{frame.f_lineno} ({code.co_name})"
+        if code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            origin, token = getattr(node, 'origin', None), getattr(node, 'token', None)
+            if origin is not None and token is not None:
+                return f"{origin.template_name or origin.name}:{token.lineno} {token.contents[:60]!r}"
+        frame = frame.f_back
+    return '?'
+
+
+class RepeatedQueryMiddleware:
+    """Signale (ou refuse) les formes de SELECT répétées dans une requête HTTP"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sites = defaultdict(list)
+
+        def record(execute, sql, params, many, context):
+            if sql.lstrip()[:6].upper() == 'SELECT':
+                sites[query_shape(sql)].append(call_site())
+            return execute(sql, params, many, context)
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(record))
+            response = self.get_response(request)
+
+        threshold = settings.REPEATED_QUERY_THRESHOLD
+        repeated = {shape: calls for shape, calls in sites.items() if len(calls) >= threshold}
+        if repeated:
+            self.report(request, repeated)
+        return response
+
+    def report(self, request, repeated):
+        lines = [f"Requêtes répétées sur {request.method} {request.get_full_path()} :"]
+        for shape, calls in sorted(repeated.items(), key=lambda item: -len(item[1])):
+            lines.append(f"  {len(calls)} × {shape[:300]}")
+            for site, count in Counter(calls).most_common(3):
+                lines.append(f"      {count} × {site}")
+        message = '\n'.join(lines)
+        logger.warning(message)
+        if settings.REPEATED_QUERY_RAISE:
+            raise RepeatedQueryError(message)
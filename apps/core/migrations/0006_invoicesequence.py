@@ -0,0 +1,24 @@
+# Generated by Django 5.2 on 2026-10-17 17:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_alter_sale_options_alter_saleitem_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceSequence',
+            fields=[
+                ('day', models.DateField(primary_key=True, serialize=False, verbose_name='Jour')),
+                ('last_value', models.PositiveIntegerField(default=0, verbose_name='Dernier numéro réservé')),
+            ],
+            options={
+                'verbose_name': 'Séquence de factures',
+                'verbose_name_plural': 'Séquences de factures',
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-17 17:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_invoicesequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckoutRequest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True, verbose_name='Clé de requête')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Reçue le')),
+                ('sale', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.sale', verbose_name='Vente')),
+            ],
+            options={
+                'verbose_name': "Requête d'encaissement",
+                'verbose_name_plural': "Requêtes d'encaissement",
+            },
+        ),
+    ]
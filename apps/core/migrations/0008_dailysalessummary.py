@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-17 17:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_checkoutrequest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True, verbose_name='Jour')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name="Chiffre d'affaires")),
+                ('sale_count', models.IntegerField(default=0, verbose_name='Nombre de ventes')),
+                ('item_count', models.IntegerField(default=0, verbose_name='Articles vendus')),
+            ],
+            options={
+                'verbose_name': 'Synthèse journalière des ventes',
+                'verbose_name_plural': 'Synthèses journalières des ventes',
+                'ordering': ['-date'],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-17 17:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_dailysalessummary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(verbose_name='Heure')),
+                ('quantity', models.IntegerField(default=0, verbose_name='Quantité vendue')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name="Chiffre d'affaires")),
+                ('line_count', models.IntegerField(default=0, verbose_name='Lignes de vente')),
+                ('cashier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Caissier')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.category', verbose_name='Catégorie')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.product', verbose_name='Produit')),
+            ],
+            options={
+                'verbose_name': 'Fait de vente',
+                'verbose_name_plural': 'Faits de vente',
+                'indexes': [models.Index(fields=['category', 'hour'], name='salesfact_category_hour'), models.Index(fields=['cashier', 'hour'], name='salesfact_cashier_hour'), models.Index(fields=['product', 'hour'], name='salesfact_product_hour')],
+                'constraints': [models.UniqueConstraint(fields=('hour', 'cashier', 'product'), name='salesfact_hour_cashier_product')],
+            },
+        ),
+    ]
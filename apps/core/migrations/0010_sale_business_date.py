@@ -0,0 +1,42 @@
+import zoneinfo
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import TruncDate
+
+
+def backfill_business_date(apps, schema_editor):
+    Sale = apps.get_model('core', 'Sale')
+    tz = zoneinfo.ZoneInfo(settings.TIME_ZONE)
+    Sale.objects.update(business_date=TruncDate('date', tzinfo=tz))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_salesfact'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sale',
+            name='date',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Date de vente'),
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='business_date',
+            field=models.DateField(editable=False, null=True, verbose_name='Jour de vente'),
+        ),
+        migrations.RunPython(backfill_business_date, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='sale',
+            name='business_date',
+            field=models.DateField(editable=False, verbose_name='Jour de vente'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['business_date', 'status'], name='sale_business_date_status'),
+        ),
+    ]
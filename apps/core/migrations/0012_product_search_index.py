@@ -0,0 +1,69 @@
+# Generated by Django 5.2 on 2026-10-17 17:44
+
+import apps.core.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Tables virtuelles FTS5 (SQLite uniquement) : mots avec préfixes indexés,
+# et trigrammes pour la tolérance aux fautes. Le rowid est l'id du produit.
+CREATE_INDEXES = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS core_product_fts USING fts5("
+    "name, description, category, tokenize=\"unicode61 remove_diacritics 2\", prefix='2 3')",
+    # Pondération bm25 : nom > catégorie > description
+    "INSERT INTO core_product_fts(core_product_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0, 4.0)')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS core_product_trigram USING fts5("
+    "name, category, tokenize='trigram')",
+    "INSERT INTO core_product_fts(rowid, name, description, category) "
+    "SELECT p.id, p.name, p.description, c.name FROM core_product p JOIN core_category c ON c.id = p.category_id",
+    "INSERT INTO core_product_trigram(rowid, name, category) "
+    "SELECT p.id, p.name, c.name FROM core_product p JOIN core_category c ON c.id = p.category_id",
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in CREATE_INDEXES:
+        schema_editor.execute(sql)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS core_product_fts")
+    schema_editor.execute("DROP TABLE IF EXISTS core_product_trigram")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_sale_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchIndex',
+            fields=[
+                ('product', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_words', serialize=False, to='core.product')),
+                ('document', apps.core.models.FullTextField(db_column='core_product_fts')),
+                ('rank', models.FloatField(db_column='rank')),
+            ],
+            options={
+                'db_table': 'core_product_fts',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductTrigramIndex',
+            fields=[
+                ('product', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_trigrams', serialize=False, to='core.product')),
+                ('document', apps.core.models.FullTextField(db_column='core_product_trigram')),
+                ('rank', models.FloatField(db_column='rank')),
+            ],
+            options={
+                'db_table': 'core_product_trigram',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-17 17:49
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='barcode',
+            field=models.CharField(blank=True, max_length=32, null=True, unique=True, validators=[django.core.validators.RegexValidator(message='Le code-barres ne contient que des chiffres, lettres ou tirets (4 à 32 caractères).', regex='^[0-9A-Za-z-]{4,32}$')], verbose_name='Code-barres'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-17 17:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_product_barcode'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogChange',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('PRODUCT', 'Produit'), ('CATEGORY', 'Catégorie')], max_length=10, verbose_name='Type')),
+                ('object_id', models.IntegerField(verbose_name='Identifiant')),
+                ('deleted', models.BooleanField(default=False, verbose_name='Supprimé')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Modifié le')),
+            ],
+            options={
+                'verbose_name': 'Modification du catalogue',
+                'verbose_name_plural': 'Modifications du catalogue',
+            },
+        ),
+    ]
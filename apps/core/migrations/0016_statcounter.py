@@ -0,0 +1,61 @@
+# Generated by Django 5.2 on 2026-10-17 21:05
+
+from collections import Counter
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+# Compteurs tels que définis à cette migration (modèle, préfixe, champ) ;
+# les évolutions ultérieures passent par reconcile_counters()
+COUNTERS = [
+    ('core.Product', 'product', 'status'),
+    ('core.Sale', 'sale', 'status'),
+    ('core.Supplier', 'supplier', 'status'),
+    (settings.AUTH_USER_MODEL, 'user', 'is_active'),
+]
+
+
+def populate_counters(apps, schema_editor):
+    StatCounter = apps.get_model('core', 'StatCounter')
+    Product = apps.get_model('core', 'Product')
+    counts = Counter()
+    for label, prefix, field in COUNTERS:
+        model = apps.get_model(label)
+        # Les clés existent même à zéro (total et valeurs possibles des choix)
+        counts[prefix] += 0
+        for value, _ in model._meta.get_field(field).choices or ():
+            counts[f"{prefix}:{field}={value}"] += 0
+        for row in model._base_manager.values(field).annotate(n=Count('pk')).order_by():
+            counts[prefix] += row['n']
+            counts[f"{prefix}:{field}={row[field]}"] += row['n']
+    counts['product:low_stock'] = Product._base_manager.filter(
+        stock_quantity__lte=settings.LOW_STOCK_THRESHOLD
+    ).count()
+    StatCounter.objects.bulk_create([
+        StatCounter(key=key, value=value) for key, value in counts.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_activitylog_cursor_indexes'),
+        ('core', '0015_sale_sale_date_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True, verbose_name='Clé')),
+                ('value', models.BigIntegerField(default=0, verbose_name='Valeur')),
+            ],
+            options={
+                'verbose_name': 'Compteur statistique',
+                'verbose_name_plural': 'Compteurs statistiques',
+            },
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2 on 2026-10-17 20:05
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_index_pack'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='image',
+            field=models.ImageField(blank=True, null=True, upload_to='products/', verbose_name='Image produit'),
+        ),
+        migrations.AlterField(
+            model_name='supplier',
+            name='address',
+            field=models.TextField(verbose_name='Adresse complète'),
+        ),
+        migrations.AlterField(
+            model_name='supplier',
+            name='contact_person',
+            field=models.CharField(max_length=150, verbose_name='Personne de contact'),
+        ),
+        migrations.AlterField(
+            model_name='supplier',
+            name='credit_limit',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=12, verbose_name='Limite de crédit (€)'),
+        ),
+        migrations.AlterField(
+            model_name='supplier',
+            name='email',
+            field=models.EmailField(max_length=254, verbose_name='Email'),
+        ),
+        migrations.AlterField(
+            model_name='supplier',
+            name='name',
+            field=models.CharField(max_length=200, verbose_name='Nom du fournisseur'),
+        ),
+        migrations.AlterField(
+            model_name='supplier',
+            name='notes',
+            field=models.TextField(blank=True, verbose_name='Notes internes'),
+        ),
+        migrations.AlterField(
+            model_name='supplier',
+            name='payment_terms',
+            field=models.CharField(default='30 jours', max_length=100, verbose_name='Conditions de paiement'),
+        ),
+        migrations.AlterField(
+            model_name='supplier',
+            name='phone',
+            field=models.CharField(max_length=17, validators=[django.core.validators.RegexValidator(message="Le numéro doit être au format: '+999999999'. 15 chiffres maximum.", regex='^\\+?1?\\d{9,15}$')], verbose_name='Téléphone'),
+        ),
+        migrations.AlterField(
+            model_name='supplier',
+            name='tax_number',
+            field=models.CharField(blank=True, max_length=50, verbose_name='Numéro TVA'),
+        ),
+    ]
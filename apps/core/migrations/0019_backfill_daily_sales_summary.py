@@ -0,0 +1,40 @@
+# Generated by Django 5.2 on 2026-10-17 21:40
+
+from django.db import migrations
+from django.db.models import Count, Sum
+
+
+def backfill_daily_sales_summary(apps, schema_editor):
+    """Synthèse journalière des ventes payées déjà enregistrées (voir rebuild_daily_sales)"""
+    Sale = apps.get_model('core', 'Sale')
+    SaleItem = apps.get_model('core', 'SaleItem')
+    DailySalesSummary = apps.get_model('core', 'DailySalesSummary')
+    days = {
+        row['business_date']: row
+        for row in Sale.objects.filter(status='PAID').values('business_date')
+        .annotate(revenue=Sum('total_amount'), sales=Count('id')).order_by()
+    }
+    items = dict(
+        SaleItem.objects.filter(sale__status='PAID')
+        .values('sale__business_date').annotate(n=Sum('quantity')).order_by()
+        .values_list('sale__business_date', 'n')
+    )
+    DailySalesSummary.objects.all().delete()
+    DailySalesSummary.objects.bulk_create([
+        DailySalesSummary(
+            date=day, revenue=row['revenue'] or 0,
+            sale_count=row['sales'], item_count=items.get(day) or 0,
+        )
+        for day, row in days.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_alter_product_image_alter_supplier_address_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_daily_sales_summary, migrations.RunPython.noop),
+    ]
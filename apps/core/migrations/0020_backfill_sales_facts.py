@@ -0,0 +1,42 @@
+# Generated by Django 5.2 on 2026-10-17 21:42
+
+import zoneinfo
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncHour
+
+
+def backfill_sales_facts(apps, schema_editor):
+    """Cube des ventes payées déjà enregistrées, par heure, caissier et produit (voir rebuild_sales_cube)"""
+    SaleItem = apps.get_model('core', 'SaleItem')
+    SalesFact = apps.get_model('core', 'SalesFact')
+    tz = zoneinfo.ZoneInfo(settings.TIME_ZONE)
+    rows = (
+        SaleItem.objects.filter(sale__status='PAID')
+        .annotate(hour=TruncHour('sale__date', tzinfo=tz))
+        .values('hour', 'sale__cashier_id', 'product_id', 'product__category_id')
+        .annotate(qty=Sum('quantity'), amount=Sum(F('quantity') * F('unit_price')), lines=Count('id'))
+        .order_by()
+    )
+    SalesFact.objects.all().delete()
+    SalesFact.objects.bulk_create((
+        SalesFact(
+            hour=row['hour'], cashier_id=row['sale__cashier_id'],
+            product_id=row['product_id'], category_id=row['product__category_id'],
+            quantity=row['qty'], revenue=row['amount'], line_count=row['lines'],
+        )
+        for row in rows.iterator()
+    ), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_backfill_daily_sales_summary'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_sales_facts, migrations.RunPython.noop),
+    ]
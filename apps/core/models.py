@@ -1,9 +1,11 @@
 # apps/core/models.py
 
 from django.db import models
+from django.db.models import Lookup
 from django.urls import reverse
 from django.core.validators import RegexValidator
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -83,6 +85,15 @@ class Product(models.Model):
         OUT_OF_STOCK = "OUT_OF_STOCK", "Rupture de stock"
 
     name = models.CharField(max_length=200, verbose_name="Nom du produit")
+    barcode_regex = RegexValidator(
+        regex=r'^[0-9A-Za-z-]{4,32}$',
+        message="Le code-barres ne contient que des chiffres, lettres ou tirets (4 à 32 caractères)."
+    )
+    # Unique donc indexé ; NULL pour les produits sans code (plusieurs autorisés)
+    barcode = models.CharField(
+        max_length=32, unique=True, null=True, blank=True,
+        validators=[barcode_regex], verbose_name="Code-barres"
+    )
     category = models.ForeignKey(Category, on_delete=models.CASCADE, verbose_name="Catégorie")
     price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Prix (€)")
     stock_quantity = models.PositiveIntegerField(default=0, verbose_name="Quantité en stock")
@@ -96,6 +107,10 @@ class Product(models.Model):
         verbose_name = "Produit"
         verbose_name_plural = "Produits"
         ordering = ['name']
+        indexes = [
+            # Caisse : produits actifs par ordre alphabétique (index partiel)
+            models.Index(fields=['name'], condition=models.Q(status='ACTIVE'), name='product_active_name'),
+        ]
 
     def __str__(self):
         return self.name
@@ -123,20 +138,35 @@ class Sale(models.Model):
         CANCELLED = "CANCELLED", "Annulé"
 
     invoice_number = models.CharField(max_length=20, unique=True, verbose_name="N° facture")
-    date = models.DateTimeField(auto_now_add=True, verbose_name="Date de vente")
+    date = models.DateTimeField(default=timezone.now, editable=False, verbose_name="Date de vente")
+    # Jour de la vente dans le fuseau du magasin, figé à l'écriture pour
+    # que les filtres par date utilisent un index au lieu de date__date
+    business_date = models.DateField(editable=False, verbose_name="Jour de vente")
     cashier = models.ForeignKey(User, on_delete=models.PROTECT, verbose_name="Caissier")
     customer_name = models.CharField(max_length=100, verbose_name="Client")
     status = models.CharField(max_length=20, choices=Status.choices, default=Status.PAID, verbose_name="Statut")
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Montant total")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Modifié le")
 
     class Meta:
         verbose_name = "Vente"
         verbose_name_plural = "Ventes"
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['business_date', 'status'], name='sale_business_date_status'),
+            # Pagination par curseur sur (date, id), sans filtre ou par statut / caissier
+            models.Index(fields=['date', 'id'], name='sale_date_id'),
+            models.Index(fields=['status', 'date', 'id'], name='sale_status_date_id'),
+            models.Index(fields=['cashier', 'date', 'id'], name='sale_cashier_date_id'),
+        ]
 
     def __str__(self):
         return f"{self.invoice_number} - {self.customer_name}"
 
+    def save(self, *args, **kwargs):
+        self.business_date = timezone.localdate(self.date)
+        super().save(*args, **kwargs)
+
 
 class SaleItem(models.Model):
     """Éléments d'une vente"""
@@ -149,6 +179,10 @@ class SaleItem(models.Model):
     class Meta:
         verbose_name = "Élément de vente"
         verbose_name_plural = "Éléments de vente"
+        indexes = [
+            # Jointure inverse produit -> ventes, sans lecture de la table
+            models.Index(fields=['product', 'sale'], name='saleitem_product_sale'),
+        ]
 
     def __str__(self):
         return f"{self.product.name} x{self.quantity}"
@@ -156,3 +190,173 @@ class SaleItem(models.Model):
     @property
     def line_total(self):
         return self.quantity * self.unit_price
+
+
+class InvoiceSequence(models.Model):
+    """Compteur journalier des numéros de facture (FYYYYMMDDNNNN)"""
+
+    day = models.DateField(primary_key=True, verbose_name="Jour")
+    last_value = models.PositiveIntegerField(default=0, verbose_name="Dernier numéro réservé")
+
+    class Meta:
+        verbose_name = "Séquence de factures"
+        verbose_name_plural = "Séquences de factures"
+
+    def __str__(self):
+        return f"{self.day:%Y%m%d} - {self.last_value}"
+
+
+class CheckoutRequest(models.Model):
+    """Clé d'idempotence d'un encaissement : un rejeu renvoie la vente d'origine"""
+
+    key = models.CharField(max_length=64, unique=True, verbose_name="Clé de requête")
+    sale = models.ForeignKey(Sale, on_delete=models.CASCADE, related_name="+", verbose_name="Vente")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Reçue le")
+
+    class Meta:
+        verbose_name = "Requête d'encaissement"
+        verbose_name_plural = "Requêtes d'encaissement"
+
+    def __str__(self):
+        return self.key
+
+
+class DailySalesSummary(models.Model):
+    """Agrégat journalier des ventes payées, tenu à jour à chaque écriture"""
+
+    date = models.DateField(unique=True, verbose_name="Jour")
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Chiffre d'affaires")
+    sale_count = models.IntegerField(default=0, verbose_name="Nombre de ventes")
+    item_count = models.IntegerField(default=0, verbose_name="Articles vendus")
+
+    class Meta:
+        verbose_name = "Synthèse journalière des ventes"
+        verbose_name_plural = "Synthèses journalières des ventes"
+        ordering = ['-date']
+
+    def __str__(self):
+        return f"{self.date} - {self.revenue}"
+
+
+class SalesFact(models.Model):
+    """
+    Cube des ventes payées au grain horaire (heure × caissier × produit),
+    avec la catégorie du produit au moment de la vente. Tenu à jour par
+    les écritures de ventes ; sert toutes les ventilations des rapports.
+    """
+
+    hour = models.DateTimeField(verbose_name="Heure")
+    cashier = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+", verbose_name="Caissier")
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="+", verbose_name="Catégorie")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+", verbose_name="Produit")
+    quantity = models.IntegerField(default=0, verbose_name="Quantité vendue")
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Chiffre d'affaires")
+    line_count = models.IntegerField(default=0, verbose_name="Lignes de vente")
+
+    class Meta:
+        verbose_name = "Fait de vente"
+        verbose_name_plural = "Faits de vente"
+        constraints = [
+            models.UniqueConstraint(fields=['hour', 'cashier', 'product'], name='salesfact_hour_cashier_product'),
+        ]
+        indexes = [
+            models.Index(fields=['category', 'hour'], name='salesfact_category_hour'),
+            models.Index(fields=['cashier', 'hour'], name='salesfact_cashier_hour'),
+            models.Index(fields=['product', 'hour'], name='salesfact_product_hour'),
+        ]
+
+    def __str__(self):
+        return f"{self.hour:%Y-%m-%d %H}h - {self.product_id} x{self.quantity}"
+
+
+class CatalogChange(models.Model):
+    """
+    Journal des modifications du catalogue (produits, prix, stocks,
+    catégories). L'id croissant sert de version aux terminaux de caisse
+    qui se synchronisent par différence (since=<version>).
+    """
+
+    class Kind(models.TextChoices):
+        PRODUCT = "PRODUCT", "Produit"
+        CATEGORY = "CATEGORY", "Catégorie"
+
+    id = models.BigAutoField(primary_key=True)
+    kind = models.CharField(max_length=10, choices=Kind.choices, verbose_name="Type")
+    object_id = models.IntegerField(verbose_name="Identifiant")
+    deleted = models.BooleanField(default=False, verbose_name="Supprimé")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Modifié le")
+
+    class Meta:
+        verbose_name = "Modification du catalogue"
+        verbose_name_plural = "Modifications du catalogue"
+
+    def __str__(self):
+        return f"{self.id} - {self.kind} {self.object_id}"
+
+
+class StatCounter(models.Model):
+    """
+    Compteur dénormalisé pour les badges des listes et du tableau de bord :
+    nombre de lignes d'un modèle (clé « product ») ou d'un critère
+    (« product:status=ACTIVE »). Tenu à jour par apps.core.counters.
+    """
+
+    key = models.CharField(max_length=64, unique=True, verbose_name="Clé")
+    value = models.BigIntegerField(default=0, verbose_name="Valeur")
+
+    class Meta:
+        verbose_name = "Compteur statistique"
+        verbose_name_plural = "Compteurs statistiques"
+
+    def __str__(self):
+        return f"{self.key} = {self.value}"
+
+
+# ===== RECHERCHE PLEIN TEXTE (FTS5) =====
+
+class FullTextField(models.TextField):
+    """Colonne cachée d'une table FTS5 portant son nom : cible de l'opérateur MATCH."""
+
+
+@FullTextField.register_lookup
+class FullTextMatch(Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} MATCH {rhs}", lhs_params + rhs_params
+
+
+class ProductSearchIndex(models.Model):
+    """
+    Table virtuelle FTS5 core_product_fts (nom, description, catégorie),
+    créée par migration et tenue à jour par apps.core.search. Le rowid est
+    l'id du produit ; `rank` est le score bm25 pondéré.
+    """
+
+    product = models.OneToOneField(
+        Product, on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid',
+        related_name='search_words',
+    )
+    document = FullTextField(db_column='core_product_fts')
+    rank = models.FloatField(db_column='rank')
+
+    class Meta:
+        managed = False
+        db_table = 'core_product_fts'
+
+
+class ProductTrigramIndex(models.Model):
+    """Table FTS5 core_product_trigram (nom, catégorie) : recherche tolérante aux fautes."""
+
+    product = models.OneToOneField(
+        Product, on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid',
+        related_name='search_trigrams',
+    )
+    document = FullTextField(db_column='core_product_trigram')
+    rank = models.FloatField(db_column='rank')
+
+    class Meta:
+        managed = False
+        db_table = 'core_product_trigram'
@@ -0,0 +1,177 @@
+# apps/core/pagination.py
+"""
+Pagination par curseur (keyset) : chaque page est lue par un WHERE sur la
+clé de tri de la dernière ligne affichée, par exemple (date, id), au lieu
+d'un OFFSET. Le coût d'une page ne dépend pas de sa position, à condition
+qu'un index composite couvre la clé. Les jetons suivant/précédent sont
+opaques ; le total exact (COUNT) est optionnel.
+"""
+
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorPage:
+    """Page lue par curseur ; même usage que django.core.paginator.Page dans les gabarits."""
+
+    def __init__(self, object_list, paginator, next_token, previous_token):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_token = next_token
+        self.previous_token = previous_token
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_token is not None
+
+    def has_previous(self):
+        return self.previous_token is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Paginateur keyset sur `ordering`, ex. ('-date', '-id') : la dernière clé
+    doit être unique. Avec count=False, aucun COUNT(*) n'est exécuté et
+    `count` vaut None ; `count` peut aussi être une fonction qui fournit le
+    total (compteur déjà tenu à jour, par exemple).
+    """
+
+    def __init__(self, queryset, per_page, ordering=('-date', '-id'), count=False):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+        self.fields = [key.lstrip('-') for key in self.ordering]
+        self._count = count
+
+    @property
+    def count(self):
+        if not self._count:
+            return None
+        if not hasattr(self, '_total'):
+            self._total = self._count() if callable(self._count) else self.queryset.count()
+        return self._total
+
+    # --- Jetons ---
+
+    def _encode(self, direction, obj):
+        values = [getattr(obj, field) for field in self.fields]
+        raw = json.dumps(
+            [direction] + [v.isoformat() if hasattr(v, 'isoformat') else v for v in values],
+            separators=(',', ':'),
+        )
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def _decode(self, token):
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            direction, *values = json.loads(raw)
+            if direction not in ('next', 'prev') or len(values) != len(self.fields):
+                raise ValueError
+            model = self.queryset.model
+            values = [model._meta.get_field(field).to_python(value)
+                      for field, value in zip(self.fields, values)]
+        except (ValueError, TypeError, binascii.Error, ValidationError) as exc:
+            raise InvalidCursor(token) from exc
+        return direction, values
+
+    # --- Lecture ---
+
+    def _after(self, values, reverse=False):
+        """
+        Lignes strictement après `values` dans l'ordre de tri (ou avant si
+        reverse). La borne large sur la première clé permet à SQLite de
+        parcourir l'index composite par intervalle.
+        """
+        condition = Q()
+        bound = None
+        for i, key in enumerate(self.ordering):
+            descending = key.startswith('-') != reverse
+            lookup = 'lt' if descending else 'gt'
+            if i == 0:
+                bound = Q(**{f"{self.fields[0]}__{lookup}e": values[0]})
+            step = Q(**{f"{self.fields[i]}__{lookup}": values[i]})
+            for field, value in zip(self.fields[:i], values[:i]):
+                step &= Q(**{field: value})
+            condition |= step
+        return bound & condition
+
+    def page(self, token=None):
+        """Page désignée par le jeton (première page si vide) ; InvalidCursor si le jeton est altéré."""
+        size = self.per_page
+        if not token:
+            rows = list(self.queryset.order_by(*self.ordering)[:size + 1])
+            has_more, has_before = len(rows) > size, False
+            rows = rows[:size]
+        else:
+            direction, values = self._decode(token)
+            if direction == 'next':
+                qs = self.queryset.filter(self._after(values)).order_by(*self.ordering)
+                rows = list(qs[:size + 1])
+                has_more, has_before = len(rows) > size, True
+                rows = rows[:size]
+            else:
+                reverse = [key[1:] if key.startswith('-') else f"-{key}" for key in self.ordering]
+                qs = self.queryset.filter(self._after(values, reverse=True)).order_by(*reverse)
+                rows = list(qs[:size + 1])
+                has_before, has_more = len(rows) > size, True
+                rows = rows[:size][::-1]
+        next_token = self._encode('next', rows[-1]) if rows and has_more else None
+        previous_token = self._encode('prev', rows[0]) if rows and has_before else None
+        return CursorPage(rows, self, next_token, previous_token)
+
+    def get_page(self, token=None):
+        """Comme page(), mais un jeton invalide renvoie la première page."""
+        try:
+            return self.page(token)
+        except InvalidCursor:
+            return self.page()
+
+
+def cursor_query(request):
+    """Paramètres GET de la page sans le jeton, encodés pour les liens précédent / suivant."""
+    params = request.GET.copy()
+    params.pop('cursor', None)
+    return params.urlencode()
+
+
+class CursorPaginationMixin:
+    """
+    Pour les ListView : remplace le Paginator (OFFSET/LIMIT) par un
+    CursorPaginator. Le jeton est lu dans ?cursor= ; les autres paramètres
+    (filtres) sont repris dans les liens via cursor_query.
+    """
+
+    cursor_ordering = ('-date', '-id')
+    cursor_count = False
+
+    def get_cursor_count(self):
+        return self.cursor_count
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = CursorPaginator(queryset, page_size, self.cursor_ordering, count=self.get_cursor_count())
+        page = paginator.get_page(self.request.GET.get('cursor'))
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx['cursor_query'] = cursor_query(self.request)
+        return ctx
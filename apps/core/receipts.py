@@ -0,0 +1,150 @@
+# apps/core/receipts.py
+"""
+Tickets de caisse 80 mm : texte brut, HTML imprimable et flux ESC/POS,
+à partir des mêmes données que les factures (invoices.invoice_data).
+Les gabarits de mise en page sont compilés une fois par largeur ; le rendu
+se limite à du formatage de chaînes.
+"""
+
+import base64
+from functools import lru_cache
+from html import escape
+
+from django.conf import settings
+
+from .invoices import invoice_data
+from .models import Sale
+
+RECEIPT_FORMATS = {
+    'text': 'text/plain; charset=utf-8',
+    'html': 'text/html; charset=utf-8',
+    'escpos': 'application/octet-stream',
+}
+
+# Commandes ESC/POS
+ESC_INIT = b'\x1b@'
+ESC_CODEPAGE_858 = b'\x1bt\x13'   # PC858 : Latin-1 avec le signe €
+ESC_ALIGN_LEFT = b'\x1ba\x00'
+ESC_ALIGN_CENTER = b'\x1ba\x01'
+ESC_BOLD_ON = b'\x1bE\x01'
+ESC_BOLD_OFF = b'\x1bE\x00'
+GS_FEED_CUT = b'\x1dVB\x03'       # avance de 3 lignes puis coupe partielle
+ESCPOS_ENCODING = 'cp858'
+
+AMOUNT_WIDTH = 12
+TOTAL_WIDTH = 16
+
+_HTML_PAGE = (
+    '<!DOCTYPE html><html lang="fr"><head><meta charset="utf-8">'
+    '<title>Ticket {number}</title><style>'
+    '@page{{size:80mm auto;margin:0}}'
+    'body{{width:72mm;margin:4mm;font:12px monospace}}'
+    'h1{{font-size:14px;text-align:center;margin:0 0 4px}}'
+    'table{{width:100%;border-collapse:collapse}}'
+    'td.r{{text-align:right}}tr.total td{{font-weight:bold;border-top:1px dashed #000}}'
+    'p.c{{text-align:center}}'
+    '</style></head><body onload="window.print()">'
+    '<h1>{header}</h1><p>Facture {number}<br>Date : {date}<br>'
+    'Caissier : {cashier}<br>Client : {customer}</p>'
+    '<table>{rows}<tr class="total"><td colspan="2">TOTAL</td><td class="r">{total} €</td></tr>'
+    '</table><p class="c">{footer}</p></body></html>'
+)
+_HTML_ROW = '<tr><td>{name}</td><td>{quantity} x {unit_price}</td><td class="r">{line_total}</td></tr>'
+
+
+class _Layout:
+    """Gabarits de lignes pour une largeur de ticket donnée (en caractères)."""
+
+    def __init__(self, width):
+        self.rule = '-' * width
+        self.center = '{:^%d.%d}' % (width, width)
+        self.name = '{:.%d}' % width
+        self.amount = '{:<%d}{:>%d}' % (width - AMOUNT_WIDTH, AMOUNT_WIDTH)
+        self.total = '{:<%d}{:>%d}' % (width - TOTAL_WIDTH, TOTAL_WIDTH)
+
+
+@lru_cache(maxsize=None)
+def _layout(width):
+    return _Layout(width)
+
+
+def _sections(invoice):
+    """Lignes du ticket : (en-tête centré, corps, ligne de total, pied centré)."""
+    layout = _layout(settings.RECEIPT_WIDTH)
+    header = [layout.center.format(settings.RECEIPT_HEADER)]
+    body = [
+        f"Facture {invoice['invoice_number']}",
+        f"Date : {invoice['date']}",
+        f"Caissier : {invoice['cashier']}",
+        f"Client : {invoice['customer']}",
+        layout.rule,
+    ]
+    for name, quantity, unit_price, line_total in invoice['items']:
+        body.append(layout.name.format(name))
+        body.append(layout.amount.format(f"  {quantity} x {unit_price}", line_total))
+    body.append(layout.rule)
+    total = layout.total.format('TOTAL', f"{invoice['total']} €")
+    footer = [layout.center.format(settings.RECEIPT_FOOTER)]
+    return header, body, total, footer
+
+
+def render_text(invoice):
+    header, body, total, footer = _sections(invoice)
+    return '\n'.join(header + body + [total] + footer) + '\n'
+
+
+def render_html(invoice):
+    rows = ''.join(
+        _HTML_ROW.format(name=escape(name), quantity=quantity, unit_price=unit_price, line_total=line_total)
+        for name, quantity, unit_price, line_total in invoice['items']
+    )
+    return _HTML_PAGE.format(
+        header=escape(settings.RECEIPT_HEADER),
+        number=escape(invoice['invoice_number']),
+        date=invoice['date'],
+        cashier=escape(invoice['cashier']),
+        customer=escape(invoice['customer']),
+        rows=rows,
+        total=invoice['total'],
+        footer=escape(settings.RECEIPT_FOOTER),
+    )
+
+
+def _encode(lines):
+    return ('\n'.join(lines) + '\n').encode(ESCPOS_ENCODING, errors='replace')
+
+
+def render_escpos(invoice):
+    header, body, total, footer = _sections(invoice)
+    return b''.join((
+        ESC_INIT, ESC_CODEPAGE_858,
+        ESC_ALIGN_CENTER, ESC_BOLD_ON, _encode(header), ESC_BOLD_OFF,
+        ESC_ALIGN_LEFT, _encode(body),
+        ESC_BOLD_ON, _encode([total]), ESC_BOLD_OFF,
+        ESC_ALIGN_CENTER, _encode(footer),
+        GS_FEED_CUT,
+    ))
+
+
+RENDERERS = {'text': render_text, 'html': render_html, 'escpos': render_escpos}
+
+
+def receipt_invoice(sale_id):
+    """Données du ticket d'une vente (deux requêtes) ; lève Sale.DoesNotExist."""
+    invoices = invoice_data(Sale.objects.filter(pk=sale_id))
+    if not invoices:
+        raise Sale.DoesNotExist
+    return next(iter(invoices.values()))
+
+
+def render_receipt(invoice, fmt):
+    """Ticket au format `fmt` : str pour text/html, bytes pour escpos."""
+    return RENDERERS[fmt](invoice)
+
+
+def receipt_json(invoice, fmt):
+    """Ticket à inclure dans une réponse JSON (ESC/POS encodé en base64)."""
+    receipt = render_receipt(invoice, fmt)
+    if fmt == 'escpos':
+        receipt = base64.b64encode(receipt).decode('ascii')
+    return {'format': fmt, 'content': receipt}
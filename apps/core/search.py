@@ -0,0 +1,107 @@
+# apps/core/search.py
+"""
+Recherche de produits sur les index FTS5 (voir la migration 0012) : mots
+préfixés classés par bm25, puis trigrammes si aucun mot ne correspond
+(fautes de frappe). Index tenus à jour par les signaux de signals.py ;
+`rebuild_search_index` les reconstruit entièrement.
+"""
+
+import re
+
+from django.db import connection
+
+_TOKEN = re.compile(r'\w+')
+
+_INDEX_WORDS = (
+    "INSERT INTO core_product_fts(rowid, name, description, category) "
+    "SELECT p.id, p.name, p.description, c.name FROM core_product p "
+    "JOIN core_category c ON c.id = p.category_id"
+)
+_INDEX_TRIGRAMS = (
+    "INSERT INTO core_product_trigram(rowid, name, category) "
+    "SELECT p.id, p.name, c.name FROM core_product p "
+    "JOIN core_category c ON c.id = p.category_id"
+)
+
+
+def search_enabled():
+    return connection.vendor == 'sqlite'
+
+
+def _reindex(where='', params=()):
+    """Supprime puis réinsère les lignes d'index des produits sélectionnés par `where`."""
+    if not search_enabled():
+        return
+    with connection.cursor() as cursor:
+        if where:
+            ids = f"SELECT p.id FROM core_product p JOIN core_category c ON c.id = p.category_id WHERE {where}"
+            cursor.execute(f"DELETE FROM core_product_fts WHERE rowid IN ({ids})", params)
+            cursor.execute(f"DELETE FROM core_product_trigram WHERE rowid IN ({ids})", params)
+            cursor.execute(f"{_INDEX_WORDS} WHERE {where}", params)
+            cursor.execute(f"{_INDEX_TRIGRAMS} WHERE {where}", params)
+        else:
+            cursor.execute("DELETE FROM core_product_fts")
+            cursor.execute("DELETE FROM core_product_trigram")
+            cursor.execute(_INDEX_WORDS)
+            cursor.execute(_INDEX_TRIGRAMS)
+
+
+def index_product(product_id):
+    _reindex("p.id = %s", [product_id])
+
+
+def index_category(category_id):
+    """Après renommage d'une catégorie : réindexe ses produits."""
+    _reindex("c.id = %s", [category_id])
+
+
+def unindex_product(product_id):
+    if not search_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("DELETE FROM core_product_fts WHERE rowid = %s", [product_id])
+        cursor.execute("DELETE FROM core_product_trigram WHERE rowid = %s", [product_id])
+
+
+def rebuild_search_index():
+    """Reconstruit les deux index et compacte leurs segments ; renvoie le nombre de produits indexés."""
+    if not search_enabled():
+        return 0
+    _reindex()
+    with connection.cursor() as cursor:
+        cursor.execute("INSERT INTO core_product_fts(core_product_fts) VALUES ('optimize')")
+        cursor.execute("INSERT INTO core_product_trigram(core_product_trigram) VALUES ('optimize')")
+        cursor.execute("SELECT count(*) FROM core_product_fts")
+        return cursor.fetchone()[0]
+
+
+def word_query(text):
+    """Requête FTS5 : chaque mot comme préfixe, tous requis ("jus"* "ora"*)."""
+    return ' '.join(f'"{token}"*' for token in _TOKEN.findall(text.lower()))
+
+
+def trigram_query(text):
+    """Requête FTS5 : n'importe quel trigramme des mots de 3 lettres et plus."""
+    trigrams = {
+        token[i:i + 3]
+        for token in _TOKEN.findall(text.lower())
+        for i in range(len(token) - 2)
+    }
+    return ' OR '.join(f'"{trigram}"' for trigram in sorted(trigrams))
+
+
+def search_products(queryset, text):
+    """
+    Filtre le queryset de produits sur `text`, classé par pertinence. Les
+    mots préfixés sont essayés d'abord ; sans résultat, les trigrammes
+    donnent les produits les plus proches. Hors SQLite : name__icontains.
+    """
+    text = text.strip()
+    words = word_query(text)
+    if not search_enabled() or not words:
+        return queryset.filter(name__icontains=text)
+    matches = queryset.filter(search_words__document__match=words).order_by('search_words__rank')
+    trigrams = trigram_query(text)
+    if not trigrams or matches.exists():
+        return matches
+    return queryset.filter(search_trigrams__document__match=trigrams).order_by('search_trigrams__rank')
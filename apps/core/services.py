@@ -0,0 +1,733 @@
+# apps/core/services.py
+
+import threading
+from collections import Counter, OrderedDict, deque
+from datetime import datetime, time
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import (
+    Coalesce, ExtractHour, ExtractIsoWeekDay, TruncHour, TruncMonth, TruncWeek,
+)
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .caching import bump_generation_on_commit, cached
+from .catalog import bump_catalog_version, record_catalog_changes, update_snapshot_stock
+from .counters import LOW_STOCK_KEY, adjust_counters, counter_key, record_created
+from .models import (
+    CatalogChange, CheckoutRequest, DailySalesSummary, InvoiceSequence, Product, Sale, SaleItem,
+    SalesFact,
+)
+
+
+class CheckoutError(Exception):
+    """Erreur de validation d'un panier (la vente n'est pas enregistrée)"""
+
+    def __init__(self, message, lines=None):
+        super().__init__(message)
+        self.message = message
+        self.lines = lines or []
+
+
+def format_invoice_number(day, seq):
+    return f"F{day:%Y%m%d}{seq:04d}"
+
+
+def _last_issued_seq(day):
+    """Plus grand numéro déjà émis ce jour-là (amorçage de la séquence)"""
+    last = (
+        Sale.objects.filter(invoice_number__startswith=f"F{day:%Y%m%d}")
+        .order_by('-invoice_number')
+        .values_list('invoice_number', flat=True)
+        .first()
+    )
+    try:
+        return int(last[-4:]) if last else 0
+    except ValueError:
+        return 0
+
+
+def reserve_invoice_numbers(count=1, day=None):
+    """
+    Réserve `count` numéros consécutifs dans la séquence du jour et
+    retourne leur plage. L'incrément est un UPDATE atomique : deux postes
+    ne peuvent jamais obtenir le même numéro. Les numéros réservés mais
+    non utilisés laissent simplement un trou dans la séquence.
+    """
+    day = day or timezone.localdate()
+    with transaction.atomic():
+        # La ligne du jour existe presque toujours : amorçage seulement si
+        # l'UPDATE ne touche rien (premier numéro du jour)
+        if not InvoiceSequence.objects.filter(pk=day).update(last_value=F('last_value') + count):
+            _, created = InvoiceSequence.objects.get_or_create(
+                day=day, defaults={'last_value': _last_issued_seq(day) + count}
+            )
+            if not created:
+                InvoiceSequence.objects.filter(pk=day).update(last_value=F('last_value') + count)
+        last = InvoiceSequence.objects.values_list('last_value', flat=True).get(pk=day)
+    return range(last - count + 1, last + 1)
+
+
+class InvoiceNumberPool:
+    """
+    Bloc de numéros de facture réservé d'avance par un processus de caisse.
+    Tant que le bloc n'est pas épuisé, un numéro s'obtient sans requête.
+    """
+
+    def __init__(self, block_size):
+        self.block_size = max(1, block_size)
+        self._lock = threading.Lock()
+        self._day = None
+        self._numbers = deque()
+
+    def take(self):
+        day = timezone.localdate()
+        with self._lock:
+            if day != self._day:
+                self._day = day
+                self._numbers.clear()
+            if not self._numbers:
+                self._numbers.extend(reserve_invoice_numbers(self.block_size, day))
+            return format_invoice_number(day, self._numbers.popleft())
+
+
+_invoice_pool = InvoiceNumberPool(getattr(settings, 'INVOICE_NUMBER_BLOCK_SIZE', 1))
+
+
+def generate_invoice_number():
+    """
+    Retourne un numéro de facture unique au format FYYYYMMDDNNNN.
+    Chaque jour, la séquence redémarre à 0001.
+    """
+    return _invoice_pool.take()
+
+
+def _normalize_basket(items):
+    """
+    Regroupe les lignes du panier par produit : {product_id: (quantité, prix unitaire)}.
+    Lève CheckoutError si une ligne est illisible.
+    """
+    basket = OrderedDict()
+    for it in items:
+        try:
+            pid = int(it['sku'])
+            qty = int(it['qty'])
+            price = Decimal(str(it['price']))
+        except (KeyError, TypeError, ValueError, InvalidOperation):
+            raise CheckoutError("Ligne de panier invalide.")
+        if qty <= 0:
+            raise CheckoutError("La quantité doit être positive.")
+        if pid in basket:
+            qty += basket[pid][0]
+        basket[pid] = (qty, price)
+    if not basket:
+        raise CheckoutError("Le panier est vide.")
+    return basket
+
+
+def _stock_error(product, requested):
+    return {
+        'sku': product.pk,
+        'name': product.name,
+        'requested': requested,
+        'available': product.stock_quantity,
+    }
+
+
+def find_replayed_sale(key):
+    """
+    Retourne (sale_id, invoice_number) si la clé a déjà été encaissée,
+    None sinon. Une seule requête sur l'index unique de la clé.
+    """
+    if not key:
+        return None
+    return (
+        CheckoutRequest.objects.filter(key=key)
+        .values_list('sale_id', 'sale__invoice_number')
+        .first()
+    )
+
+
+def purge_checkout_requests(ttl=None):
+    """Supprime les clés d'idempotence plus anciennes que `ttl` (timedelta)"""
+    if ttl is None:
+        ttl = timezone.timedelta(hours=getattr(settings, 'CHECKOUT_IDEMPOTENCY_TTL_HOURS', 24))
+    deleted, _ = CheckoutRequest.objects.filter(created_at__lt=timezone.now() - ttl).delete()
+    return deleted
+
+
+def checkout(cashier, items, customer_name="Client", idempotency_key=None):
+    """
+    Enregistre une vente en une seule transaction.
+
+    Les produits du panier sont chargés en une requête, les lignes insérées
+    avec un seul bulk_create et le stock décrémenté par des UPDATE
+    conditionnels (stock_quantity >= qté). Si une ligne ne peut pas être
+    servie, la transaction est annulée et CheckoutError liste les lignes
+    en défaut : aucune vente partielle n'est conservée.
+
+    Avec `idempotency_key`, la clé est enregistrée dans la même transaction
+    que la vente ; un rejeu concurrent de la même clé renvoie la vente
+    d'origine au lieu d'en créer une seconde.
+    """
+    basket = _normalize_basket(items)
+    products = Product.objects.in_bulk(list(basket))
+
+    missing = [pid for pid in basket if pid not in products]
+    if missing:
+        raise CheckoutError(
+            "Produit introuvable.",
+            [{'sku': pid, 'error': 'introuvable'} for pid in missing]
+        )
+
+    short = [
+        _stock_error(products[pid], qty)
+        for pid, (qty, _) in basket.items()
+        if products[pid].stock_quantity < qty
+    ]
+    if short:
+        raise CheckoutError(_stock_message(short[0]), short)
+
+    total = sum((qty * price for qty, price in basket.values()), Decimal('0'))
+    # Pris hors transaction : un numéro réservé n'est jamais rendu au pool
+    invoice_number = generate_invoice_number()
+
+    try:
+        with transaction.atomic():
+            sale = Sale.objects.create(
+                invoice_number=invoice_number,
+                cashier=cashier,
+                customer_name=customer_name,
+                status=Sale.Status.PAID,
+                total_amount=total,
+            )
+            if idempotency_key:
+                CheckoutRequest.objects.create(key=idempotency_key, sale=sale)
+            SaleItem.objects.bulk_create([
+                SaleItem(sale=sale, product_id=pid, quantity=qty, unit_price=price)
+                for pid, (qty, price) in basket.items()
+            ])
+            _decrease_stock({pid: qty for pid, (qty, _) in basket.items()})
+            contribution = SalesContribution()
+            contribution.add_sale(sale.date, total)
+            for pid, (qty, price) in basket.items():
+                contribution.add_line(
+                    sale.date, cashier.pk, pid, products[pid].category_id, qty, price
+                )
+            apply_sales_contribution(contribution)
+    except IntegrityError:
+        replayed = find_replayed_sale(idempotency_key)
+        if replayed is None:
+            raise
+        return Sale.objects.get(pk=replayed[0])
+
+    return sale
+
+
+def _decrease_stock(quantities):
+    """
+    Décrémente le stock ({product_id: quantité}) avec des UPDATE
+    conditionnels. Si un autre poste a vendu entre-temps, l'UPDATE ne
+    touche aucune ligne et la transaction englobante est annulée.
+    """
+    now = timezone.now()
+    for pid, qty in quantities.items():
+        updated = Product.objects.filter(pk=pid, stock_quantity__gte=qty).update(
+            stock_quantity=F('stock_quantity') - qty,
+            updated_at=now,
+        )
+        if not updated:
+            product = Product.objects.get(pk=pid)
+            error = _stock_error(product, qty)
+            raise CheckoutError(_stock_message(error), [error])
+    # update() n'émet pas de signal : les compteurs (alertes de stock,
+    # statuts) sont ajustés ici d'après l'état après décrément
+    deltas = Counter()
+    sold_out = []
+    stocks = {}
+    rows = Product.objects.filter(pk__in=list(quantities)).values_list('pk', 'stock_quantity', 'status')
+    for pid, stock, status in rows:
+        stocks[pid] = stock
+        if stock <= settings.LOW_STOCK_THRESHOLD < stock + quantities[pid]:
+            deltas[LOW_STOCK_KEY] += 1
+        if stock == 0 and status != Product.Status.OUT_OF_STOCK:
+            sold_out.append(pid)
+            deltas[counter_key('product', 'status', status)] -= 1
+            deltas[counter_key('product', 'status', Product.Status.OUT_OF_STOCK)] += 1
+    if sold_out:
+        Product.objects.filter(pk__in=sold_out).update(
+            status=Product.Status.OUT_OF_STOCK,
+            updated_at=now,
+        )
+    adjust_counters(deltas)
+    # update() n'émet pas post_save : journal des terminaux et catalogue de la
+    # caisse mis à jour ici. Le stock est reporté en place ; seul un produit
+    # épuisé (qui quitte le catalogue actif) force un rechargement.
+    record_catalog_changes(CatalogChange.Kind.PRODUCT, quantities)
+    transaction.on_commit(lambda: update_snapshot_stock(stocks))
+    if sold_out:
+        transaction.on_commit(bump_catalog_version)
+    bump_generation_on_commit(Product)
+
+
+def _stock_message(error):
+    return (
+        f"Stock insuffisant pour {error['name']}. "
+        f"Stock disponible: {error['available']}"
+    )
+
+
+def _parse_sold_at(value):
+    """Horodatage hors ligne envoyé par la caisse (ISO 8601), ou None"""
+    if not value:
+        return None
+    try:
+        sold_at = parse_datetime(str(value))
+    except ValueError:
+        return None
+    if sold_at is None:
+        return None
+    if timezone.is_naive(sold_at):
+        sold_at = timezone.make_aware(sold_at)
+    return min(sold_at, timezone.now())
+
+
+def sync_sales(cashier, queued):
+    """
+    Enregistre en un lot les ventes mises en file par une caisse hors ligne.
+
+    Chaque vente est un dict {'key', 'items', 'customer_name', 'sold_at'}.
+    Le stock est validé pour tout le lot en une passe (dans l'ordre de la
+    file), les numéros de facture réservés en un bloc et les écritures
+    faites par bulk_create dans une seule transaction. Retourne un résultat
+    par vente, dans l'ordre reçu ; une vente refusée n'empêche pas les
+    suivantes. Les clés déjà synchronisées renvoient la vente d'origine.
+
+    Si l'écriture du lot échoue à cause d'une caisse concurrente (stock vendu
+    entre-temps, même clé encaissée en direct), le lot est annulé puis
+    repris vente par vente : seule la vente en cause est refusée.
+    """
+    results = [None] * len(queued)
+    pending = []
+    seen_keys = set()
+    for idx, entry in enumerate(queued):
+        key = str(entry.get('key') or '')[:64] if isinstance(entry, dict) else ''
+        try:
+            if not isinstance(entry, dict):
+                raise CheckoutError("Vente invalide.")
+            if key and key in seen_keys:
+                raise CheckoutError("Clé en double dans le lot.")
+            basket = _normalize_basket(entry.get('items', []))
+        except CheckoutError as exc:
+            results[idx] = {'key': key, 'success': False, 'error': exc.message, 'lines': exc.lines}
+            continue
+        if key:
+            seen_keys.add(key)
+        pending.append((idx, key, basket, entry))
+
+    try:
+        _write_synced_sales(cashier, pending, results)
+    except (CheckoutError, IntegrityError):
+        for item in pending:
+            idx, key = item[0], item[1]
+            try:
+                _write_synced_sales(cashier, [item], results)
+            except CheckoutError as exc:
+                results[idx] = {'key': key, 'success': False, 'error': exc.message, 'lines': exc.lines}
+            except IntegrityError:
+                replayed = find_replayed_sale(key)
+                if replayed is None:
+                    results[idx] = {'key': key, 'success': False, 'error': "Vente non enregistrée, réessayer.", 'lines': []}
+                else:
+                    results[idx] = {
+                        'key': key, 'success': True, 'sale_id': replayed[0],
+                        'invoice_number': replayed[1], 'replayed': True,
+                    }
+    return results
+
+
+def _write_synced_sales(cashier, pending, results):
+    """
+    Écrit les ventes `pending` de sync_sales dans une transaction et
+    renseigne `results`. Lève CheckoutError ou IntegrityError (transaction
+    annulée) si une caisse concurrente a écrit entre-temps.
+    """
+    with transaction.atomic():
+        replayed = dict(
+            CheckoutRequest.objects.filter(key__in={key for _, key, _, _ in pending if key})
+            .values_list('key', 'sale_id')
+        )
+        invoices = dict(
+            Sale.objects.filter(pk__in=replayed.values())
+            .values_list('pk', 'invoice_number')
+        )
+        product_ids = {pid for _, _, basket, _ in pending for pid in basket}
+        products = Product.objects.select_for_update().in_bulk(list(product_ids))
+        remaining = {pid: p.stock_quantity for pid, p in products.items()}
+
+        accepted = []
+        for idx, key, basket, entry in pending:
+            if key in replayed:
+                sale_id = replayed[key]
+                results[idx] = {
+                    'key': key, 'success': True, 'sale_id': sale_id,
+                    'invoice_number': invoices.get(sale_id), 'replayed': True,
+                }
+                continue
+            lines = []
+            for pid, (qty, _) in basket.items():
+                if pid not in products:
+                    lines.append({'sku': pid, 'error': 'introuvable'})
+                elif remaining[pid] < qty:
+                    lines.append({
+                        'sku': pid, 'name': products[pid].name,
+                        'requested': qty, 'available': remaining[pid],
+                    })
+            if lines:
+                error = _stock_message(lines[0]) if 'name' in lines[0] else "Produit introuvable."
+                results[idx] = {'key': key, 'success': False, 'error': error, 'lines': lines}
+                continue
+            for pid, (qty, _) in basket.items():
+                remaining[pid] -= qty
+            accepted.append((idx, key, basket, entry))
+
+        if not accepted:
+            return
+
+        now = timezone.now()
+        today = timezone.localdate(now)
+        numbers = reserve_invoice_numbers(len(accepted), today)
+        sales = []
+        for seq, (_, _, basket, entry) in zip(numbers, accepted):
+            # bulk_create n'appelle pas Sale.save() : business_date est posé ici
+            sold_at = _parse_sold_at(entry.get('sold_at')) or now
+            sales.append(Sale(
+                invoice_number=format_invoice_number(today, seq),
+                date=sold_at,
+                business_date=timezone.localdate(sold_at),
+                cashier=cashier,
+                customer_name=str(entry.get('customer_name') or "Client")[:100],
+                status=Sale.Status.PAID,
+                total_amount=sum((q * p for q, p in basket.values()), Decimal('0')),
+            ))
+        Sale.objects.bulk_create(sales)
+        record_created(Sale, sales)
+
+        SaleItem.objects.bulk_create([
+            SaleItem(sale=sale, product_id=pid, quantity=qty, unit_price=price)
+            for sale, (_, _, basket, _) in zip(sales, accepted)
+            for pid, (qty, price) in basket.items()
+        ])
+        CheckoutRequest.objects.bulk_create([
+            CheckoutRequest(key=key, sale=sale)
+            for sale, (_, key, _, _) in zip(sales, accepted)
+            if key
+        ])
+        _decrease_stock({
+            pid: products[pid].stock_quantity - left
+            for pid, left in remaining.items()
+            if left != products[pid].stock_quantity
+        })
+        contribution = SalesContribution()
+        for sale, (_, _, basket, _) in zip(sales, accepted):
+            contribution.add_sale(sale.date, sale.total_amount)
+            for pid, (qty, price) in basket.items():
+                contribution.add_line(
+                    sale.date, cashier.pk, pid, products[pid].category_id, qty, price
+                )
+        apply_sales_contribution(contribution)
+        # bulk_create n'émet pas post_save : invalidation explicite
+        bump_generation_on_commit(Sale)
+
+    for sale, (idx, key, _, _) in zip(sales, accepted):
+        results[idx] = {
+            'key': key, 'success': True, 'sale_id': sale.pk,
+            'invoice_number': sale.invoice_number,
+        }
+
+
+# ===== AGRÉGATS (SYNTHÈSE JOURNALIÈRE ET CUBE) =====
+
+def _hour_bucket(date):
+    return timezone.localtime(date).replace(minute=0, second=0, microsecond=0)
+
+
+class SalesContribution:
+    """
+    Part d'un ensemble de ventes payées dans les agrégats :
+    `days`  {jour: [chiffre d'affaires, nb ventes, nb articles]}
+    `facts` {(heure, caissier, produit): [catégorie, quantité, CA, nb lignes]}
+    """
+
+    def __init__(self):
+        self.days = {}
+        self.facts = {}
+
+    def add_sale(self, date, total):
+        acc = self.days.setdefault(timezone.localdate(date), [Decimal('0'), 0, 0])
+        acc[0] += total or 0
+        acc[1] += 1
+
+    def add_line(self, date, cashier_id, product_id, category_id, quantity, unit_price):
+        self.days.setdefault(timezone.localdate(date), [Decimal('0'), 0, 0])[2] += quantity
+        key = (_hour_bucket(date), cashier_id, product_id)
+        acc = self.facts.setdefault(key, [category_id, 0, Decimal('0'), 0])
+        acc[1] += quantity
+        acc[2] += quantity * unit_price
+        acc[3] += 1
+
+
+def sales_contribution(queryset):
+    """
+    Part des ventes payées de `queryset` dans les agrégats, en deux
+    requêtes. À calculer avant une suppression ou une modification.
+    """
+    paid = queryset.filter(status=Sale.Status.PAID)
+    contribution = SalesContribution()
+    for date, total in paid.values_list('date', 'total_amount'):
+        contribution.add_sale(date, total)
+    lines = (
+        SaleItem.objects.filter(sale__in=paid.values('pk'))
+        .values_list('sale__date', 'sale__cashier_id', 'product_id',
+                     'product__category_id', 'quantity', 'unit_price')
+    )
+    for line in lines:
+        contribution.add_line(*line)
+    return contribution
+
+
+def apply_sales_contribution(contribution, sign=1):
+    """
+    Ajoute (sign=1) ou retire (sign=-1) une contribution aux agrégats.
+    La synthèse journalière est mise à jour par des UPDATE atomiques ; les
+    faits du cube sont lus verrouillés puis écrits en bulk_update/bulk_create.
+    """
+    for day, (revenue, sales, items) in contribution.days.items():
+        values = {
+            'revenue': F('revenue') + sign * revenue,
+            'sale_count': F('sale_count') + sign * sales,
+            'item_count': F('item_count') + sign * items,
+        }
+        if DailySalesSummary.objects.filter(date=day).update(**values):
+            continue
+        try:
+            with transaction.atomic():
+                DailySalesSummary.objects.create(
+                    date=day, revenue=sign * revenue,
+                    sale_count=sign * sales, item_count=sign * items,
+                )
+        except IntegrityError:
+            DailySalesSummary.objects.filter(date=day).update(**values)
+
+    if contribution.facts:
+        _apply_facts(contribution.facts, sign)
+
+
+def _apply_facts(facts, sign):
+    hours = {hour for hour, _, _ in facts}
+    cashiers = {cashier for _, cashier, _ in facts}
+    products = {product for _, _, product in facts}
+    with transaction.atomic():
+        existing = {
+            (f.hour, f.cashier_id, f.product_id): f
+            for f in SalesFact.objects.select_for_update().filter(
+                hour__in=hours, cashier_id__in=cashiers, product_id__in=products
+            )
+        }
+        changed, created = [], []
+        for key, (category_id, quantity, revenue, lines) in facts.items():
+            fact = existing.get(key)
+            if fact is None:
+                hour, cashier_id, product_id = key
+                fact = SalesFact(
+                    hour=hour, cashier_id=cashier_id, product_id=product_id,
+                    category_id=category_id,
+                )
+                created.append(fact)
+            else:
+                changed.append(fact)
+            fact.quantity += sign * quantity
+            fact.revenue += sign * revenue
+            fact.line_count += sign * lines
+        if changed:
+            SalesFact.objects.bulk_update(changed, ['quantity', 'revenue', 'line_count'])
+        if created:
+            SalesFact.objects.bulk_create(created)
+
+
+def rebuild_daily_sales_summary():
+    """Recalcule entièrement la synthèse journalière depuis l'historique"""
+    paid = Sale.objects.filter(status=Sale.Status.PAID)
+    days = {
+        row['business_date']: row
+        for row in paid.values('business_date')
+        .annotate(revenue=Sum('total_amount'), sales=Count('id'))
+    }
+    items = dict(
+        SaleItem.objects.filter(sale__status=Sale.Status.PAID)
+        .values('sale__business_date').annotate(n=Sum('quantity'))
+        .values_list('sale__business_date', 'n')
+    )
+    with transaction.atomic():
+        DailySalesSummary.objects.all().delete()
+        DailySalesSummary.objects.bulk_create([
+            DailySalesSummary(
+                date=day, revenue=row['revenue'] or 0,
+                sale_count=row['sales'], item_count=items.get(day) or 0,
+            )
+            for day, row in days.items()
+        ])
+    return len(days)
+
+
+def daily_sales_series(end, days=7):
+    """[(jour, chiffre d'affaires)] des `days` derniers jours jusqu'à `end`, en une requête"""
+    start = end - timezone.timedelta(days=days - 1)
+    revenue = dict(
+        DailySalesSummary.objects.filter(date__range=(start, end))
+        .values_list('date', 'revenue')
+    )
+    return [
+        (day, revenue.get(day, Decimal('0')))
+        for day in (start + timezone.timedelta(days=i) for i in range(days))
+    ]
+
+
+def rebuild_sales_facts():
+    """Recalcule entièrement le cube des ventes depuis l'historique"""
+    tz = timezone.get_current_timezone()
+    rows = (
+        SaleItem.objects.filter(sale__status=Sale.Status.PAID)
+        .annotate(hour=TruncHour('sale__date', tzinfo=tz))
+        .values('hour', 'sale__cashier_id', 'product_id', 'product__category_id')
+        .annotate(
+            qty=Sum('quantity'),
+            amount=Sum(F('quantity') * F('unit_price')),
+            lines=Count('id'),
+        )
+    )
+    with transaction.atomic():
+        SalesFact.objects.all().delete()
+        SalesFact.objects.bulk_create((
+            SalesFact(
+                hour=row['hour'], cashier_id=row['sale__cashier_id'],
+                product_id=row['product_id'], category_id=row['product__category_id'],
+                quantity=row['qty'], revenue=row['amount'], line_count=row['lines'],
+            )
+            for row in rows.iterator()
+        ), batch_size=1000)
+    return SalesFact.objects.count()
+
+
+# ===== LECTURE DU CUBE =====
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def sales_facts(start=None, end=None, category_id=None, cashier_id=None):
+    """
+    Faits du cube pour une tranche : jours `start`..`end` inclus (dates
+    locales), catégorie et caissier optionnels. Parcours d'index, sans
+    jointure sur les ventes.
+    """
+    qs = SalesFact.objects.all()
+    if start:
+        qs = qs.filter(hour__gte=_day_start(start))
+    if end:
+        qs = qs.filter(hour__lt=_day_start(end + timezone.timedelta(days=1)))
+    if category_id:
+        qs = qs.filter(category_id=category_id)
+    if cashier_id:
+        qs = qs.filter(cashier_id=cashier_id)
+    return qs
+
+
+def facts_totals(facts):
+    return facts.aggregate(
+        revenue=Coalesce(Sum('revenue'), Decimal('0'), output_field=DecimalField()),
+        quantity=Coalesce(Sum('quantity'), 0),
+    )
+
+
+def top_products(facts, limit=5):
+    return list(
+        facts.values('product_id', 'product__name')
+        .annotate(quantity=Sum('quantity'), revenue=Sum('revenue'))
+        .order_by('-revenue')[:limit]
+    )
+
+
+def revenue_by_cashier(facts):
+    return list(
+        facts.values('cashier_id', 'cashier__first_name', 'cashier__last_name', 'cashier__username')
+        .annotate(quantity=Sum('quantity'), revenue=Sum('revenue'))
+        .order_by('-revenue')
+    )
+
+
+def revenue_by_category(facts):
+    return list(
+        facts.values('category_id', 'category__name')
+        .annotate(quantity=Sum('quantity'), revenue=Sum('revenue'))
+        .order_by('-revenue')
+    )
+
+
+def hourly_heatmap(facts):
+    """Matrice 7 × 24 (lundi..dimanche × heure) du chiffre d'affaires"""
+    tz = timezone.get_current_timezone()
+    grid = [[0.0] * 24 for _ in range(7)]
+    rows = (
+        facts.annotate(
+            weekday=ExtractIsoWeekDay('hour', tzinfo=tz),
+            hod=ExtractHour('hour', tzinfo=tz),
+        )
+        .values('weekday', 'hod')
+        .annotate(revenue=Sum('revenue'))
+        .values_list('weekday', 'hod', 'revenue')
+    )
+    for weekday, hod, revenue in rows:
+        grid[weekday - 1][hod] = float(revenue or 0)
+    return grid
+
+
+# ===== RAPPORT DES VENTES (AGRÉGÉ ET MIS EN CACHE) =====
+
+REPORT_GRANULARITIES = {
+    'day': (None, "%Y-%m-%d"),
+    'week': (TruncWeek, "%G-S%V"),
+    'month': (TruncMonth, "%Y-%m"),
+}
+
+
+def sales_report(start=None, end=None, granularity='day'):
+    """
+    Chiffre d'affaires des ventes payées par jour, semaine ou mois :
+    [(période, total, nb ventes)]. Une seule requête groupée sur
+    business_date, mise en cache par filtre jusqu'à la prochaine écriture
+    sur les ventes (partagée par les quatre formats d'export).
+    """
+    if granularity not in REPORT_GRANULARITIES:
+        granularity = 'day'
+    trunc, label = REPORT_GRANULARITIES[granularity]
+
+    def build():
+        qs = Sale.objects.filter(status=Sale.Status.PAID)
+        if start and end:
+            qs = qs.filter(business_date__range=(start, end))
+        period = trunc('business_date') if trunc else F('business_date')
+        return [
+            (day.strftime(label), total.quantize(Decimal('0.01')), count)
+            for day, total, count in (
+                qs.annotate(period=period)
+                .values('period')
+                .annotate(total=Sum('total_amount'), count=Count('id'))
+                .order_by('period')
+                .values_list('period', 'total', 'count')
+            )
+        ]
+    return cached('sales-report', [Sale], build, str(start), str(end), granularity)
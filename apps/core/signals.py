@@ -0,0 +1,127 @@
+# apps/core/signals.py
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from apps.accounts.models import User
+
+from .caching import bump_generation_on_commit
+from .catalog import bump_catalog_version, record_catalog_changes
+from .counters import adjust_counters, count_changes, counter_spec, instance_keys, stored_keys
+from .invoices import invalidate_invoice
+from .models import CatalogChange, Category, Product, Sale, SaleItem, Supplier
+from .search import index_category, index_product, unindex_product
+
+
+# Une vente modifiée, remboursée ou supprimée rend sa facture en cache caduque
+@receiver(post_save, sender=Sale)
+@receiver(post_delete, sender=Sale)
+def invalidate_sale_invoice(sender, instance, created=False, **kwargs):
+    if not created:
+        invalidate_invoice(instance.pk)
+
+
+@receiver(post_save, sender=SaleItem)
+@receiver(post_delete, sender=SaleItem)
+def invalidate_item_invoice(sender, instance, **kwargs):
+    invalidate_invoice(instance.sale_id)
+
+
+# Index de recherche plein texte des produits
+@receiver(post_save, sender=Product)
+def index_saved_product(sender, instance, **kwargs):
+    index_product(instance.pk)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_deleted_product(sender, instance, **kwargs):
+    unindex_product(instance.pk)
+
+
+# Catalogue en mémoire de la caisse (autocomplétion)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_catalog(sender, **kwargs):
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, created=False, **kwargs):
+    if not created:
+        index_category(instance.pk)
+
+
+# Journal des modifications pour la synchronisation des terminaux
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def log_product_change(sender, instance, signal, **kwargs):
+    record_catalog_changes(CatalogChange.Kind.PRODUCT, [instance.pk], deleted=signal is post_delete)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def log_category_change(sender, instance, signal, **kwargs):
+    record_catalog_changes(CatalogChange.Kind.CATEGORY, [instance.pk], deleted=signal is post_delete)
+
+
+# Compteurs des badges (StatCounter), mis à jour dans la même transaction
+def _counts_unchanged(spec, update_fields):
+    return update_fields is not None and not set(spec.read_fields) & update_fields
+
+
+@receiver(pre_save, sender=Product)
+@receiver(pre_save, sender=Sale)
+@receiver(pre_save, sender=Supplier)
+@receiver(pre_save, sender=User)
+def read_counted_values(sender, instance, raw=False, update_fields=None, **kwargs):
+    spec = counter_spec(sender)
+    if raw or instance._state.adding or _counts_unchanged(spec, update_fields):
+        return
+    instance._counter_keys = stored_keys(spec, sender, instance.pk)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Sale)
+@receiver(post_save, sender=Supplier)
+@receiver(post_save, sender=User)
+def update_counters(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    spec = counter_spec(sender)
+    if raw or (not created and _counts_unchanged(spec, update_fields)):
+        return
+    before = [] if created else instance.__dict__.pop('_counter_keys', [])
+    adjust_counters(count_changes(before, instance_keys(spec, instance)))
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Sale)
+@receiver(post_delete, sender=Supplier)
+@receiver(post_delete, sender=User)
+def decrement_counters(sender, instance, **kwargs):
+    spec = counter_spec(sender)
+    adjust_counters(count_changes(instance_keys(spec, instance), []))
+
+
+# Générations du cache versionné : une écriture validée rend caduques les
+# entrées qui dépendent du modèle. La connexion (last_login seul) n'en est pas une.
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Sale)
+@receiver(post_delete, sender=Sale)
+@receiver(post_save, sender=Supplier)
+@receiver(post_delete, sender=Supplier)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def bump_model_generation(sender, update_fields=None, **kwargs):
+    if update_fields is not None and update_fields <= {'last_login'}:
+        return
+    bump_generation_on_commit(sender)
+
+
+# Les lignes font partie de la vente
+@receiver(post_save, sender=SaleItem)
+@receiver(post_delete, sender=SaleItem)
+def bump_sale_generation(sender, **kwargs):
+    bump_generation_on_commit(Sale)
@@ -0,0 +1,60 @@
+# apps/core/templatetags/versioned_cache.py
+"""
+{% versioned_cache "nom" "core.category" ... on var1 var2 %}...{% endversioned_cache %}
+
+Fragment mis en cache jusqu'à la prochaine écriture sur l'un des modèles
+cités (libellés « app.modèle »), par valeur des variables après `on`.
+"""
+
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.core.caching import versioned_key
+
+register = template.Library()
+
+
+class VersionedCacheNode(template.Node):
+
+    def __init__(self, nodelist, name, models, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.models = models
+        self.vary_on = vary_on
+
+    def render(self, context):
+        name = self.name.resolve(context)
+        models = [model.resolve(context) for model in self.models]
+        key = versioned_key(f"fragment:{name}", models, *(var.resolve(context) for var in self.vary_on))
+        value = cache.get(key)
+        if value is None:
+            value = self.nodelist.render(context)
+            cache.set(key, value, settings.VERSIONED_CACHE_TIMEOUT)
+        return value
+
+
+@register.tag('versioned_cache')
+def do_versioned_cache(parser, token):
+    nodelist = parser.parse(('endversioned_cache',))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' attend un nom de fragment et au moins un modèle."
+        )
+    args = bits[1:]
+    vary_on = []
+    if 'on' in args:
+        index = args.index('on')
+        args, vary_on = args[:index], args[index + 1:]
+    if len(args) < 2:
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' attend un nom de fragment et au moins un modèle."
+        )
+    return VersionedCacheNode(
+        nodelist,
+        parser.compile_filter(args[0]),
+        [parser.compile_filter(arg) for arg in args[1:]],
+        [parser.compile_filter(arg) for arg in vary_on],
+    )
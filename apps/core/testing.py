@@ -0,0 +1,64 @@
+# apps/core/testing.py
+"""
+Base commune des tests : cache en mémoire du processus de test, vidé avant
+chaque test. Les tests ne touchent pas au cache disque partagé par les
+workers (BASE_DIR/cache), et les générations du cache versionné ne
+survivent pas à l'annulation de la transaction d'un test. Les comptes de
+test sont créés une fois par classe (setUpTestData).
+"""
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from .models import Category
+
+PASSWORD = 'testpass123'
+
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'store-manager-tests',
+    }
+}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class StoreTestCase(TestCase):
+    """TestCase sur un cache en mémoire vide au début de chaque test"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+
+def create_user(username, role=None, **extra):
+    """Compte de test <username>@test.com (caissier par défaut), mot de passe PASSWORD"""
+    User = get_user_model()
+    return User.objects.create_user(
+        username=username, email=f'{username}@test.com', password=PASSWORD,
+        role=role or User.Role.CASHIER, **extra
+    )
+
+
+class AdminTestCase(StoreTestCase):
+    """Gérant « gerant » (ADMIN), créé une fois pour la classe"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.admin = create_user('gerant', get_user_model().Role.ADMIN)
+
+
+class CashierTestCase(StoreTestCase):
+    """Caissier « caissier » connecté et catégorie « Boissons » pour les produits de la classe"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.cashier = create_user('caissier')
+        cls.cat = Category.objects.create(name='Boissons')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.cashier)
@@ -1,14 +1,64 @@
-from django.test import TestCase, Client
-from django.urls import reverse
+import base64
+import datetime
+import glob
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+from decimal import Decimal
+from unittest import mock
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.tokens import default_token_generator
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import Client, RequestFactory, modify_settings, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from pypdf import PdfReader
+
+from apps.accounts import urls as accounts_urls
+from apps.accounts.models import ActivityLog, ExportJob
+from apps.accounts.views import SaleListView
+from . import urls as core_urls
+from .barcodes import assign_internal_barcodes, ean13_check_digit, import_barcodes, internal_ean13
+from .caching import cached, cached_queryset, generations
+from .catalog import catalog_snapshot, purge_catalog_changes, scan_barcode
+from .counters import read_counters, reconcile_counters
+from .invoices import cached_invoice
+from .middleware import RepeatedQueryError, RepeatedQueryMiddleware
+from .models import (
+    CatalogChange, Category, CheckoutRequest, DailySalesSummary, Product, Sale, SaleItem,
+    SalesFact, StatCounter, Supplier,
+)
+from .pagination import CursorPaginator, InvalidCursor, cursor_query
+from .search import search_products
+from .services import (
+    checkout, facts_totals, format_invoice_number, rebuild_sales_facts, reserve_invoice_numbers,
+    sales_facts, sync_sales,
+)
+from .testing import AdminTestCase, CashierTestCase, StoreTestCase, create_user
 
 User = get_user_model()
 
 
-class CoreViewsTest(TestCase):
+class CoreViewsTest(StoreTestCase):
     """Tests pour les vues principales"""
 
     def setUp(self):
+        super().setUp()
         self.client = Client()
         self.admin_user = User.objects.create_user(
             username='admin',
@@ -52,3 +102,1224 @@ class CoreViewsTest(TestCase):
         self.client.login(username='cashier', password='testpass123')
         response = self.client.get(reverse('core:home'))
         self.assertRedirects(response, reverse('core:caisse'))
+
+
+class CheckoutServiceTest(CashierTestCase):
+    """Tests pour l'encaissement en caisse"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.water = Product.objects.create(name='Eau', category=cls.cat, price='1.00', stock_quantity=5)
+        cls.juice = Product.objects.create(name='Jus', category=cls.cat, price='2.50', stock_quantity=1)
+
+    def post_checkout(self, items):
+        return self.client.post(
+            reverse('core:caisse_checkout'),
+            data=json.dumps({'items': items, 'payment_mode': 'CARD'}),
+            content_type='application/json'
+        )
+
+    def test_checkout_creates_sale_and_decrements_stock(self):
+        """Test d'une vente complète : lignes, total et stock"""
+        response = self.post_checkout([
+            {'sku': self.water.pk, 'qty': 2, 'price': '1.00'},
+            {'sku': self.juice.pk, 'qty': 1, 'price': '2.50'},
+        ])
+        data = response.json()
+        self.assertTrue(data['success'])
+        sale = Sale.objects.get(pk=data['sale_id'])
+        self.assertEqual(sale.items.count(), 2)
+        self.assertEqual(sale.total_amount, Decimal('4.50'))
+        self.assertEqual(Product.objects.get(pk=self.water.pk).stock_quantity, 3)
+        juice = Product.objects.get(pk=self.juice.pk)
+        self.assertEqual(juice.stock_quantity, 0)
+        self.assertEqual(juice.status, Product.Status.OUT_OF_STOCK)
+
+    def test_checkout_insufficient_stock_leaves_no_sale(self):
+        """Test qu'une ligne en rupture annule toute la vente"""
+        response = self.post_checkout([
+            {'sku': self.water.pk, 'qty': 1, 'price': '1.00'},
+            {'sku': self.juice.pk, 'qty': 3, 'price': '2.50'},
+        ])
+        data = response.json()
+        self.assertFalse(data['success'])
+        self.assertEqual(data['lines'][0]['sku'], self.juice.pk)
+        self.assertEqual(data['lines'][0]['available'], 1)
+        self.assertFalse(Sale.objects.exists())
+        self.assertEqual(Product.objects.get(pk=self.water.pk).stock_quantity, 5)
+
+
+    def test_checkout_replay_returns_original_sale(self):
+        """Test qu'un rejeu avec la même clé ne crée pas de seconde vente"""
+        items = [{'sku': self.water.pk, 'qty': 2, 'price': '1.00'}]
+        first = self.client.post(
+            reverse('core:caisse_checkout'),
+            data=json.dumps({'items': items}),
+            content_type='application/json',
+            HTTP_IDEMPOTENCY_KEY='abc-123'
+        ).json()
+        second = self.client.post(
+            reverse('core:caisse_checkout'),
+            data=json.dumps({'items': items}),
+            content_type='application/json',
+            HTTP_IDEMPOTENCY_KEY='abc-123'
+        ).json()
+        self.assertEqual(first['sale_id'], second['sale_id'])
+        self.assertTrue(second['replayed'])
+        self.assertEqual(Sale.objects.count(), 1)
+        self.assertEqual(Product.objects.get(pk=self.water.pk).stock_quantity, 3)
+
+
+class InvoiceNumberTest(StoreTestCase):
+    """Tests pour l'allocation des numéros de facture"""
+
+    def test_reserved_blocks_do_not_overlap(self):
+        """Test que deux réservations successives sont disjointes"""
+        first = reserve_invoice_numbers(5)
+        second = reserve_invoice_numbers(3)
+        self.assertEqual(list(first), [1, 2, 3, 4, 5])
+        self.assertEqual(list(second), [6, 7, 8])
+
+    def test_sequence_starts_after_existing_invoices(self):
+        """Test de l'amorçage de la séquence sur les factures existantes"""
+        cashier = create_user('seq')
+        today = timezone.localdate()
+        Sale.objects.create(
+            invoice_number=format_invoice_number(today, 41),
+            cashier=cashier, customer_name='Client', total_amount=0
+        )
+        self.assertEqual(list(reserve_invoice_numbers(1)), [42])
+
+    def test_existing_sequence_skips_seed_scan(self):
+        """Test : une fois la ligne du jour créée, pas de recherche des factures émises"""
+        reserve_invoice_numbers(1)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(list(reserve_invoice_numbers(2)), [2, 3])
+        self.assertFalse([q for q in queries if 'core_sale' in q['sql']])
+
+
+class CaisseSyncTest(CashierTestCase):
+    """Tests pour la synchronisation des ventes hors ligne"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.rice = Product.objects.create(name='Riz', category=cls.cat, price='3.00', stock_quantity=4)
+
+    def post_sync(self, sales):
+        return self.client.post(
+            reverse('core:caisse_sync'),
+            data=json.dumps({'sales': sales}),
+            content_type='application/json'
+        ).json()
+
+    def test_sync_requires_csrf_token(self):
+        """Test que la synchronisation (écriture en lot) exige le jeton CSRF"""
+        client = Client(enforce_csrf_checks=True)
+        client.login(username='caissier', password='testpass123')
+        body = json.dumps({'sales': [
+            {'key': 'k1', 'items': [{'sku': self.rice.pk, 'qty': 1, 'price': '3.00'}]},
+        ]})
+        response = client.post(reverse('core:caisse_sync'), data=body, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(Sale.objects.count(), 0)
+
+        client.get(reverse('core:caisse'))
+        response = client.post(reverse('core:caisse_sync'), data=body, content_type='application/json',
+                               headers={'X-CSRFToken': client.cookies['csrftoken'].value})
+        self.assertTrue(response.json()['results'][0]['success'])
+
+    def test_sync_batch_reports_each_sale(self):
+        """Test d'un lot : stock validé pour tout le lot, résultat par vente"""
+        data = self.post_sync([
+            {'key': 'k1', 'items': [{'sku': self.rice.pk, 'qty': 3, 'price': '3.00'}]},
+            {'key': 'k2', 'items': [{'sku': self.rice.pk, 'qty': 2, 'price': '3.00'}]},
+            {'key': 'k3', 'items': [{'sku': self.rice.pk, 'qty': 1, 'price': '3.00'}]},
+        ])
+        results = data['results']
+        self.assertEqual([r['success'] for r in results], [True, False, True])
+        self.assertEqual(results[1]['lines'][0]['available'], 1)
+        self.assertEqual(Sale.objects.count(), 2)
+        self.assertNotEqual(results[0]['invoice_number'], results[2]['invoice_number'])
+        self.assertEqual(Product.objects.get(pk=self.rice.pk).stock_quantity, 0)
+
+    def test_sync_replay_does_not_duplicate(self):
+        """Test qu'un lot renvoyé après coupure ne crée pas de doublons"""
+        batch = [{'key': 'k1', 'items': [{'sku': self.rice.pk, 'qty': 1, 'price': '3.00'}]}]
+        first = self.post_sync(batch)['results'][0]
+        second = self.post_sync(batch)['results'][0]
+        self.assertEqual(first['sale_id'], second['sale_id'])
+        self.assertTrue(second['replayed'])
+        self.assertEqual(Sale.objects.count(), 1)
+
+    def stale_first_read(self, manager, method, stale):
+        """
+        Caisse concurrente : la première lecture du lot renvoie `stale`
+        (état d'avant l'écriture concurrente, déjà en base), les suivantes
+        lisent la base.
+        """
+        real = getattr(manager, method)
+        calls = []
+
+        def read(*args, **kwargs):
+            calls.append(args)
+            return stale if len(calls) == 1 else real(*args, **kwargs)
+        return mock.patch.object(manager, method, read)
+
+    def test_sync_isolates_concurrent_stock_sale(self):
+        """Test : stock vendu par une autre caisse pendant le lot, seule la vente en cause est refusée"""
+        stale = Product.objects.get(pk=self.rice.pk)
+        Product.objects.filter(pk=self.rice.pk).update(stock_quantity=1)
+        locked = mock.Mock(in_bulk=lambda ids: {stale.pk: stale})
+        with self.stale_first_read(Product.objects, 'select_for_update', locked):
+            results = self.post_sync([
+                {'key': 'k1', 'items': [{'sku': self.rice.pk, 'qty': 3, 'price': '3.00'}]},
+                {'key': 'k2', 'items': [{'sku': self.rice.pk, 'qty': 1, 'price': '3.00'}]},
+            ])['results']
+        self.assertEqual([r['success'] for r in results], [False, True])
+        self.assertEqual(results[0]['lines'][0]['available'], 1)
+        self.assertEqual(Sale.objects.count(), 1)
+        self.assertEqual(Product.objects.get(pk=self.rice.pk).stock_quantity, 0)
+
+    def test_sync_concurrent_checkout_same_key(self):
+        """Test : clé encaissée en direct pendant le lot, la vente d'origine est renvoyée"""
+        cashier = User.objects.get(username='caissier')
+        items = [{'sku': self.rice.pk, 'qty': 1, 'price': '3.00'}]
+        live = checkout(cashier, items, idempotency_key='k1')
+        with self.stale_first_read(CheckoutRequest.objects, 'filter', CheckoutRequest.objects.none()):
+            results = self.post_sync([
+                {'key': 'k1', 'items': items},
+                {'key': 'k2', 'items': items},
+            ])['results']
+        self.assertEqual([r['success'] for r in results], [True, True])
+        self.assertEqual(results[0]['sale_id'], live.pk)
+        self.assertTrue(results[0]['replayed'])
+        self.assertEqual(Sale.objects.count(), 2)
+
+
+class DailySalesSummaryTest(AdminTestCase):
+    """Tests pour la synthèse journalière des ventes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cat = Category.objects.create(name='Hygiène')
+        cls.soap = Product.objects.create(name='Savon', category=cat, price='2.00', stock_quantity=10)
+
+    def sell(self, qty):
+        return checkout(self.admin, [{'sku': self.soap.pk, 'qty': qty, 'price': '2.00'}])
+
+    def test_checkout_and_delete_update_summary(self):
+        """Test de la mise à jour incrémentale à l'encaissement et à la suppression"""
+        self.sell(2)
+        sale = self.sell(3)
+        summary = DailySalesSummary.objects.get(date=timezone.localdate())
+        self.assertEqual(summary.revenue, Decimal('10.00'))
+        self.assertEqual((summary.sale_count, summary.item_count), (2, 5))
+
+        self.client.login(username='gerant', password='testpass123')
+        self.client.post(reverse('accounts:sale_bulk_delete'), {'sale_ids': [sale.pk]})
+        summary.refresh_from_db()
+        self.assertEqual(summary.revenue, Decimal('4.00'))
+        self.assertEqual((summary.sale_count, summary.item_count), (1, 2))
+
+    def test_rebuild_matches_incremental(self):
+        """Test que la reconstruction retrouve les mêmes totaux"""
+        self.sell(1)
+        self.sell(4)
+        expected = list(DailySalesSummary.objects.values_list('date', 'revenue', 'sale_count', 'item_count'))
+        DailySalesSummary.objects.all().delete()
+        call_command('rebuild_daily_sales', stdout=io.StringIO())
+        rebuilt = list(DailySalesSummary.objects.values_list('date', 'revenue', 'sale_count', 'item_count'))
+        self.assertEqual(rebuilt, expected)
+
+    def test_dashboard_and_reports_read_summary(self):
+        """Test que le tableau de bord et les rapports lisent la synthèse"""
+        self.sell(2)
+        self.client.login(username='gerant', password='testpass123')
+        response = self.client.get(reverse('core:dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['sales_today'], Decimal('4.00'))
+        self.assertEqual(json.loads(response.context['sales_values'])[-1], 4.0)
+        response = self.client.get(reverse('core:reports'))
+        self.assertEqual(json.loads(response.context['sales_totals'])[-1], 4.0)
+
+
+class SalesCubeTest(AdminTestCase):
+    """Tests pour le cube des ventes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        food = Category.objects.create(name='Alimentation')
+        drinks = Category.objects.create(name='Boissons')
+        cls.bread = Product.objects.create(name='Pain', category=food, price='1.00', stock_quantity=10)
+        cls.milk = Product.objects.create(name='Lait', category=drinks, price='2.00', stock_quantity=10)
+
+    def test_checkout_feeds_cube_and_rebuild_matches(self):
+        """Test que l'encaissement alimente le cube comme la reconstruction"""
+        checkout(self.admin, [
+            {'sku': self.bread.pk, 'qty': 2, 'price': '1.00'},
+            {'sku': self.milk.pk, 'qty': 1, 'price': '2.00'},
+        ])
+        checkout(self.admin, [{'sku': self.bread.pk, 'qty': 3, 'price': '1.00'}])
+        food = facts_totals(sales_facts(category_id=self.bread.category_id))
+        self.assertEqual(food['revenue'], Decimal('5.00'))
+        self.assertEqual(food['quantity'], 5)
+
+        fields = ('hour', 'cashier_id', 'product_id', 'category_id', 'quantity', 'revenue', 'line_count')
+        expected = sorted(SalesFact.objects.values_list(*fields))
+        rebuild_sales_facts()
+        self.assertEqual(sorted(SalesFact.objects.values_list(*fields)), expected)
+
+    def test_reports_category_slice(self):
+        """Test des ventilations du rapport filtré par catégorie"""
+        checkout(self.admin, [
+            {'sku': self.bread.pk, 'qty': 2, 'price': '1.00'},
+            {'sku': self.milk.pk, 'qty': 1, 'price': '2.00'},
+        ])
+        self.client.login(username='gerant', password='testpass123')
+        response = self.client.get(reverse('core:reports'), {'category': self.milk.category_id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_revenue'], Decimal('2.00'))
+        self.assertEqual(response.context['total_sales'], 1)
+        self.assertEqual([p['product__name'] for p in response.context['top_products']], ['Lait'])
+
+
+class SaleBusinessDateTest(AdminTestCase):
+    """Tests pour le jour de vente local (business_date)"""
+
+    def create_sale(self, invoice, date):
+        return Sale.objects.create(
+            invoice_number=invoice, date=date, cashier=self.admin,
+            customer_name='Client', total_amount=10
+        )
+
+    def test_business_date_uses_store_timezone(self):
+        """Test que business_date suit le fuseau du magasin"""
+        with override_settings(TIME_ZONE='America/New_York'):
+            sale = self.create_sale('F1', datetime.datetime(2025, 3, 2, 3, 0, tzinfo=ZoneInfo('UTC')))
+        self.assertEqual(sale.business_date, datetime.date(2025, 3, 1))
+
+    def test_sale_list_filters_on_business_date(self):
+        """Test du filtre par période de la liste des ventes"""
+        today = timezone.localdate()
+        self.create_sale('F1', timezone.now())
+        self.create_sale('F2', timezone.now() - datetime.timedelta(days=3))
+        self.client.login(username='gerant', password='testpass123')
+        response = self.client.get(reverse('accounts:sale_list'), {'date_from': today.isoformat()})
+        self.assertEqual([s.invoice_number for s in response.context['object_list']], ['F1'])
+
+
+class InvoiceCacheTest(AdminTestCase):
+    """Tests pour le cache disque des factures et l'impression par lot"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        category = Category.objects.create(name='Boissons')
+        cls.product = Product.objects.create(
+            name='Jus', category=category, price=Decimal('2.50'), stock_quantity=100
+        )
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def create_sale(self, invoice):
+        sale = Sale.objects.create(
+            invoice_number=invoice, cashier=self.admin, customer_name='Client', total_amount=5
+        )
+        SaleItem.objects.create(sale=sale, product=self.product, quantity=2, unit_price=Decimal('2.50'))
+        return sale
+
+    def download(self, sale):
+        response = self.client.get(reverse('core:generate_invoice'), {'sale_id': sale.pk})
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_invoice_served_from_cache(self):
+        """Test que la seconde demande ne relit pas les lignes ni ne redessine le PDF"""
+        sale = self.create_sale('F1')
+        self.client.login(username='gerant', password='testpass123')
+        first = self.download(sale)
+        self.assertTrue(first.startswith(b'%PDF'))
+        with mock.patch('apps.core.invoices.render_invoice_pdf') as render:
+            self.assertEqual(self.download(sale), first)
+        render.assert_not_called()
+
+    def test_sale_update_invalidates_invoice(self):
+        """Test qu'une modification de la vente supprime la facture en cache"""
+        sale = self.create_sale('F1')
+        old_path, _ = cached_invoice(sale.pk)
+        sale.status = sale.Status.REFUNDED
+        sale.save()
+        self.assertFalse(os.path.exists(old_path))
+        new_path, _ = cached_invoice(sale.pk)
+        self.assertNotEqual(new_path, old_path)
+        self.assertEqual(glob.glob(os.path.join(settings.MEDIA_ROOT, 'invoices', '*.pdf')), [new_path])
+
+    def test_batch_zip_and_pdf(self):
+        """Test de l'impression par lot : une entrée ZIP par vente, ou un PDF multipage"""
+        self.create_sale('F1')
+        self.create_sale('F2')
+        today = timezone.localdate().isoformat()
+        self.client.login(username='gerant', password='testpass123')
+
+        response = self.client.get(reverse('core:invoice_batch'), {'start': today, 'end': today, 'format': 'zip'})
+        self.assertEqual(response.status_code, 200)
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(sorted(archive.namelist()), ['Facture_F1.pdf', 'Facture_F2.pdf'])
+
+        # Le PDF fusionné réutilise les factures en cache du ZIP
+        with mock.patch('apps.core.invoices.render_invoice_pdf') as render:
+            response = self.client.get(reverse('core:invoice_batch'), {'start': today, 'end': today})
+            content = b''.join(response.streaming_content)
+        render.assert_not_called()
+        self.assertTrue(content.startswith(b'%PDF'))
+        self.assertEqual(len(PdfReader(io.BytesIO(content)).pages), 2)
+
+        response = self.client.get(reverse('core:invoice_batch'), {'start': today})
+        self.assertEqual(response.status_code, 400)
+
+
+class ReceiptTest(CashierTestCase):
+    """Tests pour les tickets de caisse texte, HTML et ESC/POS"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.juice = Product.objects.create(name='Jus <orange>', category=cls.cat, price='2.50', stock_quantity=5)
+
+    def post_checkout(self, receipt):
+        return self.client.post(
+            reverse('core:caisse_checkout'),
+            data=json.dumps({'items': [{'sku': self.juice.pk, 'qty': 2, 'price': '2.50'}], 'receipt': receipt}),
+            content_type='application/json'
+        ).json()
+
+    def test_text_receipt_layout(self):
+        """Test de la mise en page texte : lignes de 48 caractères au plus, montants alignés à droite"""
+        sale_id = self.post_checkout(None)['sale_id']
+        response = self.client.get(reverse('core:sale_receipt'), {'sale_id': sale_id})
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        lines = response.content.decode().splitlines()
+        self.assertTrue(all(len(line) <= 48 for line in lines))
+        self.assertIn('Jus <orange>', lines)
+        self.assertTrue(lines[lines.index('Jus <orange>') + 1].endswith('5.00'))
+        self.assertTrue(any(line.startswith('TOTAL') and line.endswith('5.00 €') for line in lines))
+
+    def test_checkout_returns_receipt_inline(self):
+        """Test du ticket joint à la réponse d'encaissement (HTML échappé, ESC/POS en base64)"""
+        html = self.post_checkout('html')['receipt']
+        self.assertEqual(html['format'], 'html')
+        self.assertIn('Jus &lt;orange&gt;', html['content'])
+
+        escpos = base64.b64decode(self.post_checkout('escpos')['receipt']['content'])
+        self.assertTrue(escpos.startswith(b'\x1b@'))
+        self.assertTrue(escpos.endswith(b'\x1dVB\x03'))
+        self.assertIn('5.00 €'.encode('cp858'), escpos)
+
+        self.assertNotIn('receipt', self.post_checkout('pdf'))
+
+
+class ProductSearchTest(AdminTestCase):
+    """Tests pour la recherche plein texte des produits (FTS5)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.grocery = Category.objects.create(name='Épicerie')
+        dairy = Category.objects.create(name='Crèmerie')
+        cls.chocolate = Product.objects.create(
+            name='Chocolat noir', category=cls.grocery, price='3.00', stock_quantity=5
+        )
+        cls.milk = Product.objects.create(
+            name='Lait entier', category=dairy, price='1.20', stock_quantity=5,
+            description='Idéal pour le chocolat chaud'
+        )
+        cls.coffee = Product.objects.create(name='Café moulu', category=cls.grocery, price='4.00', stock_quantity=5)
+
+    def search(self, text):
+        return list(search_products(Product.objects.all(), text).values_list('name', flat=True))
+
+    def test_prefix_search_ranked_by_relevance(self):
+        """Test des préfixes sans accents : le nom passe avant la description"""
+        self.assertEqual(self.search('choc'), ['Chocolat noir', 'Lait entier'])
+        self.assertEqual(self.search('cafe mou'), ['Café moulu'])
+        self.assertEqual(sorted(self.search('epicerie')), ['Café moulu', 'Chocolat noir'])
+
+    def test_typo_falls_back_to_trigrams(self):
+        """Test de la tolérance aux fautes de frappe"""
+        self.assertEqual(self.search('chocolta')[0], 'Chocolat noir')
+
+    def test_index_follows_product_and_category_changes(self):
+        """Test de la synchronisation de l'index par les signaux"""
+        self.coffee.name = 'Thé vert'
+        self.coffee.save()
+        self.assertEqual(self.search('the'), ['Thé vert'])
+        self.grocery.name = 'Boissons chaudes'
+        self.grocery.save()
+        self.assertEqual(sorted(self.search('boissons')), ['Chocolat noir', 'Thé vert'])
+        self.chocolate.delete()
+        self.assertEqual(self.search('chocolat'), ['Lait entier'])
+
+    def test_rebuild_command_and_caisse_view(self):
+        """Test de la commande de reconstruction et de la recherche en caisse"""
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM core_product_fts")
+        call_command('rebuild_product_search', stdout=io.StringIO())
+        self.client.login(username='gerant', password='testpass123')
+        response = self.client.get(reverse('core:caisse'), {'q': 'lait'})
+        self.assertEqual([p.name for p in response.context['products_page']], ['Lait entier'])
+
+
+class CaisseSearchTest(CashierTestCase):
+    """Tests pour l'autocomplétion de la caisse sur le catalogue en mémoire"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.juice = Product.objects.create(name="Jus d'orange", category=cls.cat, price='2.50', stock_quantity=3)
+        Product.objects.create(name='Jus de pomme', category=cls.cat, price='2.20', stock_quantity=4)
+        Product.objects.create(name='Café', category=cls.cat, price='4.00', stock_quantity=2)
+        Product.objects.create(name='Jus périmé', category=cls.cat, price='1.00', stock_quantity=9,
+                               status=Product.Status.INACTIVE)
+
+    def search(self, q, **params):
+        response = self.client.get(reverse('core:caisse_search'), {'q': q, **params})
+        return [r['name'] for r in response.json()['results']]
+
+    def test_prefix_search_without_queries(self):
+        """Test des préfixes (accents ignorés) ; le second appel ne fait aucune requête"""
+        self.assertEqual(self.search('ju'), ["Jus d'orange", 'Jus de pomme'])
+        self.assertEqual(self.search('cafe'), ['Café'])
+        with self.assertNumQueries(0):
+            self.assertEqual(catalog_snapshot().search('jus pom')[0]['name'], 'Jus de pomme')
+        self.assertEqual(self.search(str(self.juice.pk))[0], "Jus d'orange")
+
+    def test_snapshot_follows_sale_without_reload(self):
+        """Test que le stock suit les ventes sans recharger le catalogue (aucune requête)"""
+        self.search('ju')
+        with self.captureOnCommitCallbacks(execute=True):
+            checkout(self.cashier, [{'sku': self.juice.pk, 'qty': 1, 'price': '2.50'}])
+        with self.assertNumQueries(0):
+            self.assertEqual(catalog_snapshot().search('orange')[0]['stock'], 2)
+        response = self.client.get(reverse('core:caisse_search'), {'q': 'orange'})
+        self.assertEqual(response.json()['results'][0]['stock'], 2)
+
+    def test_sold_out_product_leaves_snapshot(self):
+        """Test qu'un produit épuisé quitte le catalogue actif (changement de version)"""
+        self.search('ju')
+        with self.captureOnCommitCallbacks(execute=True):
+            checkout(self.cashier, [{'sku': self.juice.pk, 'qty': 3, 'price': '2.50'}])
+        self.assertEqual(self.search('ju'), ['Jus de pomme'])
+
+
+class BarcodeTest(CashierTestCase):
+    """Tests pour les codes-barres produits et le scan en caisse"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.water = Product.objects.create(name='Eau', category=cls.cat, price='1.00', stock_quantity=5,
+                                           barcode='3274080005003')
+        cls.juice = Product.objects.create(name='Jus', category=cls.cat, price='2.50', stock_quantity=1)
+        cls.old = Product.objects.create(name='Soda', category=cls.cat, price='1.50', stock_quantity=0,
+                                         barcode='5449000000996', status=Product.Status.INACTIVE)
+
+    def scan(self, code):
+        return self.client.get(reverse('core:caisse_scan'), {'code': code})
+
+    def test_internal_ean13(self):
+        """Test des EAN-13 internes : préfixe 20, id et chiffre de contrôle"""
+        self.assertEqual(ean13_check_digit('400638133393'), '1')
+        self.assertEqual(assign_internal_barcodes(), 1)
+        self.juice.refresh_from_db()
+        self.assertEqual(self.juice.barcode, internal_ean13(self.juice.pk))
+        self.assertTrue(self.juice.barcode.startswith('20'))
+        self.assertEqual(len(self.juice.barcode), 13)
+
+    def test_import_rejects_conflicts(self):
+        """Test de l'import : un code déjà pris bloque tout le lot"""
+        with self.assertRaises(ValidationError):
+            import_barcodes([(self.juice.pk, '3274080005003')])
+        self.assertEqual(import_barcodes([(self.juice.pk, '3017620422003'), (self.water.pk, '1234')]), 1)
+        self.juice.refresh_from_db()
+        self.water.refresh_from_db()
+        self.assertEqual(self.juice.barcode, '3017620422003')
+        self.assertEqual(self.water.barcode, '3274080005003')
+
+    def test_import_reports_malformed_ids(self):
+        """Test de l'import : un identifiant illisible est une ligne en erreur, pas une exception"""
+        with self.assertRaises(ValidationError) as raised:
+            import_barcodes([('12a', '3017620422003'), (self.juice.pk, '3017620422003')])
+        self.assertEqual(raised.exception.messages, ["12a : identifiant de produit invalide"])
+
+    def test_internal_code_already_imported(self):
+        """Test : un code interne déjà importé sur un autre produit n'est pas réattribué"""
+        import_barcodes([(self.water.pk, internal_ean13(self.juice.pk))], overwrite=True)
+        self.assertEqual(assign_internal_barcodes(), 0)
+        self.juice.refresh_from_db()
+        self.assertIsNone(self.juice.barcode)
+
+    def test_scan_uses_in_memory_table(self):
+        """Test du scan : table en mémoire, repli sur l'index pour les produits inactifs"""
+        data = self.scan('3274080005003').json()
+        self.assertEqual(data['product']['id'], self.water.pk)
+        self.assertEqual(data['product']['price'], '1.00')
+        with self.assertNumQueries(0):
+            self.assertEqual(scan_barcode('3274080005003')['stock'], 5)
+        self.assertEqual(self.scan('5449000000996').json()['product']['status'], 'INACTIVE')
+        self.assertEqual(self.scan('0000').status_code, 404)
+
+
+class CatalogSyncTest(CashierTestCase):
+    """Tests pour la synchronisation du catalogue des terminaux (instantané et différence)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.water = Product.objects.create(name='Eau', category=cls.cat, price='1.00', stock_quantity=5)
+        cls.juice = Product.objects.create(name='Jus', category=cls.cat, price='2.50', stock_quantity=3)
+
+    def changes(self, since):
+        return self.client.get(reverse('core:caisse_catalog_changes'), {'since': since}).json()
+
+    def test_snapshot_etag(self):
+        """Test de l'instantané : ETag fort égal à la version, 304 si inchangé"""
+        response = self.client.get(reverse('core:caisse_catalog'))
+        data = json.loads(response.content)
+        self.assertEqual(response['ETag'], f'"{data["version"]}"')
+        self.assertEqual([row[1] for row in data['products']], ['Eau', 'Jus'])
+        self.assertEqual(data['categories'], [[self.cat.pk, 'Boissons']])
+        response = self.client.get(reverse('core:caisse_catalog'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_delta_after_sale_and_changes(self):
+        """Test de la différence : stock vendu, prix modifié, produit désactivé"""
+        version = self.changes(0)['version']
+        self.assertEqual(self.changes(version)['products'], [])
+
+        checkout(self.cashier, [{'sku': self.water.pk, 'qty': 2, 'price': '1.00'}])
+        delta = self.changes(version)
+        self.assertEqual(delta['products'], [[self.water.pk, 'Eau', None, '1.00', 3, self.cat.pk]])
+
+        self.juice.status = Product.Status.INACTIVE
+        self.juice.save()
+        delta = self.changes(delta['version'])
+        self.assertEqual(delta['products'], [])
+        self.assertEqual(delta['removed_products'], [self.juice.pk])
+
+    def test_full_resync_after_purge(self):
+        """Test du rechargement complet quand le journal a été purgé"""
+        version = self.changes(0)['version']
+        self.water.price = '1.10'
+        self.water.save()
+        purge_catalog_changes(timezone.timedelta(days=-1))
+        self.assertTrue(self.changes(0)['full'])
+        self.assertFalse(self.changes(version + 1).get('full', False))
+        self.assertTrue(self.changes(version + 99)['full'])
+
+    def test_negative_since_rejected(self):
+        """Test : version négative refusée (400), même journal vide"""
+        CatalogChange.objects.all().delete()
+        response = self.client.get(reverse('core:caisse_catalog_changes'), {'since': -1})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.changes(0)['products'], [])
+
+
+class CursorPaginationTest(AdminTestCase):
+    """Tests pour la pagination par curseur (keyset) des ventes et activités"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        now = timezone.now()
+        # Ventes à dates égales deux par deux : l'id départage
+        for i in range(11):
+            Sale.objects.create(
+                invoice_number=f'F{i:02d}', date=now - datetime.timedelta(minutes=i // 2),
+                cashier=cls.admin, customer_name='Client', total_amount=10
+            )
+
+    def paginator(self, **kwargs):
+        return CursorPaginator(Sale.objects.all(), 4, ('-date', '-id'), **kwargs)
+
+    def test_forward_and_backward(self):
+        """Test du parcours complet dans les deux sens, sans doublon ni oubli"""
+        expected = list(Sale.objects.order_by('-date', '-id').values_list('invoice_number', flat=True))
+        paginator = self.paginator()
+        pages = [paginator.page()]
+        while pages[-1].has_next():
+            pages.append(paginator.page(pages[-1].next_token))
+        self.assertEqual([s.invoice_number for page in pages for s in page], expected)
+        self.assertEqual([len(page) for page in pages], [4, 4, 3])
+        self.assertFalse(pages[0].has_previous())
+
+        back = paginator.page(pages[2].previous_token)
+        self.assertEqual([s.invoice_number for s in back], expected[4:8])
+        self.assertTrue(back.has_previous())
+        self.assertEqual([s.invoice_number for s in paginator.page(back.previous_token)], expected[:4])
+
+    def test_count_is_optional_and_tokens_are_checked(self):
+        """Test : une seule requête par page sans total, jeton altéré -> première page"""
+        paginator = self.paginator()
+        token = paginator.page().next_token
+        with self.assertNumQueries(1):
+            page = paginator.page(token)
+        self.assertIsNone(paginator.count)
+        self.assertEqual(self.paginator(count=True).count, 11)
+        with self.assertRaises(InvalidCursor):
+            paginator.page('not-a-token')
+        self.assertEqual(len(paginator.get_page('not-a-token')), 4)
+        self.assertTrue(page.has_previous())
+
+    def test_sale_list_uses_cursor(self):
+        """Test de la liste des ventes : jeton suivant et filtres conservés"""
+        self.client.login(username='gerant', password='testpass123')
+        response = self.client.get(reverse('accounts:sale_list'), {'status': 'PAID'})
+        page = response.context['page_obj']
+        self.assertEqual(page.paginator.count, 11)
+        self.assertContains(response, f'?cursor={page.next_token}&amp;status=PAID')
+        response = self.client.get(reverse('accounts:sale_list'), {'cursor': page.next_token})
+        self.assertEqual(len(response.context['page_obj']), 4)
+
+    def test_cursor_links_encode_filters(self):
+        """Test des liens de pagination : clés encodées, valeurs multiples conservées, ancien jeton retiré"""
+        request = RequestFactory().get('/', {'cursor': 'abc', 'status': ['PAID', 'REFUNDED'], 'a&b': 'x y'})
+        self.assertEqual(cursor_query(request), 'status=PAID&status=REFUNDED&a%26b=x+y')
+
+        self.client.login(username='gerant', password='testpass123')
+        response = self.client.get(reverse('accounts:sale_list'), {'status': 'PAID', 'a&b': 'x y'})
+        next_token = response.context['page_obj'].next_token
+        self.assertContains(response, f'?cursor={next_token}&amp;status=PAID&amp;a%26b=x+y')
+
+
+class StatCounterTest(AdminTestCase):
+    """Tests pour les compteurs des badges (StatCounter)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cat = Category.objects.create(name='Hygiène')
+        cls.soap = Product.objects.create(name='Savon', category=cat, price='2.00', stock_quantity=5)
+        cls.gel = Product.objects.create(name='Gel douche', category=cat, price='4.00', stock_quantity=1)
+
+    def counters(self, *keys):
+        return read_counters(*keys)
+
+    def assertReconciled(self):
+        self.assertEqual(reconcile_counters(), {})
+
+    def test_signals_follow_saves_and_deletes(self):
+        """Test des compteurs tenus par les signaux (création, statut, suppression)"""
+        self.assertEqual(self.counters('product', 'product:status=ACTIVE', 'product:low_stock'), {
+            'product': 2, 'product:status=ACTIVE': 2, 'product:low_stock': 1,
+        })
+        self.soap.status = Product.Status.INACTIVE
+        self.soap.stock_quantity = 2
+        self.soap.save()
+        self.assertEqual(self.counters('product:status=ACTIVE', 'product:status=INACTIVE', 'product:low_stock'), {
+            'product:status=ACTIVE': 1, 'product:status=INACTIVE': 1, 'product:low_stock': 2,
+        })
+        self.gel.delete()
+        Supplier.objects.create(name='Grossiste', email='g@test.com', status=Supplier.Status.SUSPENDED)
+        self.assertEqual(self.counters('product', 'product:low_stock', 'supplier:status=SUSPENDED'), {
+            'product': 1, 'product:low_stock': 1, 'supplier:status=SUSPENDED': 1,
+        })
+        # Une sauvegarde qui ne touche pas les champs comptés ne lit pas la ligne
+        with self.assertNumQueries(1):
+            self.admin.save(update_fields=['last_login'])
+        self.assertReconciled()
+
+    def test_bulk_paths_keep_counters_exact(self):
+        """Test des écritures en masse : encaissement (update) et synchronisation (bulk_create)"""
+        checkout(self.admin, [{'sku': self.soap.pk, 'qty': 2, 'price': '2.00'}])
+        self.assertEqual(self.counters('sale', 'product:low_stock'), {'sale': 1, 'product:low_stock': 2})
+        sync_sales(self.admin, [
+            {'key': 'k1', 'items': [{'sku': self.gel.pk, 'qty': 1, 'price': '4.00'}]},
+            {'key': 'k2', 'items': [{'sku': self.soap.pk, 'qty': 1, 'price': '2.00'}]},
+        ])
+        self.assertEqual(self.counters('sale', 'sale:status=PAID', 'product:status=OUT_OF_STOCK'), {
+            'sale': 3, 'sale:status=PAID': 3, 'product:status=OUT_OF_STOCK': 1,
+        })
+        self.assertReconciled()
+
+    def test_views_read_badges_in_one_query(self):
+        """Test des badges : compteurs sans filtre, un seul aggregate avec filtre"""
+        self.client.login(username='gerant', password='testpass123')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('core:dashboard'))
+        self.assertEqual(response.context['count_products'], 2)
+        self.assertEqual(response.context['count_alerts'], 1)
+        self.assertFalse([q for q in queries if 'COUNT(' in q['sql'] and 'core_product' in q['sql']])
+
+        response = self.client.get(reverse('accounts:product_list'))
+        self.assertEqual((response.context['total'], response.context['active']), (2, 2))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('accounts:product_list'), {'search': 'savon'})
+        self.assertEqual((response.context['total'], response.context['active']), (1, 1))
+        self.assertEqual(len([q for q in queries if 'COUNT(' in q['sql']]), 2)  # pagination + badges
+
+        create_user('caisse', is_active=False)
+        response = self.client.get(reverse('accounts:employee_list'))
+        self.assertEqual((response.context['total'], response.context['inactive']), (1, 1))
+
+    def test_reconcile_command_repairs_drift(self):
+        """Test de la commande reconcile_counters"""
+        Product.objects.filter(pk=self.soap.pk).update(stock_quantity=0)
+        StatCounter.objects.filter(key='product').update(value=40)
+        out = io.StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('product : 40 -> 2', out.getvalue())
+        self.assertEqual(self.counters('product', 'product:low_stock'), {'product': 2, 'product:low_stock': 2})
+        self.assertReconciled()
+
+
+class VersionedCacheTest(AdminTestCase):
+    """Tests pour le cache versionné par génération de modèle"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.cat = Category.objects.create(name='Hygiène')
+
+    def test_cached_value_lasts_until_a_write(self):
+        """Test : valeur servie depuis le cache, recalculée après écriture sur un modèle suivi"""
+        calls = []
+
+        def build():
+            calls.append(1)
+            return Category.objects.count()
+
+        self.assertEqual(cached('nb', [Category], build), 1)
+        self.assertEqual(cached('nb', [Category], build), 1)
+        Supplier.objects.create(name='Grossiste', email='g@test.com')
+        self.assertEqual(cached('nb', [Category], build), 1)
+        self.assertEqual(len(calls), 1)
+        Category.objects.create(name='Épicerie')
+        self.assertEqual(cached('nb', [Category], build), 2)
+        self.assertEqual(len(calls), 2)
+
+        with self.assertNumQueries(1):
+            cached_queryset('categories', Category.objects.order_by('name'))
+        with self.assertNumQueries(0):
+            names = [c.name for c in cached_queryset('categories', Category.objects.order_by('name'))]
+        self.assertEqual(names, ['Hygiène', 'Épicerie'])
+
+    def test_login_does_not_invalidate_users(self):
+        """Test : la mise à jour de last_login ne change pas la génération des employés"""
+        before = generations(User)
+        self.client.login(username='gerant', password='testpass123')
+        self.assertEqual(generations(User), before)
+        self.admin.first_name = 'Awa'
+        self.admin.save()
+        self.assertNotEqual(generations(User), before)
+
+    def test_fragment_and_view_helpers(self):
+        """Test de la balise {% versioned_cache %} et du décorateur de vue"""
+        tpl = Template(
+            "{% load versioned_cache %}{% versioned_cache 'cats' 'core.category' on sel %}"
+            "{% for c in cats %}{{ c.name }}{% endfor %}{% endversioned_cache %}"
+        )
+        self.assertEqual(tpl.render(Context({'cats': Category.objects.all(), 'sel': 1})), 'Hygiène')
+        self.assertEqual(tpl.render(Context({'cats': [], 'sel': 1})), 'Hygiène')
+        self.assertEqual(tpl.render(Context({'cats': [], 'sel': 2})), '')
+        Category.objects.create(name='Épicerie')
+        self.assertEqual(tpl.render(Context({'cats': [], 'sel': 1})), '')
+
+        sale = Sale.objects.create(
+            invoice_number='F001', cashier=self.admin, customer_name='Client', total_amount=10
+        )
+        self.client.login(username='gerant', password='testpass123')
+        url = reverse('accounts:sale_detail_json', args=[sale.pk])
+        self.assertEqual(self.client.get(url).json()['total_amount'], '10.00')
+        with self.assertNumQueries(2):  # session et utilisateur seulement
+            self.client.get(url)
+        sale.total_amount = 12
+        sale.save()
+        self.assertEqual(self.client.get(url).json()['total_amount'], '12.00')
+
+
+class QueryPlanTest(AdminTestCase):
+    """
+    Plans d'exécution (EXPLAIN QUERY PLAN) des requêtes des vues principales :
+    aucun parcours complet de core_sale, core_saleitem ou accounts_activitylog.
+    Seul le parcours d'un index dans l'ordre par la requête principale, avec
+    ORDER BY et LIMIT et sans aucune condition (première page d'une liste
+    paginée par curseur), est borné et reste autorisé. Avec un filtre, le
+    parcours continuerait jusqu'à remplir la page : il faut un SEARCH.
+    """
+
+    WATCHED = r'(core_sale|core_saleitem|accounts_activitylog)'
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.cat = Category.objects.create(name='Boissons')
+        cls.products = [
+            Product.objects.create(name=f'Jus {i}', category=cls.cat, price='2.00', stock_quantity=500)
+            for i in range(5)
+        ]
+        for i in range(30):
+            cls.sale = checkout(cls.admin, [{'sku': cls.products[i % 5].pk, 'qty': 1, 'price': '2.00'}])
+            ActivityLog.objects.create(user=cls.admin, verb=f'Vente {i}')
+        Sale.objects.filter(pk=cls.sale.pk).update(date=timezone.now() - datetime.timedelta(days=2))
+
+    def setUp(self):
+        super().setUp()
+        if connection.vendor != 'sqlite':
+            self.skipTest("EXPLAIN QUERY PLAN : SQLite uniquement")
+        self.client.force_login(self.admin)
+
+    def urls(self):
+        sale, product = self.sale.pk, self.products[0].pk
+        return [
+            reverse('core:dashboard'),
+            reverse('core:caisse'),
+            reverse('core:caisse') + f'?category={self.cat.pk}&q=jus',
+            reverse('core:reports'),
+            reverse('core:reports') + '?start=2020-01-01&end=2099-12-31',
+            reverse('core:reports') + f'?category={self.cat.pk}',
+            reverse('core:caisse_search') + '?q=jus',
+            reverse('core:caisse_catalog_changes') + '?since=1',
+            reverse('core:sale_info') + f'?sale_id={sale}',
+            reverse('core:sale_receipt') + f'?sale_id={sale}',
+            reverse('accounts:sale_list'),
+            reverse('accounts:sale_list') + '?status=REFUNDED',
+            reverse('accounts:sale_list') + f'?cashier={self.admin.pk}',
+            reverse('accounts:sale_list') + '?product_name=jus 3',
+            reverse('accounts:sale_list') + '?date_from=2020-01-01&date_to=2099-12-31',
+            reverse('accounts:sale_detail', args=[sale]),
+            reverse('accounts:sale_update', args=[sale]),
+            reverse('accounts:sale_detail_json', args=[sale]),
+            reverse('accounts:activity_list'),
+            reverse('accounts:product_list'),
+            reverse('accounts:product_detail', args=[product]),
+            reverse('accounts:employee_list'),
+            reverse('accounts:category_detail', args=[self.cat.pk]),
+        ]
+
+    def captured(self, url):
+        """Requêtes (sql, paramètres) exécutées pour afficher la page"""
+        queries = []
+
+        def capture(execute, sql, params, many, context):
+            queries.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(capture):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return [(sql, params) for sql, params in queries if sql.lstrip().upper().startswith('SELECT')]
+
+    def full_scans(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = [row[-1] for row in cursor.fetchall()]
+        # Les sous-requêtes désignent les tables par alias (U0, T3...)
+        aliases = dict((alias, table) for table, alias in re.findall(r'"(\w+)" ([A-Z]\d+)\b', sql))
+        # Requête principale sans les sous-requêtes ni les parenthèses
+        top = sql
+        while True:
+            stripped = re.sub(r'\([^()]*\)', ' ', top)
+            if stripped == top:
+                break
+            top = stripped
+        ordered_page = (
+            re.search(r'\bORDER BY\b.*\bLIMIT\b', top) is not None
+            and re.search(r'\b(WHERE|HAVING)\b', top) is None
+        )
+        scans = []
+        for line in plan:
+            match = re.match(r'SCAN (\w+)', line)
+            if not match or not re.fullmatch(self.WATCHED, aliases.get(match.group(1), match.group(1))):
+                continue
+            # Alias (U0, T3...) : table d'une sous-requête, jamais exemptée
+            if not (ordered_page and match.group(1) not in aliases and 'USING' in line and 'INDEX' in line):
+                scans.append(line)
+        return scans
+
+    def test_no_full_scan_on_hot_tables(self):
+        """Test : chaque requête des vues principales passe par un index"""
+        for url in self.urls():
+            for sql, params in self.captured(url):
+                with self.subTest(url=url, sql=sql[:120]):
+                    self.assertEqual(self.full_scans(sql, params), [])
+
+    def test_detector_flags_a_full_scan(self):
+        """Test du contrôle lui-même : un filtre non indexé est bien signalé"""
+        sql, params = Sale.objects.filter(customer_name='Client').query.sql_with_params()
+        self.assertTrue(self.full_scans(sql, params))
+        # Table désignée par un alias dans une sous-requête
+        subquery = Sale.objects.filter(pk__in=SaleItem.objects.filter(quantity=2).values('sale_id'))
+        sql, params = subquery.query.sql_with_params()
+        self.assertTrue(self.full_scans(sql, params))
+        # Parcours ordonné d'un index avec LIMIT : borné sans filtre, signalé avec un filtre résiduel
+        page = Sale.objects.order_by('-date', '-id')
+        sql, params = page[:20].query.sql_with_params()
+        self.assertEqual(self.full_scans(sql, params), [])
+        sql, params = page.filter(customer_name='Client')[:20].query.sql_with_params()
+        self.assertTrue(self.full_scans(sql, params))
+
+
+class QueryBudgetTest(StoreTestCase):
+    """
+    Budget de requêtes SQL de chaque URL de apps.core et apps.accounts, sur
+    un jeu de données réaliste (plusieurs caissiers, catégories, produits et
+    dizaines de ventes). Un budget dépassé, ou une même forme de SELECT
+    répétée (RepeatedQueryMiddleware en mode strict), signale un N+1.
+    Les budgets ne dépendent pas du volume : doubler les ventes ne doit
+    rien changer.
+    """
+
+    BUDGETS = {
+        # apps.core
+        'core:dashboard': 5,
+        'core:caisse': 4,
+        'core:caisse_checkout': 26,
+        'core:caisse_search': 3,
+        'core:caisse_scan': 2,
+        'core:caisse_catalog': 6,
+        'core:caisse_catalog_changes': 6,
+        'core:caisse_sync': 26,
+        'core:sale_info': 6,
+        'core:generate_invoice': 5,
+        'core:sale_receipt': 4,
+        'core:invoice_batch': 6,
+        'core:home': 2,
+        'core:reports': 13,
+        # apps.accounts
+        'accounts:login': 2,
+        'accounts:register': 0,
+        'accounts:logout': 5,
+        'accounts:password_reset': 0,
+        'accounts:password_reset_done': 0,
+        'accounts:password_reset_confirm': 5,
+        'accounts:password_reset_complete': 0,
+        'accounts:employee_list': 5,
+        'accounts:employee_add': 2,
+        'accounts:employee_detail': 3,
+        'accounts:employee_edit': 3,
+        'accounts:employee_delete': 3,
+        'accounts:supplier_list': 5,
+        'accounts:supplier_add': 2,
+        'accounts:supplier_detail': 3,
+        'accounts:supplier_edit': 3,
+        'accounts:supplier_delete': 3,
+        'accounts:category_list': 5,
+        'accounts:category_add': 2,
+        'accounts:category_detail': 3,
+        'accounts:category_edit': 3,
+        'accounts:category_delete': 3,
+        'accounts:product_list': 6,
+        'accounts:product_add': 3,
+        'accounts:product_detail': 4,
+        'accounts:product_edit': 4,
+        'accounts:product_delete': 3,
+        'accounts:sale_list': 4,
+        'accounts:sale_bulk_delete': 20,
+        'accounts:sale_create': 0,
+        'accounts:sale_detail': 6,
+        'accounts:sale_update': 3,
+        'accounts:sale_delete': 18,
+        'accounts:sale_detail_json': 5,
+        'accounts:product_autocomplete': 4,
+        'accounts:activity_list': 3,
+        'accounts:export_pdf': 1,
+        'accounts:export_excel': 1,
+        'accounts:export_word': 1,
+        'accounts:export_csv': 1,
+        'accounts:export_employees_pdf': 1,
+        'accounts:export_employees_excel': 1,
+        'accounts:export_employees_word': 1,
+        'accounts:export_employees_csv': 1,
+        'accounts:export_products_pdf': 1,
+        'accounts:export_products_excel': 1,
+        'accounts:export_products_word': 1,
+        'accounts:export_products_csv': 1,
+        'accounts:export_suppliers_pdf': 1,
+        'accounts:export_suppliers_excel': 1,
+        'accounts:export_suppliers_word': 1,
+        'accounts:export_suppliers_csv': 1,
+        'accounts:export_categories_pdf': 1,
+        'accounts:export_categories_excel': 1,
+        'accounts:export_categories_word': 1,
+        'accounts:export_categories_csv': 1,
+        'accounts:export_sales_report_pdf': 1,
+        'accounts:export_sales_report_excel': 0,
+        'accounts:export_sales_report_docx': 0,
+        'accounts:export_sales_report_csv': 0,
+        'accounts:export_stock_report_pdf': 1,
+        'accounts:export_stock_report_excel': 1,
+        'accounts:export_stock_report_csv': 1,
+        'accounts:export_stock_report_docx': 1,
+        'accounts:export_job_start': 3,
+        'accounts:export_job_status': 3,
+        'accounts:export_job_download': 3,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.admin = create_user('gerant', User.Role.ADMIN, first_name='Gérard', last_name='Gérant')
+        cls.cashiers = [
+            create_user(f'caissier{i}', first_name=f'Prénom{i}', last_name=f'Nom{i}')
+            for i in range(4)
+        ]
+        cls.categories = [Category.objects.create(name=name) for name in ('Boissons', 'Épicerie', 'Hygiène')]
+        cls.products = [
+            Product.objects.create(
+                name=f'Produit {i}', category=cls.categories[i % 3], price=f'{i + 1}.50',
+                stock_quantity=500 if i < 20 else 2, barcode=f'CODE-{i:04d}'
+            )
+            for i in range(24)
+        ]
+        cls.suppliers = [
+            Supplier.objects.create(
+                name=f'Grossiste {i}', contact_person=f'Contact {i}', email=f'g{i}@test.com',
+                phone='+33123456789', address='1 rue du Port', city='Lyon', postal_code='69000'
+            )
+            for i in range(6)
+        ]
+        cls.sales = []
+        for i in range(40):
+            cashier = cls.cashiers[i % 4]
+            lines = [
+                {'sku': cls.products[(i + n) % 20].pk, 'qty': n + 1, 'price': cls.products[(i + n) % 20].price}
+                for n in range(1 + i % 3)
+            ]
+            cls.sales.append(checkout(cashier, lines))
+            ActivityLog.objects.create(user=cashier, verb=f'Vente {i}', level='primary', icon='shopping-cart')
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        for override in (
+            override_settings(MEDIA_ROOT=media.name, REPEATED_QUERY_RAISE=True),
+            modify_settings(MIDDLEWARE={'append': 'apps.core.middleware.RepeatedQueryMiddleware'}),
+        ):
+            override.enable()
+            self.addCleanup(override.disable)
+        self.job = ExportJob.objects.create(
+            user=self.admin, kind='sales', format='csv', status=ExportJob.Status.DONE, filename='ventes.csv'
+        )
+        self.job.file.save('ventes.csv', ContentFile(b'facture;montant\n'))
+        self.client.force_login(self.admin)
+
+    def url_names(self):
+        return {
+            f'{module.app_name}:{pattern.name}'
+            for module in (core_urls, accounts_urls)
+            for pattern in module.urlpatterns
+        }
+
+    def cases(self):
+        """{nom d'URL: (méthode, url, paramètres du client de test)}"""
+        sale, product, category = self.sales[0], self.products[0], self.categories[0]
+        supplier, employee = self.suppliers[0], self.cashiers[0]
+        period = {'start': '2000-01-01', 'end': '2099-12-31'}
+        cart = [{'sku': product.pk, 'qty': 1, 'price': str(product.price)}]
+        pk_routes = {
+            'accounts:employee_detail': employee, 'accounts:employee_edit': employee,
+            'accounts:employee_delete': employee,
+            'accounts:supplier_detail': supplier, 'accounts:supplier_edit': supplier,
+            'accounts:supplier_delete': supplier,
+            'accounts:category_detail': category, 'accounts:category_edit': category,
+            'accounts:category_delete': category,
+            'accounts:product_detail': product, 'accounts:product_edit': product,
+            'accounts:product_delete': product,
+            'accounts:sale_detail': sale, 'accounts:sale_update': sale,
+            'accounts:sale_detail_json': sale,
+            'accounts:export_job_status': self.job, 'accounts:export_job_download': self.job,
+        }
+        cases = {name: ('get', reverse(name, args=[obj.pk]), {}) for name, obj in pk_routes.items()}
+        cases.update({
+            'core:caisse_checkout': ('post', reverse('core:caisse_checkout'), {
+                'data': json.dumps({'items': cart, 'receipt': 'text'}), 'content_type': 'application/json',
+            }),
+            'core:caisse_sync': ('post', reverse('core:caisse_sync'), {
+                'data': json.dumps({'sales': [{'key': f'hors-ligne-{i}', 'items': cart} for i in range(10)]}),
+                'content_type': 'application/json',
+            }),
+            'core:caisse_search': ('get', reverse('core:caisse_search'), {'data': {'q': 'produit'}}),
+            'core:caisse_scan': ('get', reverse('core:caisse_scan'), {'data': {'code': product.barcode}}),
+            'core:caisse_catalog_changes': ('get', reverse('core:caisse_catalog_changes'), {'data': {'since': 1}}),
+            'core:sale_info': ('get', reverse('core:sale_info'), {'data': {'sale_id': sale.pk}}),
+            'core:generate_invoice': ('get', reverse('core:generate_invoice'), {'data': {'sale_id': sale.pk}}),
+            'core:sale_receipt': ('get', reverse('core:sale_receipt'), {'data': {'sale_id': sale.pk}}),
+            'core:invoice_batch': ('get', reverse('core:invoice_batch'), {'data': {**period, 'format': 'zip'}}),
+            'core:reports': ('get', reverse('core:reports'), {'data': period}),
+            'accounts:password_reset_confirm': ('get', reverse('accounts:password_reset_confirm', args=[
+                urlsafe_base64_encode(force_bytes(employee.pk)), default_token_generator.make_token(employee),
+            ]), {}),
+            'accounts:product_autocomplete': ('get', reverse('accounts:product_autocomplete'), {'data': {'q': 'produit'}}),
+            'accounts:sale_bulk_delete': ('post', reverse('accounts:sale_bulk_delete'), {
+                'data': {'sale_ids': [s.pk for s in self.sales[-10:]]},
+            }),
+            'accounts:export_job_start': ('post', reverse('accounts:export_job_start', args=['sales', 'csv']), {}),
+            # Pas de page de confirmation : suppression depuis la liste
+            'accounts:sale_delete': ('post', reverse('accounts:sale_delete', args=[self.sales[-11].pk]), {}),
+        })
+        # Les autres : GET sans paramètre
+        for name in self.BUDGETS:
+            if name not in cases:
+                cases[name] = ('get', reverse(name), {})
+        return cases
+
+    def measure(self, method, url, kwargs):
+        """Nombre de requêtes de la page, contenu diffusé compris"""
+        queries = []
+
+        def count(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            response = getattr(self.client, method)(url, **kwargs)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            response.close()
+        self.assertLess(response.status_code, 400, url)
+        return len(queries)
+
+    def test_every_url_has_a_budget(self):
+        """Test : toute nouvelle URL doit recevoir un budget"""
+        self.assertEqual(self.url_names(), set(self.BUDGETS))
+
+    def test_query_budgets(self):
+        """Test : chaque URL reste dans son budget, sans forme de requête répétée"""
+        # La déconnexion et la suppression en masse en dernier
+        cases = self.cases()
+        for name in ('accounts:sale_delete', 'accounts:sale_bulk_delete', 'accounts:logout'):
+            cases[name] = cases.pop(name)
+        for name, (method, url, kwargs) in cases.items():
+            with self.subTest(url=name):
+                self.assertLessEqual(self.measure(method, url, kwargs), self.BUDGETS[name])
+
+    def test_repeated_query_detector(self):
+        """Test du détecteur : {{ sale.items.count }} par ligne est refusé, avec sa ligne de gabarit"""
+        template = Template("{% for sale in sales %}\n{{ sale.items.count }}\n{% endfor %}")
+
+        def view(request):
+            return HttpResponse(template.render(Context({'sales': Sale.objects.all()[:6]})))
+
+        with self.assertLogs('apps.core.middleware', 'WARNING'), self.assertRaises(RepeatedQueryError) as raised:
+            RepeatedQueryMiddleware(view)(RequestFactory().get('/ventes/'))
+        self.assertIn('6 × SELECT COUNT(*)', str(raised.exception))
+        self.assertIn(":2 'sale.items.count'", str(raised.exception))
+
+        # Avec l'annotation de la liste des ventes : une seule requête
+        template = Template("{% for sale in sales %}{{ sale.item_count }}{% endfor %}")
+        sales = SaleListView.queryset[:6]
+        response = RepeatedQueryMiddleware(
+            lambda request: HttpResponse(template.render(Context({'sales': sales})))
+        )(RequestFactory().get('/ventes/'))
+        self.assertEqual(response.status_code, 200)
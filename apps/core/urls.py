@@ -13,8 +13,15 @@ urlpatterns = [
     # Interface caisse
     path('caisse/', login_required(views.CaisseView.as_view()), name='caisse'),
     path('caisse/checkout/', login_required(views.caisse_checkout), name='caisse_checkout'),
+    path('caisse/search/', login_required(views.caisse_search), name='caisse_search'),
+    path('caisse/scan/', login_required(views.caisse_scan), name='caisse_scan'),
+    path('caisse/catalog/', login_required(views.caisse_catalog), name='caisse_catalog'),
+    path('caisse/catalog/changes/', login_required(views.caisse_catalog_changes), name='caisse_catalog_changes'),
+    path('caisse/sync/', login_required(views.caisse_sync), name='caisse_sync'),
     path('caisse/sale-info/', login_required(views.sale_info), name='sale_info'),
     path('caisse/generate-invoice/', login_required(views.generate_invoice), name='generate_invoice'),
+    path('caisse/receipt/', login_required(views.sale_receipt), name='sale_receipt'),
+    path('caisse/invoices/batch/', login_required(views.invoice_batch_view), name='invoice_batch'),
 
     # Page d'accueil (redirection intelligente)
     path('home/', views.HomeRedirectView.as_view(), name='home'),
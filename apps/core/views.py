@@ -1,6 +1,5 @@
 # apps/core/views.py
 
-import io
 import json
 from datetime import date
 from django.shortcuts import redirect, get_object_or_404, render
@@ -8,41 +7,40 @@ from django.views.generic import (
     TemplateView, View, ListView, CreateView, UpdateView, DeleteView, DetailView
 )
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.csrf import csrf_exempt, ensure_csrf_cookie
+from django.views.decorators.http import condition
 from django.utils.decorators import method_decorator
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.paginator import Paginator
 from django.db import transaction
-from django.http import JsonResponse, FileResponse, Http404
+from django.http import (
+    HttpResponse, JsonResponse, FileResponse, Http404, HttpResponseBadRequest, HttpResponseForbidden,
+)
 from django.urls import reverse_lazy
+from django.conf import settings
 from django.contrib import messages
 from django.db.models import Q, Sum, F
 from django.utils import timezone
-from reportlab.pdfgen import canvas
+from django.utils.dateparse import parse_date
 
-from .models import Supplier, Category, Product, Sale, SaleItem
+from .caching import cached, cached_queryset
+from .catalog import (
+    catalog_snapshot, catalog_sync_delta, catalog_sync_snapshot, scan_barcode, sync_version,
+)
+from .counters import LOW_STOCK_KEY, read_counters, status_badges
+from .invoices import cached_invoice, invoice_batch, invoice_filename
+from .models import Supplier, Category, DailySalesSummary, Product, Sale, SaleItem
+from .pagination import CursorPaginator, cursor_query
+from .receipts import RECEIPT_FORMATS, receipt_invoice, receipt_json, render_receipt
+from .search import search_products
+from .services import (
+    CheckoutError, checkout, daily_sales_series, find_replayed_sale,
+    generate_invoice_number, sync_sales,
+    sales_facts, facts_totals, top_products, revenue_by_cashier,
+    revenue_by_category, hourly_heatmap, REPORT_GRANULARITIES,
+)
 from apps.accounts.forms import ProductCreateForm
-from apps.accounts.models import ActivityLog
-
-
-def generate_invoice_number():
-    """
-    Génère un numéro de facture unique au format FYYYYMMDDNNNN.
-    Chaque jour, la séquence redémarre à 0001.
-    """
-    today_str = timezone.now().date().strftime('%Y%m%d')
-    prefix = f"F{today_str}"
-    with transaction.atomic():
-        last = Sale.objects.filter(invoice_number__startswith=prefix).order_by('-invoice_number').first()
-        if last:
-            try:
-                last_seq = int(last.invoice_number[-4:])
-            except (ValueError, IndexError):
-                last_seq = 0
-            seq = last_seq + 1
-        else:
-            seq = 1
-        return f"{prefix}{seq:04d}"
+from apps.accounts.models import ActivityLog, User
 
 
 class DashboardView(LoginRequiredMixin, TemplateView):
@@ -51,44 +49,30 @@ class DashboardView(LoginRequiredMixin, TemplateView):
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         
-        # 1. Ventes du jour
-        today = timezone.now().date()
-        ctx['sales_today'] = (
-            Sale.objects.filter(date__date=today)
-            .aggregate(total=Sum('total_amount'))['total'] or 0
+        # 1. Ventes du jour (série des 7 derniers jours lue dans la synthèse journalière)
+        today = timezone.localdate()
+        series = cached('dashboard-sales', [Sale], lambda: daily_sales_series(today), today)
+        ctx['sales_today'] = series[-1][1]
+
+        # 2-4. Produits, ventes et alertes de stock : compteurs lus en une requête
+        counters = cached(
+            'dashboard-counters', [Product, Sale],
+            lambda: read_counters('product', 'sale', LOW_STOCK_KEY),
         )
-
-        # 2. Produits totaux
-        ctx['count_products'] = Product.objects.count()
-
-        # 3. Commandes (utilise le nombre total de ventes)
-        ctx['count_orders'] = Sale.objects.count()
-
-        # 4. Alertes stock (produits en rupture de stock)
-        ctx['count_alerts'] = Product.objects.filter(
-            stock_quantity__lte=3
-        ).count()
+        ctx['count_products'] = counters['product']
+        ctx['count_orders'] = counters['sale']
+        ctx['count_alerts'] = counters[LOW_STOCK_KEY]
 
         # Préparation des données pour le graphique des ventes (7 derniers jours)
-        dates = []
-        values = []
-        for i in range(6, -1, -1):
-            day = today - timezone.timedelta(days=i)
-            dates.append(day.strftime('%d/%m'))
-            total = (
-                Sale.objects.filter(date__date=day)
-                .aggregate(sum_amount=Sum('total_amount'))['sum_amount'] or 0
-            )
-            values.append(float(total))
-        ctx['sales_dates'] = json.dumps(dates)
-        ctx['sales_values'] = json.dumps(values)
+        ctx['sales_dates'] = json.dumps([day.strftime('%d/%m') for day, _ in series])
+        ctx['sales_values'] = json.dumps([float(total) for _, total in series])
 
         # Date et heure actuelles
         ctx['current_datetime'] = timezone.now()
 
         ctx['recent_activities'] = ActivityLog.objects.filter(
             user=self.request.user
-        ).order_by('-timestamp')[:5]
+        ).order_by('-timestamp', '-id')[:5]
 
         return ctx
 
@@ -105,6 +89,8 @@ class HomeRedirectView(View):
         return redirect('core:dashboard')
 
 
+# Cookie CSRF garanti : caisse.js le renvoie dans X-CSRFToken (synchronisation hors ligne)
+@method_decorator(ensure_csrf_cookie, name='dispatch')
 class CaisseView(LoginRequiredMixin, TemplateView):
     template_name = 'core/caisse.html'
 
@@ -117,19 +103,19 @@ class CaisseView(LoginRequiredMixin, TemplateView):
         category_id = self.request.GET.get('category', '')
 
         produits = Product.objects.filter(status=Product.Status.ACTIVE)
-        if q:
-            produits = produits.filter(name__icontains=q)
         if category_id:
             try:
                 produits = produits.filter(category_id=int(category_id))
             except (ValueError, TypeError):
                 pass
+        # Recherche classée par pertinence, sinon ordre alphabétique
+        produits = search_products(produits, q) if q else produits.order_by('name')
 
-        paginator = Paginator(produits.order_by('name'), 6)
+        paginator = Paginator(produits, 6)
         ctx['products_page'] = paginator.get_page(self.request.GET.get('page'))
         ctx['search_query'] = q
         ctx['selected_category'] = category_id
-        ctx['categories'] = Category.objects.all().order_by('name')
+        ctx['categories'] = cached_queryset('categories', Category.objects.order_by('name'))
         return ctx
 
 
@@ -156,15 +142,16 @@ class SupplierListView(LoginRequiredMixin, ListView):
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
+        badges = status_badges(Supplier)
         ctx.update({
             'page_title': 'Gestion des Fournisseurs',
             'search_query': self.request.GET.get('search', ''),
             'status_filter': self.request.GET.get('status', ''),
             'status_choices': Supplier.Status.choices,
-            'total_suppliers': Supplier.objects.count(),
-            'active_suppliers': Supplier.objects.filter(status=Supplier.Status.ACTIVE).count(),
-            'inactive_suppliers': Supplier.objects.filter(status=Supplier.Status.INACTIVE).count(),
-            'suspended_suppliers': Supplier.objects.filter(status=Supplier.Status.SUSPENDED).count(),
+            'total_suppliers': badges['total'],
+            'active_suppliers': badges[Supplier.Status.ACTIVE],
+            'inactive_suppliers': badges[Supplier.Status.INACTIVE],
+            'suspended_suppliers': badges[Supplier.Status.SUSPENDED],
         })
         return ctx
 
@@ -253,50 +240,36 @@ def caisse_checkout(request):
     if request.method != 'POST':
         return JsonResponse({'success': False, 'error': 'Méthode non autorisée'}, status=405)
 
-    data = json.loads(request.body)
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Requête invalide'}, status=400)
     items = data.get('items', [])
     payment_mode = data.get('payment_mode')
     cash_received = data.get('cash_received', 0)
 
-    # Vérification du stock avant création de la vente
-    for it in items:
-        prod = get_object_or_404(Product, pk=it['sku'])
-        qty = int(it['qty'])
-        if prod.stock_quantity < qty:
-            return JsonResponse({
-                'success': False, 
-                'error': f"Stock insuffisant pour {prod.name}. Stock disponible: {prod.stock_quantity}"
-            })
-
-    # Utilisation du générateur de numéro unique
-    invoice = generate_invoice_number()
-    
-    sale = Sale.objects.create(
-        invoice_number=invoice,
-        cashier=request.user,
-        customer_name="Client",
-        status=Sale.Status.PAID,
-        total_amount=0
-    )
+    # Rejeu d'une requête déjà encaissée (Wi-Fi instable, double clic...)
+    key = (request.headers.get('Idempotency-Key') or data.get('idempotency_key') or '')[:64]
+    replayed = find_replayed_sale(key)
+    if replayed:
+        sale_id, invoice = replayed
+        return JsonResponse({
+            'success': True,
+            'sale_id': sale_id,
+            'message': f"Vente {invoice} enregistrée avec succès !",
+            'toast_type': 'success',
+            'replayed': True,
+        })
 
-    total = 0
-    for it in items:
-        prod = get_object_or_404(Product, pk=it['sku'])
-        qty = int(it['qty'])
-        up = float(it['price'])
-        line = SaleItem.objects.create(
-            sale=sale,
-            product=prod,
-            quantity=qty,
-            unit_price=up
-        )
-        total += line.line_total
-        # Mise à jour du stock
-        prod.decrease_stock(qty)
+    try:
+        sale = checkout(request.user, items, idempotency_key=key or None)
+    except CheckoutError as exc:
+        return JsonResponse({
+            'success': False,
+            'error': exc.message,
+            'lines': exc.lines,
+        })
 
-    sale.total_amount = total
-    sale.save()
-    
     ActivityLog.objects.create(
         user=request.user,
         verb='Nouvelle vente',
@@ -304,15 +277,53 @@ def caisse_checkout(request):
         icon='shopping-cart'
     )
 
-    return JsonResponse({
+    response = {
         'success': True, 
         'sale_id': sale.pk,
-        'message': f"Vente {invoice} enregistrée avec succès !",
+        'message': f"Vente {sale.invoice_number} enregistrée avec succès !",
         'toast_type': 'success'
-    })
+    }
+    # Ticket de caisse joint à la réponse : évite un second aller-retour
+    receipt_format = data.get('receipt')
+    if receipt_format in RECEIPT_FORMATS:
+        response['receipt'] = receipt_json(receipt_invoice(sale.pk), receipt_format)
+    return JsonResponse(response)
 
 
 
+@login_required
+def caisse_sync(request):
+    """Synchronise en un lot les ventes enregistrées hors ligne par une caisse"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Méthode non autorisée'}, status=405)
+
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Requête invalide'}, status=400)
+    queued = data.get('sales', []) if isinstance(data, dict) else []
+    if not isinstance(queued, list):
+        return JsonResponse({'success': False, 'error': 'Requête invalide'}, status=400)
+    max_sales = getattr(settings, 'CAISSE_SYNC_MAX_SALES', 500)
+    if len(queued) > max_sales:
+        return JsonResponse({
+            'success': False,
+            'error': f"Lot trop volumineux ({max_sales} ventes maximum)"
+        }, status=413)
+
+    results = sync_sales(request.user, queued)
+    created = sum(1 for r in results if r['success'] and not r.get('replayed'))
+    if created:
+        ActivityLog.objects.create(
+            user=request.user,
+            verb=f"{created} vente(s) synchronisée(s)",
+            level='primary',
+            icon='sync'
+        )
+
+    return JsonResponse({'success': True, 'results': results})
+
+
 @login_required
 def sale_info(request):
     sale_id = request.GET.get('sale_id')
@@ -343,47 +354,93 @@ def generate_invoice(request):
     sale_id = request.GET.get('sale_id')
     if not sale_id:
         raise Http404("Aucune vente spécifiée")
-    sale = get_object_or_404(Sale, pk=sale_id)
-
-    buffer = io.BytesIO()
-    p = canvas.Canvas(buffer)
-
-    p.setFont("Helvetica-Bold", 16)
-    p.drawString(100, 800, f"Facture {sale.invoice_number}")
-
-    p.setFont("Helvetica", 12)
-    y = 760
-    p.drawString(100, y, f"Date : {sale.date.strftime('%d/%m/%Y %H:%M')}")
-    y -= 20
-    p.drawString(100, y, f"Caissier : {sale.cashier.get_full_name()}")
-    y -= 20
-    p.drawString(100, y, f"Client : {sale.customer_name}")
-    y -= 40
-
-    p.drawString(100, y, "Produit")
-    p.drawString(300, y, "Qté")
-    p.drawString(350, y, "PU (€)")
-    p.drawString(430, y, "Total (€)")
-    y -= 20
-
-    for item in sale.items.all():
-        if y < 100:
-            p.showPage()
-            y = 800
-        p.drawString(100, y, item.product.name)
-        p.drawString(300, y, str(item.quantity))
-        p.drawString(350, y, f"{item.unit_price:.2f}")
-        p.drawString(430, y, f"{item.line_total:.2f}")
-        y -= 20
-
-    y -= 20
-    p.setFont("Helvetica-Bold", 12)
-    p.drawString(100, y, f"Montant total : {sale.total_amount:.2f} €")
-
-    p.showPage()
-    p.save()
-    buffer.seek(0)
-    return FileResponse(buffer, as_attachment=True, filename=f"Facture_{sale.invoice_number}.pdf")
+    try:
+        path, invoice_number = cached_invoice(int(sale_id))
+    except (ValueError, Sale.DoesNotExist):
+        raise Http404("Vente introuvable")
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=invoice_filename(invoice_number))
+
+
+def caisse_search(request):
+    """Autocomplétion de la caisse (?q=, category=, limit=) sur le catalogue en mémoire."""
+    try:
+        limit = min(int(request.GET.get('limit', 10)), 50)
+        category = int(request.GET['category']) if request.GET.get('category') else None
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Paramètres invalides'}, status=400)
+    snapshot = catalog_snapshot()
+    return JsonResponse({
+        'version': snapshot.version,
+        'results': snapshot.search(request.GET.get('q', ''), limit=limit, category=category),
+    })
+
+
+def _catalog_etag(request):
+    # Version lue une fois : reprise par la vue si la réponse n'est pas un 304
+    request.catalog_version = sync_version()
+    return str(request.catalog_version)
+
+
+@condition(etag_func=_catalog_etag)
+def caisse_catalog(request):
+    """Catalogue complet pour les terminaux ; ETag fort = version du catalogue."""
+    return HttpResponse(catalog_sync_snapshot(request.catalog_version), content_type='application/json')
+
+
+def caisse_catalog_changes(request):
+    """Modifications du catalogue depuis ?since=<version> ; {"full": true} s'il faut tout recharger."""
+    try:
+        since = int(request.GET.get('since', ''))
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Paramètre since invalide'}, status=400)
+    if since < 0:
+        return JsonResponse({'success': False, 'error': 'Paramètre since invalide'}, status=400)
+    version, delta = catalog_sync_delta(since)
+    if delta is None:
+        return JsonResponse({'full': True, 'version': version})
+    return HttpResponse(delta, content_type='application/json')
+
+
+def caisse_scan(request):
+    """Scan en caisse : code-barres (?code=) -> id, nom, prix et stock."""
+    code = request.GET.get('code', '').strip()
+    product = scan_barcode(code) if code else None
+    if product is None:
+        return JsonResponse({'success': False, 'error': 'Code-barres inconnu'}, status=404)
+    return JsonResponse({'success': True, 'product': product})
+
+
+def sale_receipt(request):
+    """Ticket de caisse 80 mm d'une vente (?format=text|html|escpos)."""
+    fmt = request.GET.get('format', 'text')
+    if fmt not in RECEIPT_FORMATS:
+        return HttpResponseBadRequest("Format de ticket inconnu")
+    try:
+        invoice = receipt_invoice(int(request.GET.get('sale_id', '')))
+    except (ValueError, Sale.DoesNotExist):
+        raise Http404("Vente introuvable")
+    return HttpResponse(render_receipt(invoice, fmt), content_type=RECEIPT_FORMATS[fmt])
+
+
+def invoice_batch_view(request):
+    """Factures d'une période (?start=&end=) : un PDF unique ou un ZIP (?format=zip)."""
+    if not request.user.is_admin():
+        return HttpResponseForbidden("Réservé aux administrateurs")
+    start = parse_date(request.GET.get('start') or '')
+    end = parse_date(request.GET.get('end') or '')
+    fmt = request.GET.get('format', 'pdf')
+    if not start or not end or start > end or fmt not in ('pdf', 'zip'):
+        return HttpResponseBadRequest("Paramètres start, end et format (pdf|zip) requis")
+    count = Sale.objects.filter(business_date__range=(start, end)).count()
+    if count > settings.INVOICE_BATCH_MAX_SALES:
+        return HttpResponseBadRequest(
+            f"{count} ventes sur la période (maximum {settings.INVOICE_BATCH_MAX_SALES})"
+        )
+    return FileResponse(
+        invoice_batch(start, end, fmt),
+        as_attachment=True,
+        filename=f"factures_{start:%Y%m%d}_{end:%Y%m%d}.{fmt}",
+    )
 
 
 # ===== VUES PRODUITS =====
@@ -464,51 +521,87 @@ class ReportsView(LoginRequiredMixin, TemplateView):
         end = self.request.GET.get('end')
         cat_id = self.request.GET.get('category')
 
+        try:
+            cat_id = int(cat_id) if cat_id else None
+        except (TypeError, ValueError):
+            cat_id = None
+
         # Base queryset pour les ventes
         sales_qs = Sale.objects.all()
         if start and end:
-            sales_qs = sales_qs.filter(date__date__range=(start, end))
+            sales_qs = sales_qs.filter(business_date__range=(start, end))
         if cat_id:
-            sales_qs = sales_qs.filter(items__product__category_id=cat_id).distinct()
-
-        # Statistiques générales
-        ctx.update({
-            'total_products': Product.objects.count(),
-            'active_products': Product.objects.filter(status=Product.Status.ACTIVE).count(),
-            'total_sales': sales_qs.count(),
-            'total_revenue': sales_qs.aggregate(total=Sum('total_amount'))['total'] or 0,
-        })
-
-        # Séries ventes sur les 7 derniers jours
-        today = timezone.now().date()
-        last7 = []
-        for i in range(6, -1, -1):
-            day = today - timedelta(days=i)
-            total = Sale.objects.filter(date__date=day).aggregate(sum=Sum('total_amount'))['sum'] or 0
-            last7.append({'date': day.strftime('%d/%m'), 'total': float(total)})
-        ctx['sales_dates'] = json.dumps([d['date'] for d in last7])
-        ctx['sales_totals'] = json.dumps([d['total'] for d in last7])
-
-        # Répartition des produits par catégorie
-        cats = Category.objects.all().order_by('name')
-        counts = Product.objects.values('category__name') \
-            .annotate(count=Count('id')) \
-            .order_by('category__name')
-        ctx['category_labels'] = json.dumps([c['category__name'] for c in counts])
-        ctx['category_counts'] = json.dumps([c['count'] for c in counts])
+            # Ventes retrouvées par l'index (product, sale) des lignes
+            sales_qs = sales_qs.filter(pk__in=SaleItem.objects.filter(
+                product__category_id=cat_id
+            ).values('sale_id'))
+
+        # Statistiques et ventilations : en cache jusqu'à la prochaine écriture
+        # sur les ventes, produits, catégories ou employés (noms des caissiers)
+        ctx.update(cached(
+            'reports', [Sale, Product, Category, User],
+            lambda: self.statistics(sales_qs, start, end, cat_id),
+            start, end, cat_id, timezone.localdate(),
+        ))
 
         # Liste des catégories pour le filtre
-        ctx['categories'] = cats
+        ctx['categories'] = cached_queryset('categories', Category.objects.order_by('name'))
 
-        # Pagination des ventes récentes (appliquée après filtres)
-        recent = sales_qs.order_by('-date')
-        paginator = Paginator(recent, 5)
-        page = self.request.GET.get('page')
-        ctx['recent_sales_page'] = paginator.get_page(page)
+        # Ventes récentes paginées par curseur (date, id), sans COUNT :
+        # le total est déjà dans total_sales
+        paginator = CursorPaginator(sales_qs.select_related('cashier'), 5, ('-date', '-id'))
+        ctx['recent_sales_page'] = paginator.get_page(self.request.GET.get('cursor'))
+        ctx['cursor_query'] = cursor_query(self.request)
 
         # Pass through filter values for template
         ctx['start'] = start
         ctx['end'] = end
-        ctx['selected_category'] = cat_id
+        ctx['selected_category'] = str(cat_id) if cat_id else ''
+        granularity = self.request.GET.get('granularity')
+        ctx['granularity'] = granularity if granularity in REPORT_GRANULARITIES else 'day'
 
         return ctx
+
+    def statistics(self, sales_qs, start, end, cat_id):
+        # Ventilations lues dans le cube des ventes (pas de jointure sur l'historique)
+        start_day = parse_date(start) if start and end else None
+        end_day = parse_date(end) if start and end else None
+        facts = sales_facts(start_day, end_day, category_id=cat_id)
+
+        # Statistiques générales : chiffre d'affaires des ventes payées, lu
+        # dans la synthèse journalière ou dans le cube (filtre catégorie)
+        if cat_id:
+            total_revenue = facts_totals(facts)['revenue']
+        else:
+            summary = DailySalesSummary.objects.all()
+            if start_day and end_day:
+                summary = summary.filter(date__range=(start_day, end_day))
+            total_revenue = summary.aggregate(total=Sum('revenue'))['total'] or 0
+        if start_day or cat_id:
+            total_sales = sales_qs.count()
+        else:
+            total_sales = read_counters('sale')['sale']
+        products = status_badges(Product, values=[Product.Status.ACTIVE])
+        stats = {
+            'total_products': products['total'],
+            'active_products': products[Product.Status.ACTIVE],
+            'total_sales': total_sales,
+            'total_revenue': total_revenue,
+            'top_products': top_products(facts),
+            'cashier_revenue': revenue_by_cashier(facts),
+            'category_revenue': revenue_by_category(facts),
+            'hourly_heatmap': json.dumps(hourly_heatmap(facts)),
+        }
+
+        # Séries ventes sur les 7 derniers jours
+        last7 = daily_sales_series(timezone.localdate())
+        stats['sales_dates'] = json.dumps([day.strftime('%d/%m') for day, _ in last7])
+        stats['sales_totals'] = json.dumps([float(total) for _, total in last7])
+
+        # Répartition des produits par catégorie
+        counts = Product.objects.values('category__name') \
+            .annotate(count=Count('id')) \
+            .order_by('category__name')
+        stats['category_labels'] = json.dumps([c['category__name'] for c in counts])
+        stats['category_counts'] = json.dumps([c['count'] for c in counts])
+        return stats
@@ -0,0 +1,69 @@
+// Autocomplétion des <select data-autocomplete-url> (AutocompleteSelect) :
+// la saisie interroge l'URL JSON et remplace les options du select.
+(function () {
+  'use strict';
+
+  var DELAY = 200;
+
+  function fillPrice(select, price) {
+    var row = select.closest('tr');
+    var input = row && row.querySelector('input[name$="-unit_price"]');
+    if (input && !input.value && price) {
+      input.value = price;
+    }
+  }
+
+  function bind(wrapper) {
+    var input = wrapper.querySelector('[data-autocomplete-input]');
+    var select = wrapper.querySelector('select[data-autocomplete-url]');
+    if (!input || !select || select.dataset.autocompleteBound) {
+      return;
+    }
+    select.dataset.autocompleteBound = '1';
+    var timer = null;
+    var prices = {};
+
+    input.addEventListener('input', function () {
+      clearTimeout(timer);
+      var q = input.value.trim();
+      if (!q) {
+        return;
+      }
+      timer = setTimeout(function () {
+        fetch(select.dataset.autocompleteUrl + '?q=' + encodeURIComponent(q), {
+          headers: {'X-Requested-With': 'XMLHttpRequest'},
+          credentials: 'same-origin'
+        })
+          .then(function (response) { return response.json(); })
+          .then(function (data) {
+            var current = select.value;
+            var kept = current ? select.options[select.selectedIndex] : null;
+            select.innerHTML = '';
+            select.add(new Option('---------', ''));
+            data.results.forEach(function (item) {
+              prices[item.id] = item.price;
+              if (String(item.id) !== current) {
+                select.add(new Option(item.text, item.id));
+              }
+            });
+            // Ligne existante : son produit reste sélectionné même hors des résultats
+            if (kept) {
+              select.add(kept, 1);
+              select.value = current;
+            } else if (data.results.length) {
+              select.value = data.results[0].id;
+              fillPrice(select, prices[select.value]);
+            }
+          });
+      }, DELAY);
+    });
+
+    select.addEventListener('change', function () {
+      fillPrice(select, prices[select.value]);
+    });
+  }
+
+  document.addEventListener('DOMContentLoaded', function () {
+    document.querySelectorAll('.autocomplete-select').forEach(bind);
+  });
+})();
@@ -17,6 +17,7 @@ document.addEventListener('DOMContentLoaded', function() {
   const genBtn            = document.getElementById('generate-invoice');
   const printBtn          = document.getElementById('print-invoice');
   let cart                = [];
+  let checkoutKey         = null;   // clé d'idempotence du panier en cours
 
   // Initialise états des boutons
   function initButtons() {
@@ -96,12 +97,14 @@ document.addEventListener('DOMContentLoaded', function() {
         return;
       }
     }
+    if (!checkoutKey) checkoutKey = newRequestKey();
     const data = { items: cart, payment_mode: mode, cash_received: cashReceived };
     fetch('/core/caisse/checkout/', {
       method: 'POST',
       headers: {
         'X-CSRFToken': getCookie('csrftoken'),
-        'Content-Type': 'application/json'
+        'Content-Type': 'application/json',
+        'Idempotency-Key': checkoutKey
       },
       body: JSON.stringify(data)
     })
@@ -111,6 +114,7 @@ document.addEventListener('DOMContentLoaded', function() {
         showToast(json.error || 'Erreur lors de la finalisation.', 'danger');
         return;
       }
+      checkoutKey = null;
       finalizeBtn.disabled = true;
       finalizeBtn.classList.replace('btn-success', 'btn-secondary');
       finalizeBtn.innerHTML = '<i class="fas fa-check-circle"></i> Vente finalisée';
@@ -126,10 +130,61 @@ document.addEventListener('DOMContentLoaded', function() {
     })
     .catch(err => {
       console.error(err);
-      showToast('Erreur réseau. Veuillez réessayer.', 'danger');
+      // Hors ligne : la vente est mise en file et synchronisée au retour du réseau
+      queueOfflineSale({
+        key: checkoutKey,
+        items: cart,
+        sold_at: new Date().toISOString()
+      });
+      checkoutKey = null;
+      cart = [];
+      renderCart();
+      showToast('Hors ligne : vente enregistrée localement, elle sera synchronisée.', 'warning');
     });
   });
 
+  // File des ventes hors ligne (localStorage)
+  const OFFLINE_QUEUE = 'caisse.offlineSales';
+
+  function loadOfflineQueue() {
+    try { return JSON.parse(localStorage.getItem(OFFLINE_QUEUE)) || []; }
+    catch (e) { return []; }
+  }
+
+  function queueOfflineSale(sale) {
+    const queue = loadOfflineQueue();
+    queue.push(sale);
+    localStorage.setItem(OFFLINE_QUEUE, JSON.stringify(queue));
+  }
+
+  function syncOfflineSales() {
+    const queue = loadOfflineQueue();
+    if (queue.length === 0 || !navigator.onLine) return;
+    fetch('/core/caisse/sync/', {
+      method: 'POST',
+      headers: {
+        'X-CSRFToken': getCookie('csrftoken'),
+        'Content-Type': 'application/json'
+      },
+      body: JSON.stringify({ sales: queue })
+    })
+    .then(resp => resp.json())
+    .then(json => {
+      if (!json.success) return;
+      // Toutes les ventes du lot ont reçu une réponse définitive
+      const done = new Set(json.results.map(r => r.key));
+      const rest = loadOfflineQueue().filter(s => !done.has(s.key));
+      localStorage.setItem(OFFLINE_QUEUE, JSON.stringify(rest));
+      const failed = json.results.filter(r => !r.success);
+      if (failed.length) showToast(`${failed.length} vente(s) hors ligne refusée(s) : ${failed[0].error}`, 'danger');
+      else showToast(`${json.results.length} vente(s) hors ligne synchronisée(s).`, 'success');
+    })
+    .catch(err => console.error(err));
+  }
+
+  window.addEventListener('online', syncOfflineSales);
+  syncOfflineSales();
+
   // Générer facture
   genBtn.addEventListener('click', function() {
     const saleId = finalizeBtn.dataset.saleId;
@@ -186,6 +241,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
   // Rendu panier
   function renderCart() {
+    checkoutKey = null;
     cartList.innerHTML = '';
     if (cart.length === 0) {
       cartList.innerHTML = '<li class="list-group-item text-center text-muted">Le panier est vide<br>Ajoutez des produits pour commencer</li>';
@@ -251,6 +307,11 @@ document.addEventListener('DOMContentLoaded', function() {
     return sub + tax;
   }
 
+  function newRequestKey() {
+    if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+    return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2);
+  }
+
   function getCookie(name) {
     let cookieValue = null;
     if (document.cookie && document.cookie !== '') {
@@ -41,6 +41,10 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Détection des N+1 en développement (apps.core.middleware)
+if DEBUG:
+    MIDDLEWARE.append('apps.core.middleware.RepeatedQueryMiddleware')
+
 ROOT_URLCONF = 'store_manager.urls'
 
 TEMPLATES = [
@@ -111,6 +115,80 @@ LOGIN_URL = 'accounts:login'             # /accounts/login/
 LOGIN_REDIRECT_URL = 'core:home'         # /core/home/
 LOGOUT_REDIRECT_URL = 'accounts:login'   # /accounts/login/
 
+# Caisse : numéros de facture réservés d'avance par processus
+INVOICE_NUMBER_BLOCK_SIZE = 10
+
+# Caisse : durée de conservation des clés d'idempotence d'encaissement
+CHECKOUT_IDEMPOTENCY_TTL_HOURS = 24
+
+# Caisse : nombre maximal de ventes hors ligne par lot de synchronisation
+CAISSE_SYNC_MAX_SALES = 500
+
+# Exports : nombre de lignes lues par requête lors des exports en flux
+EXPORT_CHUNK_SIZE = 2000
+
+# Exports : taille au-delà de laquelle un fichier généré est tamponné sur disque
+EXPORT_SPOOL_MAX_SIZE = 5 * 1024 * 1024
+
+# Exports en arrière-plan : durée de conservation des fichiers générés
+EXPORT_JOB_TTL_HOURS = 24
+
+# Exports en arrière-plan : fréquence d'enregistrement de l'avancement (en lignes)
+EXPORT_PROGRESS_EVERY = 500
+
+# Exports en arrière-plan : attente du worker quand la file est vide (en secondes)
+EXPORT_WORKER_POLL_SECONDS = 2
+
+# Factures par lot : plafond de ventes par demande, et rendu parallèle dans
+# un pool de INVOICE_BATCH_WORKERS processus partagé par le processus web, à
+# partir de INVOICE_BATCH_POOL_THRESHOLD factures absentes du cache
+INVOICE_BATCH_MAX_SALES = 5000
+INVOICE_BATCH_WORKERS = 4
+INVOICE_BATCH_POOL_THRESHOLD = 50
+
+# Tickets de caisse 80 mm : 48 caractères par ligne (police A)
+RECEIPT_WIDTH = 48
+RECEIPT_HEADER = 'Store Manager'
+RECEIPT_FOOTER = 'Merci de votre visite !'
+
+# Catalogue en mémoire de la caisse : rechargé à chaque changement de version,
+# et au plus tard après ce délai (stock vendu par un autre processus)
+CAISSE_CATALOG_MAX_AGE = 30
+
+# Codes-barres internes : EAN-13 du préfixe GS1 réservé aux magasins (20-29)
+BARCODE_INTERNAL_PREFIX = '20'
+
+# Synchronisation des terminaux : cache du catalogue complet par version,
+# taille maximale d'une différence et durée de conservation du journal
+CATALOG_SYNC_CACHE_SECONDS = 3600
+CATALOG_SYNC_MAX_DELTA = 1000
+CATALOG_CHANGES_TTL_DAYS = 30
+
+# Cache Django sur disque, partagé par les workers Gunicorn : une écriture
+# validée dans un worker (génération du cache versionné incrémentée) est vue
+# par tous les autres. LocMemCache ne convient qu'à un seul processus
+# (il sert aux tests, voir apps.core.testing).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    }
+}
+
+# Cache versionné (apps.core.caching) : les entrées sont invalidées par les
+# écritures ; ce délai ne fait qu'éliminer celles des anciennes générations
+VERSIONED_CACHE_TIMEOUT = 86400
+
+# Seuil des alertes de stock (tableau de bord, compteur product:low_stock)
+LOW_STOCK_THRESHOLD = 3
+
+# Requêtes répétées (RepeatedQueryMiddleware) : nombre d'exécutions d'une même
+# forme de SELECT à partir duquel elle est signalée, et refus de la requête
+# au lieu d'un simple avertissement (activé par les tests de budget)
+REPEATED_QUERY_THRESHOLD = 5
+REPEATED_QUERY_RAISE = False
+
 # Crispy Forms
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"